@@ -1,13 +1,74 @@
 import os
 import ctypes
 import sys
-from tkinter import Text, messagebox, filedialog
+from tkinter import Text, messagebox, filedialog, simpledialog
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import threading
 import json
+import shutil
+import zlib
+import bisect
+import struct
+import tempfile
+import csv
+import multiprocessing
+import itertools
+import time
+import atexit
+import errno
+import mmap
+import hmac
+import secrets
+import hashlib
+import base64
+import email.utils
+import http.client
+import urllib.parse
+from xml.etree import ElementTree
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Literal
 
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+    InvalidTag = ValueError
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 程序版本，与发布构建的文件版本一致
+APP_VERSION = "1.0.0"
+
+# 配置文件及说明
+CONFIG_FILES = [
+    ("ACQ.DAT", "近期悄悄话人员列表"),
+    ("ADDON.DAT", "界面设置"),
+    ("COMMON.DAT", "角色设置"),
+    ("CONTROL0.DAT", "角色设置(鼠标模式)"),
+    ("CONTROL1.DAT", "角色设置(手柄模式)"),
+    ("GEARSET.DAT", "套装列表"),
+    ("GS.DAT", "九宫幻卡卡组"),
+    ("HOTBAR.DAT", "热键栏设置"),
+    ("ITEMFDR.DAT", "雇员物品顺序"),
+    ("ITEMODR.DAT", "物品栏、兵装库物品顺序"),
+    ("KEYBIND.DAT", "键位设置"),
+    ("LOGFLTR.DAT", "消息窗口设置"),
+    ("MACRO.DAT", "用户宏(该角色专用)"),
+    ("UISAVE.DAT", "UI使用记录")
+]
+
 def get_resource_path(relative_path):
     """获取资源文件的绝对路径"""
     try:
@@ -16,15 +77,4298 @@ def get_resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def set_dpi_awareness():
-    """设置 DPI 感知"""
-    try:
-        ctypes.windll.shcore.SetProcessDpiAwareness(2)
-    except AttributeError:
+def get_program_dir():
+    """获取程序所在的文件夹，打包后为可执行文件所在的文件夹"""
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+def get_config_file(data_dir="data"):
+    """获取配置文件路径，界面和命令行共用"""
+    return os.path.join(data_dir, "config.json")
+
+def set_dpi_awareness():
+    """设置 DPI 感知"""
+    try:
+        ctypes.windll.shcore.SetProcessDpiAwareness(2)
+    except AttributeError:
+        try:
+            ctypes.windll.user32.SetProcessDPIAware()
+        except AttributeError:
+            pass
+
+def run_in_background(func, *args):
+    """在后台线程中执行函数，返回 Future"""
+    future = Future()
+    
+    def run():
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+def list_character_folders(base_path):
+    """列出路径下的角色文件夹"""
+    if not base_path:
+        return []
+    return [
+        item for item in os.listdir(base_path)
+        if "FFXIV_" in item and os.path.isdir(os.path.join(base_path, item))
+    ]
+
+def poll_future(widget, future, callback, interval=100):
+    """在 Tk 主线程中轮询 Future，完成后调用回调"""
+    def check():
+        if not widget.winfo_exists():
+            return
+        if not future.done():
+            widget.after(interval, check)
+            return
+        callback(future)
+    
+    widget.after(interval, check)
+
+def sync_treeview(tree, rows):
+    """按差异更新 Treeview，rows 为 (iid, text, values) 列表"""
+    existing = set(tree.get_children())
+    new_ids = {iid for iid, _, _ in rows}
+    
+    # 删除已不存在的项
+    removed = [iid for iid in existing if iid not in new_ids]
+    if removed:
+        tree.delete(*removed)
+    
+    # 插入新增项，更新变化的项
+    for iid, text, values in rows:
+        if iid in existing:
+            old_values = tuple(str(value) for value in tree.item(iid, "values"))
+            if tree.item(iid, "text") != text or old_values != tuple(str(value) for value in values):
+                tree.item(iid, text=text, values=values)
+        else:
+            tree.insert("", "end", iid, text=text, values=values)
+    
+    # 顺序变化时一次性重排（排序数千行时逐项移动太慢）
+    order = [iid for iid, _, _ in rows]
+    if list(tree.get_children()) != order:
+        tree.set_children("", *order)
+
+def get_server_folder(server_type):
+    """获取服务器对应的备份文件夹名（使用汉字标识服务器类型）"""
+    return "国际服" if server_type == "international" else "国服"
+
+def get_latest_backup_time(backup_folder):
+    """获取备份的最新修改时间，未备份返回 None，时间未知返回 0"""
+    if not os.path.exists(backup_folder):
+        return None
+    try:
+        file_times = [
+            os.path.getmtime(os.path.join(backup_folder, f))
+            for f in os.listdir(backup_folder)
+            if f.endswith('.DAT')
+        ]
+        return max(file_times) if file_times else 0
+    except Exception:
+        return 0
+
+def format_age(timestamp):
+    """格式化距今的时长"""
+    seconds = max(0, time.time() - timestamp)
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分钟前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小时前"
+    return f"{int(seconds // 86400)} 天前"
+
+def scan_roster(base_path, storage=None, server_folder=None):
+    """扫描角色文件夹及备份状态，同时更新角色元数据"""
+    folders = list_character_folders(base_path)
+    backups = {}
+    if storage:
+        backups = storage.backup_times(server_folder, folders)
+    roster_model.update(base_path, folders, backups if storage else None)
+    return folders, backups
+
+def load_roster_cache():
+    """加载角色列表缓存"""
+    cache_file = os.path.join("data", "roster_cache.json")
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    cache.setdefault("rosters", {})
+    cache.setdefault("backups", {})
+    return cache
+
+def save_roster_cache(base_path, folders, backup_dir=None, backups=None):
+    """保存角色列表缓存"""
+    cache = load_roster_cache()
+    cache["rosters"][base_path] = folders
+    if backup_dir:
+        cache["backups"][backup_dir] = backups
+    os.makedirs("data", exist_ok=True)
+    with open(os.path.join("data", "roster_cache.json"), 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def hash_file(path, buffer_size=1024 * 1024):
+    """计算文件哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_files(paths):
+    """计算多个文件的哈希，返回 (路径, 大小, 修改时间, 哈希) 列表"""
+    results = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            results.append((path, stat.st_size, stat.st_mtime, hash_file(path)))
+        except OSError:
+            continue
+    return results
+
+class HashCache:
+    """文件哈希缓存，文件大小或修改时间变化时重新计算"""
+
+    def __init__(self, cache_file=os.path.join("data", "hash_cache.json")):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def get(self, path):
+        """获取文件哈希"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2]
+        digest = hash_file(path)
+        with self.lock:
+            self.entries[path] = [stat.st_size, stat.st_mtime, digest]
+            self.dirty = True
+        return digest
+
+    def get_many(self, paths, processes=None):
+        """批量获取文件哈希，未缓存的文件较多时在进程池中计算，返回以调用方传入的路径为键的字典"""
+        hashes = {}
+        pending = []
+        # 缓存以绝对路径为键，调用方的路径可能使用 / 分隔或相对路径
+        inputs = {}
+        for path in paths:
+            inputs.setdefault(os.path.abspath(path), []).append(path)
+        for path in inputs:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            with self.lock:
+                entry = self.entries.get(path)
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+                hashes[path] = entry[2]
+            else:
+                pending.append(path)
+        
+        if len(pending) < 64:
+            results = hash_files(pending)
+        else:
+            # 分块提交以减少进程间通信
+            chunk_size = 64
+            chunks = [pending[index:index + chunk_size] for index in range(0, len(pending), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = [result for chunk in executor.map(hash_files, chunks) for result in chunk]
+        
+        with self.lock:
+            for path, size, mtime, digest in results:
+                self.entries[path] = [size, mtime, digest]
+                hashes[path] = digest
+            if results:
+                self.dirty = True
+        return {original: hashes[path] for path, originals in inputs.items() if path in hashes for original in originals}
+
+    def save(self):
+        """保存缓存"""
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+hash_cache = HashCache()
+
+# 文件复制：Windows 由 CopyFileW 在系统内部完成（支持块克隆的卷上自动克隆），
+# 其他系统依次尝试 reflink 克隆、copy_file_range、sendfile，最后用复用的缓冲区读写
+COPY_BUFFER_SIZE = 1024 * 1024
+FICLONE = 0x40049409
+# 这些错误表示文件系统或内核不支持该复制方式，换下一种方式
+COPY_UNSUPPORTED_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.EPERM, errno.ENOTTY}
+
+class CopyEngine:
+    """文件复制引擎，只复制内容、权限位和修改时间"""
+
+    def __init__(self, buffer_size=COPY_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.local = threading.local()
+        # 失败过的复制方式对同一对设备不再尝试，{方式: {(源设备, 目标设备)}}
+        self.unsupported = {"clone": set(), "copy_file_range": set(), "sendfile": set()}
+
+    def buffer(self):
+        """当前线程复用的复制缓冲区"""
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            buffer = self.local.buffer = memoryview(bytearray(self.buffer_size))
+        return buffer
+
+    def stat_many(self, folder, names=None):
+        """遍历一次目录获取多个文件的状态，返回 {normcase(文件名): os.stat_result}"""
+        wanted = {os.path.normcase(name) for name in names} if names is not None else None
+        stats = {}
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    name = os.path.normcase(entry.name)
+                    if (wanted is None or name in wanted) and entry.is_file():
+                        stats[name] = entry.stat()
+        except OSError:
+            pass
+        return stats
+
+    def try_method(self, method, devices, copy):
+        """用一种方式复制，不支持时记录并返回 False"""
+        if devices in self.unsupported[method]:
+            return False
+        try:
+            copy()
+            return True
+        except OSError as e:
+            if e.errno not in COPY_UNSUPPORTED_ERRORS:
+                raise
+            self.unsupported[method].add(devices)
+            return False
+
+    def copy_fd(self, source_fd, target_fd, devices):
+        """在两个文件描述符之间复制全部内容"""
+        if fcntl and self.try_method("clone", devices, lambda: fcntl.ioctl(target_fd, FICLONE, source_fd)):
+            return
+        
+        def kernel_copy(send):
+            # 只有在一个字节都没复制时才换方式，否则目标文件已写入一部分
+            first = True
+            while True:
+                try:
+                    sent = send()
+                except OSError:
+                    if first:
+                        raise
+                    raise OSError(errno.EIO, "复制中断")
+                if not sent:
+                    return
+                first = False
+        
+        if hasattr(os, "copy_file_range") and self.try_method(
+            "copy_file_range", devices,
+            lambda: kernel_copy(lambda: os.copy_file_range(source_fd, target_fd, 1 << 30))
+        ):
+            return
+        if hasattr(os, "sendfile") and sys.platform.startswith("linux") and self.try_method(
+            "sendfile", devices,
+            lambda: kernel_copy(lambda: os.sendfile(target_fd, source_fd, None, 1 << 30))
+        ):
+            return
+        
+        buffer = self.buffer()
+        while True:
+            read = os.readv(source_fd, [buffer])
+            if not read:
+                return
+            view = buffer[:read]
+            while view:
+                view = view[os.write(target_fd, view):]
+
+    def copy_file(self, source, target, stat=None):
+        """复制文件内容、权限位和修改时间，stat 为已获取的源文件状态"""
+        if os.name == "nt":
+            if not ctypes.windll.kernel32.CopyFileW(source, target, False):
+                raise ctypes.WinError()
+            return
+        stat = stat or os.stat(source)
+        source_fd = os.open(source, os.O_RDONLY)
+        try:
+            target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            try:
+                self.copy_fd(source_fd, target_fd, (stat.st_dev, os.fstat(target_fd).st_dev))
+                # 与 shutil.copy2 一样保留权限位，不支持修改权限的文件系统（如部分挂载盘）忽略
+                try:
+                    os.fchmod(target_fd, stat.st_mode & 0o7777)
+                except OSError as e:
+                    if e.errno not in COPY_UNSUPPORTED_ERRORS:
+                        raise
+            finally:
+                os.close(target_fd)
+        finally:
+            os.close(source_fd)
+        os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+copy_engine = CopyEngine()
+
+def benchmark_copy(directory, count=200, size=64 * 1024):
+    """比较 shutil.copy2 与复制引擎复制同一批文件，返回 [(方式, 耗时秒数, 每秒文件数)]"""
+    source_dir = os.path.join(directory, "copy-source")
+    os.makedirs(source_dir, exist_ok=True)
+    names = [f"{index}.DAT" for index in range(count)]
+    for name in names:
+        with open(os.path.join(source_dir, name), 'wb') as f:
+            f.write(os.urandom(size))
+    
+    def copy2(pairs):
+        for source, target in pairs:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+    
+    def engine(pairs):
+        # 与 copy_files 相同：源目录只遍历一次，目标目录只创建一次
+        stats = copy_engine.stat_many(source_dir)
+        os.makedirs(os.path.dirname(pairs[0][1]), exist_ok=True)
+        for source, target in pairs:
+            copy_engine.copy_file(source, target, stats[os.path.normcase(os.path.basename(source))])
+    
+    results = []
+    for method, copy in (("copy2", copy2), ("engine", engine)):
+        target_dir = os.path.join(directory, f"copy-{method}")
+        pairs = [(os.path.join(source_dir, name), os.path.join(target_dir, name)) for name in names]
+        started = time.perf_counter()
+        copy(pairs)
+        elapsed = time.perf_counter() - started
+        results.append((method, elapsed, count / elapsed))
+    return results
+
+def link_or_copy(source, target):
+    """优先创建硬链接，不支持时（如跨磁盘）复制"""
+    try:
+        os.link(source, target)
+    except OSError:
+        copy_engine.copy_file(source, target)
+
+def files_identical(source, target):
+    """先比较大小，再比较缓存的哈希"""
+    try:
+        if os.path.getsize(source) != os.path.getsize(target):
+            return False
+    except OSError:
+        return False
+    return hash_cache.get(source) == hash_cache.get(target)
+
+def replace_file(source, target, stat=None):
+    """先复制到临时文件再替换目标，覆盖前保存的硬链接快照不受影响"""
+    temp_path = f"{target}.ccmt-tmp"
+    copy_engine.copy_file(source, temp_path, stat)
+    os.replace(temp_path, target)
+
+# 落盘保障级别：none 不同步，batch 在每批（一个角色的一次操作）结束时同步，file 每个文件写入后立即同步
+DURABILITY_LEVELS = ("none", "batch", "file")
+
+def fsync_path(path, directory=False):
+    """将文件或目录同步到磁盘，Windows 不支持同步目录时忽略"""
+    try:
+        fd = os.open(path, os.O_RDONLY if directory else os.O_RDWR)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class DurableBatch:
+    """记录一批写入的文件，按级别立即同步或在批次结束时统一同步"""
+
+    def __init__(self, level):
+        self.level = level
+        self.files = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def written(self, path):
+        """记录写入完成的文件，path 为 None 表示远程存储"""
+        if path is None or self.level == "none":
+            return
+        if self.level == "file":
+            fsync_path(path)
+            fsync_path(os.path.dirname(path), directory=True)
+            return
+        with self.lock:
+            self.files.append(path)
+
+    def flush(self):
+        """并发同步本批文件，再同步一次涉及的目录"""
+        with self.lock:
+            files, self.files = self.files, []
+        if not files:
+            return
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+            list(executor.map(fsync_path, files))
+        for directory in {os.path.dirname(path) for path in files}:
+            fsync_path(directory, directory=True)
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.flush()
+        return False
+
+class Durability:
+    """全局落盘保障设置"""
+
+    def __init__(self, level="batch"):
+        self.level = level
+
+    def configure(self, level):
+        """设置级别，无效值按 batch 处理"""
+        self.level = level if level in DURABILITY_LEVELS else "batch"
+
+    def batch(self, level=None):
+        """开始一批写入"""
+        return DurableBatch(level or self.level)
+
+durability = Durability()
+
+def benchmark_durability(directory, count=200, size=64 * 1024):
+    """以各落盘保障级别复制同一批文件，返回 [(级别, 耗时秒数, 每秒文件数)]"""
+    source_dir = os.path.join(directory, "source")
+    os.makedirs(source_dir, exist_ok=True)
+    names = [f"{index}.DAT" for index in range(count)]
+    for name in names:
+        with open(os.path.join(source_dir, name), 'wb') as f:
+            f.write(os.urandom(size))
+    
+    results = []
+    for level in DURABILITY_LEVELS:
+        target_dir = os.path.join(directory, level)
+        os.makedirs(target_dir, exist_ok=True)
+        started = time.perf_counter()
+        with durability.batch(level) as batch:
+            for name in names:
+                target = os.path.join(target_dir, name)
+                replace_file(os.path.join(source_dir, name), target)
+                batch.written(target)
+        elapsed = time.perf_counter() - started
+        results.append((level, elapsed, count / elapsed))
+    return results
+
+# 快照增量格式：魔数和目标长度之后是 zlib 压缩的指令流，
+# "C" 指令从基准版本复制 (偏移, 长度)，"L" 指令写入 (长度) 个字面字节
+DELTA_MAGIC = b"CCMTDLT1"
+DELTA_BLOCK_SIZE = 16
+# 每个关键帧之后最多保存的增量数，增量超过原文件一半大小时改存关键帧
+SNAPSHOT_KEYFRAME_INTERVAL = 16
+# 增量编码为纯 Python 实现，超过此大小的文件直接保存为关键帧
+SNAPSHOT_DELTA_MAX_SIZE = 256 * 1024
+
+def encode_delta(base, data):
+    """生成把 base 变为 data 的二进制增量"""
+    block = DELTA_BLOCK_SIZE
+    index = {}
+    for offset in range(0, len(base) - block + 1, block):
+        index.setdefault(base[offset:offset + block], offset)
+    
+    ops = bytearray()
+    literal = bytearray()
+    position = 0
+    while position < len(data):
+        chunk = data[position:position + block]
+        # 配置文件多为原位修改，优先尝试相同偏移
+        if len(chunk) == block and base[position:position + block] == chunk:
+            offset = position
+        else:
+            offset = index.get(chunk) if len(chunk) == block else None
+        if offset is None:
+            literal.append(data[position])
+            position += 1
+            continue
+        
+        # 先按大步长、再逐字节延长匹配
+        length = block
+        for step in (4096, 256, 16, 1):
+            while (
+                position + length + step <= len(data)
+                and data[position + length:position + length + step] == base[offset + length:offset + length + step]
+            ):
+                length += step
+        if literal:
+            ops += b"L" + struct.pack("<I", len(literal)) + literal
+            literal = bytearray()
+        ops += b"C" + struct.pack("<II", offset, length)
+        position += length
+    if literal:
+        ops += b"L" + struct.pack("<I", len(literal)) + literal
+    return DELTA_MAGIC + struct.pack("<I", len(data)) + zlib.compress(bytes(ops))
+
+def apply_delta(base, delta):
+    """按增量从 base 重建文件内容"""
+    if delta[:len(DELTA_MAGIC)] != DELTA_MAGIC:
+        raise ValueError("不是有效的快照增量")
+    size = struct.unpack_from("<I", delta, len(DELTA_MAGIC))[0]
+    ops = zlib.decompress(delta[len(DELTA_MAGIC) + 4:])
+    output = bytearray()
+    position = 0
+    while position < len(ops):
+        op = ops[position:position + 1]
+        if op == b"C":
+            offset, length = struct.unpack_from("<II", ops, position + 1)
+            output += base[offset:offset + length]
+            position += 9
+        elif op == b"L":
+            length = struct.unpack_from("<I", ops, position + 1)[0]
+            output += ops[position + 5:position + 5 + length]
+            position += 5 + length
+        else:
+            raise ValueError("快照增量已损坏")
+    if len(output) != size:
+        raise ValueError("快照增量已损坏")
+    return bytes(output)
+
+class Snapshot:
+    """一次覆盖操作的原始文件快照"""
+
+    def __init__(self, store, snapshot_id, description):
+        self.store = store
+        self.id = snapshot_id
+        self.description = description
+        self.directory = os.path.join(store.root, snapshot_id)
+        self.files = []
+        self.captured = set()
+        self.lock = threading.Lock()
+
+    def capture(self, target):
+        """在覆盖前保存目标文件，目标不存在时记录以便撤销时删除"""
+        target = os.path.abspath(target)
+        with self.lock:
+            if target in self.captured:
+                return
+            self.captured.add(target)
+            name = f"{len(self.files)}_{os.path.basename(target)}.delta"
+            entry = {"target": target, "snapshot": None}
+            self.files.append(entry)
+        if not os.path.exists(target):
+            return
+        
+        # 同一文件的后续版本保存为相对关键帧的增量，超过间隔或增量过大时保存新的关键帧
+        with open(target, 'rb') as f:
+            data = f.read()
+        entry["mtime"] = os.path.getmtime(target)
+        # 使用的关键帧在快照提交前一直被引用，提交后由快照清单引用
+        base = self.store.current_keyframe(target) if len(data) <= SNAPSHOT_DELTA_MAX_SIZE else None
+        if base:
+            try:
+                if base["deltas"] < SNAPSHOT_KEYFRAME_INTERVAL:
+                    with open(self.store.keyframe_path(base["keyframe"]), 'rb') as f:
+                        delta = encode_delta(f.read(), data)
+                    if len(delta) < len(data) // 2:
+                        os.makedirs(self.directory, exist_ok=True)
+                        with open(os.path.join(self.directory, name), 'wb') as f:
+                            f.write(delta)
+                        entry["delta"] = name
+                        entry["base"] = base["keyframe"]
+                        self.store.use_keyframe(target, base["keyframe"], base["deltas"] + 1)
+                        base = None
+                        return
+            finally:
+                if base:
+                    self.store.release_keyframe(base["keyframe"])
+        entry["keyframe"] = self.store.add_keyframe(target, data)
+
+    def commit(self):
+        """保存快照清单并加入撤销记录"""
+        if not self.files:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump({"description": self.description, "files": self.files}, f, ensure_ascii=False, indent=2)
+        self.store.add(self)
+
+class SnapshotStore:
+    """覆盖前快照的存储，保留最近若干次操作用于撤销"""
+
+    def __init__(self, root=os.path.join("data", "snapshots"), keep=50):
+        self.root = root
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.sequence = itertools.count()
+        self.keyframes = None
+        # 正在进行的快照引用的关键帧及引用次数，清理时不删除
+        self.pending_keyframes = {}
+
+    def keyframe_path(self, digest):
+        """关键帧按内容哈希保存，相同内容只存一份"""
+        return os.path.join(self.root, "keyframes", digest)
+
+    def load_keyframes(self):
+        """加载 {目标文件: {关键帧, 之后的增量数}}，调用方需持有锁"""
+        if self.keyframes is None:
+            try:
+                with open(os.path.join(self.root, "keyframes.json"), 'r', encoding='utf-8') as f:
+                    self.keyframes = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self.keyframes = {}
+        return self.keyframes
+
+    def save_keyframes(self):
+        """保存关键帧记录，调用方需持有锁"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "keyframes.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.load_keyframes(), f, ensure_ascii=False, indent=2)
+
+    def pin_keyframe(self, digest):
+        """增加关键帧的引用，调用方需持有锁"""
+        self.pending_keyframes[digest] = self.pending_keyframes.get(digest, 0) + 1
+
+    def unpin_keyframe(self, digest):
+        """减少关键帧的引用，引用数归零后才可被清理，调用方需持有锁"""
+        count = self.pending_keyframes.get(digest, 0) - 1
+        if count > 0:
+            self.pending_keyframes[digest] = count
+        else:
+            self.pending_keyframes.pop(digest, None)
+
+    def release_keyframe(self, digest):
+        """释放一次关键帧引用"""
+        with self.lock:
+            self.unpin_keyframe(digest)
+
+    def current_keyframe(self, target):
+        """目标文件当前的关键帧并增加引用，不存在时返回 None；不使用时需调用 release_keyframe"""
+        with self.lock:
+            base = self.load_keyframes().get(target)
+            if base:
+                base = dict(base)
+                self.pin_keyframe(base["keyframe"])
+        if base and os.path.exists(self.keyframe_path(base["keyframe"])):
+            return base
+        if base:
+            self.release_keyframe(base["keyframe"])
+        return None
+
+    def use_keyframe(self, target, digest, deltas):
+        """更新目标文件的关键帧和增量数"""
+        with self.lock:
+            self.load_keyframes()[target] = {"keyframe": digest, "deltas": deltas}
+
+    def add_keyframe(self, target, data):
+        """保存关键帧并设为目标文件的当前关键帧"""
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        path = self.keyframe_path(digest)
+        with self.lock:
+            self.pin_keyframe(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 目标随后会被替换为新文件，硬链接保存的仍是原内容
+            link_or_copy(target, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        self.use_keyframe(target, digest, 0)
+        return digest
+
+    def read_version(self, directory, entry):
+        """重建快照中保存的文件内容，旧格式快照为完整副本"""
+        if "keyframe" in entry:
+            with open(self.keyframe_path(entry["keyframe"]), 'rb') as f:
+                return f.read()
+        if "delta" in entry:
+            with open(self.keyframe_path(entry["base"]), 'rb') as f:
+                base = f.read()
+            with open(os.path.join(directory, entry["delta"]), 'rb') as f:
+                return apply_delta(base, f.read())
+        with open(os.path.join(directory, entry["snapshot"]), 'rb') as f:
+            return f.read()
+
+    def collect_keyframes(self):
+        """删除不再被任何快照引用的关键帧"""
+        referenced = set()
+        with self.lock:
+            for item in self.load_index():
+                try:
+                    with open(os.path.join(self.root, item["id"], "manifest.json"), 'r', encoding='utf-8') as f:
+                        files = json.load(f)["files"]
+                except (OSError, ValueError):
+                    continue
+                for entry in files:
+                    referenced.update(entry[key] for key in ("keyframe", "base") if key in entry)
+            referenced |= self.pending_keyframes.keys()
+            keyframes = self.load_keyframes()
+            for target in [target for target, base in keyframes.items() if base["keyframe"] not in referenced]:
+                del keyframes[target]
+            self.save_keyframes()
+            directory = os.path.join(self.root, "keyframes")
+            for digest in os.listdir(directory) if os.path.isdir(directory) else []:
+                if digest not in referenced:
+                    os.remove(os.path.join(directory, digest))
+
+    def index_file(self):
+        """撤销记录文件"""
+        return os.path.join(self.root, "index.json")
+
+    def load_index(self):
+        """加载撤销记录，最新的在最后"""
+        try:
+            with open(self.index_file(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def save_index(self, index):
+        """保存撤销记录"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.index_file(), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+
+    def begin(self, description):
+        """开始一次覆盖操作"""
+        snapshot_id = f"{time.strftime('%Y%m%d%H%M%S')}_{os.getpid()}_{next(self.sequence)}"
+        return Snapshot(self, snapshot_id, description)
+
+    def add(self, snapshot):
+        """加入撤销记录并清理过旧的快照"""
+        with self.lock:
+            index = self.load_index()
+            index.append({
+                "id": snapshot.id,
+                "time": time.time(),
+                "description": snapshot.description,
+                "count": len(snapshot.files)
+            })
+            removed = index[:-self.keep]
+            index = index[-self.keep:]
+            self.save_index(index)
+            
+            # 清单已保存，释放本次快照对关键帧的引用，其他进行中的快照的引用不受影响
+            for entry in snapshot.files:
+                digest = entry.get("keyframe") or entry.get("base")
+                if digest:
+                    self.unpin_keyframe(digest)
+            self.save_keyframes()
+        for entry in removed:
+            shutil.rmtree(os.path.join(self.root, entry["id"]), ignore_errors=True)
+        if removed:
+            self.collect_keyframes()
+
+    def list(self):
+        """列出可撤销的操作，最新的在前"""
+        with self.lock:
+            return list(reversed(self.load_index()))
+
+    def targets(self, snapshot_id):
+        """获取操作覆盖过的文件"""
+        with open(os.path.join(self.root, snapshot_id, "manifest.json"), 'r', encoding='utf-8') as f:
+            return [entry["target"] for entry in json.load(f)["files"]]
+
+    def read_files(self, snapshot_id, targets):
+        """读取快照中保存的若干目标文件的原内容，返回 {目标文件: 内容}，操作前不存在的文件不返回"""
+        directory = os.path.join(self.root, snapshot_id)
+        with open(os.path.join(directory, "manifest.json"), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        targets = {os.path.abspath(target) for target in targets}
+        return {
+            entry["target"]: self.read_version(directory, entry)
+            for entry in manifest["files"]
+            if entry["target"] in targets and (entry["snapshot"] or "keyframe" in entry or "delta" in entry)
+        }
+
+    def undo(self, snapshot_id):
+        """撤销一次操作，返回还原的文件数"""
+        directory = os.path.join(self.root, snapshot_id)
+        with open(os.path.join(directory, "manifest.json"), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        for entry in reversed(manifest["files"]):
+            target = entry["target"]
+            if entry["snapshot"] or "keyframe" in entry or "delta" in entry:
+                temp_path = f"{target}.ccmt-tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(self.read_version(directory, entry))
+                if "mtime" in entry:
+                    os.utime(temp_path, (entry["mtime"], entry["mtime"]))
+                os.replace(temp_path, target)
+            elif os.path.exists(target):
+                os.remove(target)
+        
+        with self.lock:
+            self.save_index([entry for entry in self.load_index() if entry["id"] != snapshot_id])
+        shutil.rmtree(directory, ignore_errors=True)
+        self.collect_keyframes()
+        return len(manifest["files"])
+
+    def undo_latest(self, count):
+        """从最新开始撤销若干次操作"""
+        restored = 0
+        for entry in self.list()[:count]:
+            restored += self.undo(entry["id"])
+        return restored
+
+snapshot_store = SnapshotStore()
+
+def load_marks(server_type):
+    """加载指定服务器的标记数据"""
+    config_file = os.path.join("data", f"{server_type}_marks.json")
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def get_game_path(config, server_type):
+    """获取服务器对应的游戏路径"""
+    return config.get("international_path" if server_type == "international" else "china_path", "")
+
+class TransferJournal:
+    """批量备份/恢复的进度日志，每完成一个文件追加一行并落盘，中断后重新执行同一批量操作时从中断处继续"""
+
+    def __init__(self, operation, server_type, location, folders, files, root=os.path.join("data", "journals")):
+        run_key = json.dumps([operation, server_type, location, sorted(folders), sorted(files)], ensure_ascii=False)
+        digest = hashlib.blake2b(run_key.encode("utf-8"), digest_size=8).hexdigest()
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, f"{operation}-{digest}.jsonl")
+        self.folders = set(folders)
+        self.done = {}
+        self.completed_folders = set()
+        self.lock = threading.Lock()
+        self.resumed = os.path.exists(self.path)
+        if self.resumed:
+            self.load()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def load(self):
+        """读取已有日志，忽略中断时未写完的最后一行"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "file" in entry:
+                    self.done[(entry["folder"], entry["file"])] = (entry["size"], entry["mtime"])
+                else:
+                    self.completed_folders.add(entry["folder"])
+
+    def append(self, entry):
+        """追加一行并立即落盘"""
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def is_done(self, folder, config_file, local_path):
+        """文件已完成且本地一侧未再变化"""
+        recorded = self.done.get((folder, config_file))
+        if recorded is None:
+            return False
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return False
+        return recorded == (stat.st_size, stat.st_mtime)
+
+    def done_count(self, folder, files):
+        """角色中已记录完成的文件数"""
+        return sum((folder, config_file) in self.done for config_file in files)
+
+    def record(self, folder, config_file, local_path):
+        """记录一个已完成的文件"""
+        stat = os.stat(local_path)
+        self.done[(folder, config_file)] = (stat.st_size, stat.st_mtime)
+        self.append({"folder": folder, "file": config_file, "size": stat.st_size, "mtime": stat.st_mtime})
+
+    def complete_folder(self, folder, errors):
+        """角色全部文件完成后记录，有失败时下次继续重试"""
+        if errors:
+            return
+        self.completed_folders.add(folder)
+        self.append({"folder": folder})
+
+    def close(self):
+        """关闭日志，全部角色完成时删除"""
+        self.file.close()
+        if self.completed_folders >= self.folders:
+            os.remove(self.path)
+
+def resume_pairs(journal, storage, folder, pairs, remote_files, local_index):
+    """从待传输列表中去掉已完成的文件；日志之外已存在的目标文件校验一致后直接记为完成"""
+    pending = []
+    for pair in pairs:
+        key, local_path = pair[1 - local_index], pair[local_index]
+        config_file = key.rsplit("/", 1)[-1]
+        if journal.is_done(folder, config_file, local_path):
+            continue
+        if journal.resumed and key in remote_files and os.path.exists(local_path):
+            try:
+                if storage.matches(key, local_path, remote_files[key]):
+                    journal.record(folder, config_file, local_path)
+                    continue
+            except Exception:
+                pass
+        pending.append(pair)
+    return pending
+
+# 每个角色的备份文件夹中保存校验清单：{文件名: {原文件哈希, 存储内容哈希, 大小}}
+CHECKSUM_FILE = "checksums.json"
+CHECKSUM_BUFFER_SIZE = 4 * 1024 * 1024
+
+def load_checksums(storage, backup_prefix):
+    """读取角色备份的校验清单"""
+    data = storage.read_bytes(f"{backup_prefix}/{CHECKSUM_FILE}")
+    if not data:
+        return {}
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {}
+
+def record_checksums(storage, backup_prefix, source_files):
+    """备份后更新校验清单，source_files 为本次成功备份的本地文件"""
+    if not source_files:
+        return
+    checksums = load_checksums(storage, backup_prefix)
+    for source_file in source_files:
+        config_file = os.path.basename(source_file)
+        checksums[config_file] = {
+            "content": hash_cache.get(source_file),
+            "stored": storage.stored_hash(f"{backup_prefix}/{config_file}"),
+            "size": os.path.getsize(source_file)
+        }
+    storage.write_bytes(f"{backup_prefix}/{CHECKSUM_FILE}", json.dumps(checksums, ensure_ascii=False, indent=2).encode("utf-8"))
+
+def read_back(storage, backup_prefix, target_files):
+    """恢复后重新读取目标文件与备份时的原文件哈希比较，返回失败列表"""
+    checksums = load_checksums(storage, backup_prefix)
+    errors = []
+    for target_file in target_files:
+        expected = checksums.get(os.path.basename(target_file), {}).get("content")
+        if expected and hash_file(target_file, CHECKSUM_BUFFER_SIZE) != expected:
+            errors.append((os.path.basename(target_file), "回读校验失败：写入的内容与备份不一致"))
+    return errors
+
+def backup_character(storage, source_base, server_type, folder, files=None, journal=None):
+    """备份单个角色的配置文件，返回 (复制数量, 失败列表, 已是最新的数量)"""
+    files = files or [name for name, _ in CONFIG_FILES]
+    source_folder = os.path.join(source_base, folder)
+    backup_prefix = f"{get_server_folder(server_type)}/{folder}"
+    pairs = []
+    for config_file in files:
+        source_file = os.path.normpath(os.path.join(source_folder, config_file))
+        if os.path.exists(source_file):
+            pairs.append((source_file, f"{backup_prefix}/{config_file}"))
+    
+    on_done = None
+    pending = pairs
+    if journal:
+        if folder in journal.completed_folders:
+            return 0, [], len(pairs)
+        remote_files = storage.list_files(backup_prefix) if journal.resumed else {}
+        pending = resume_pairs(journal, storage, folder, pairs, remote_files, 0)
+        on_done = lambda pair: journal.record(folder, os.path.basename(pair[0]), pair[0])
+    with metrics.operation("backup") as operation:
+        success_count, errors = storage.upload_many(pending, on_done)
+        operation.finish([source_file for source_file, _ in pending], [source_file for (source_file, _), _ in errors])
+    failed = {source_file for (source_file, _), _ in errors}
+    errors = [(os.path.basename(source_file), error) for (source_file, _), error in errors]
+    try:
+        record_checksums(storage, backup_prefix, [source_file for source_file, _ in pending if source_file not in failed])
+    except Exception as e:
+        errors.append((CHECKSUM_FILE, str(e)))
+    if journal:
+        journal.complete_folder(folder, errors)
+    if pairs and not errors:
+        metrics.backed_up(server_type, folder)
+    return success_count, errors, len(pairs) - len(pending)
+
+def restore_character(storage, target_base, server_type, folder, files=None, backup_files=None, journal=None, verify=False):
+    """从备份恢复单个角色的配置文件，返回 (复制数量, 失败列表, 已是最新的数量)"""
+    files = files or [name for name, _ in CONFIG_FILES]
+    # 已完成的角色不再列出远端文件，日志中记录完成的文件即为已是最新的数量
+    if journal and folder in journal.completed_folders:
+        return 0, [], journal.done_count(folder, files)
+    target_folder = os.path.join(target_base, folder)
+    backup_prefix = f"{get_server_folder(server_type)}/{folder}"
+    if backup_files is None:
+        backup_files = storage.list_files(backup_prefix)
+    pairs = [
+        (f"{backup_prefix}/{config_file}", os.path.normpath(os.path.join(target_folder, config_file)))
+        for config_file in files
+        if f"{backup_prefix}/{config_file}" in backup_files
+    ]
+    
+    on_done = None
+    pending = pairs
+    if journal:
+        pending = resume_pairs(journal, storage, folder, pairs, backup_files, 1)
+        on_done = lambda pair: journal.record(folder, os.path.basename(pair[1]), pair[1])
+    
+    # 目标已与备份相同的文件不再写入
+    unchanged = [
+        (key, target_file) for key, target_file in pending
+        if os.path.exists(target_file) and storage.is_identical(key, target_file)
+    ]
+    if unchanged:
+        for key, target_file in unchanged:
+            if on_done:
+                on_done((key, target_file))
+        pending = [pair for pair in pending if pair not in unchanged]
+    
+    # 覆盖前保存目标文件以便撤销
+    snapshot = snapshot_store.begin(f"恢复 {backup_prefix}")
+    try:
+        for _, target_file in pending:
+            snapshot.capture(target_file)
+        with metrics.operation("restore") as operation:
+            success_count, errors = storage.download_many(pending, on_done)
+            operation.finish([target_file for _, target_file in pending], [target_file for (_, target_file), _ in errors])
+    finally:
+        snapshot.commit()
+    failed = {target_file for (_, target_file), _ in errors}
+    for _, target_file in pending:
+        if target_file not in failed:
+            roster_model.file_changed(target_file)
+    errors = [(os.path.basename(target_file), error) for (_, target_file), error in errors]
+    if verify:
+        errors += read_back(storage, backup_prefix, [target_file for _, target_file in pending if target_file not in failed])
+    if journal:
+        journal.complete_folder(folder, errors)
+    return success_count, errors, len(pairs) - len(pending)
+
+def copy_config_files(source_folder, target_folder, files):
+    """复制配置文件，内容相同的文件跳过，返回 (复制数量, 失败列表, 已是最新的数量)"""
+    # 源目录只遍历一次取得文件状态
+    source_stats = copy_engine.stat_many(source_folder, files)
+    items = [
+        (filename, os.path.normpath(os.path.join(source_folder, filename)), source_stats[os.path.normcase(filename)])
+        for filename in files
+        if os.path.normcase(filename) in source_stats
+    ]
+    return copy_files(items, target_folder, f"迁移 {os.path.basename(source_folder)} → {os.path.basename(target_folder)}")
+
+def copy_files(items, target_folder, description, operation_name="migrate"):
+    """把 [(文件名, 源路径, 源文件状态)] 复制到目标文件夹，内容相同的文件跳过，返回 (复制数量, 失败列表, 已是最新的数量)"""
+    success_count = 0
+    unchanged_count = 0
+    errors = []
+    # 覆盖前保存目标文件以便撤销
+    snapshot = snapshot_store.begin(description)
+    copied = []
+    # 目标目录遍历一次取得文件状态，只创建一次
+    target_stats = copy_engine.stat_many(target_folder, [filename for filename, _, _ in items])
+    if items and not target_stats:
+        os.makedirs(target_folder, exist_ok=True)
+    try:
+        with metrics.operation(operation_name) as operation, durability.batch() as batch:
+            for filename, source_file, source_stat in items:
+                target_file = os.path.normpath(os.path.join(target_folder, filename))
+                target_stat = target_stats.get(os.path.normcase(filename))
+                try:
+                    if target_stat and target_stat.st_size == source_stat.st_size and files_identical(source_file, target_file):
+                        unchanged_count += 1
+                        continue
+                    with scheduler.io_slots, io_throttle.limit(target_file):
+                        snapshot.capture(target_file)
+                        replace_file(source_file, target_file, source_stat)
+                    batch.written(target_file)
+                    roster_model.file_changed(target_file)
+                    success_count += 1
+                    copied.append(target_file)
+                except Exception as e:
+                    errors.append((filename, str(e)))
+            operation.finish(copied, [filename for filename, _ in errors])
+    finally:
+        snapshot.commit()
+    return success_count, errors, unchanged_count
+
+def match_folders_by_mark(source_folders, source_marks, target_folders, target_marks):
+    """按标记名称配对源和目标角色文件夹，两侧同名标记都只取第一个，其余留给手动配对"""
+    # 目标标记名 -> 文件夹（同名标记取第一个）
+    target_by_mark = {}
+    for folder in target_folders:
+        mark = target_marks.get(folder)
+        if mark and mark not in target_by_mark:
+            target_by_mark[mark] = folder
+    
+    # 每个目标只配对一次，避免多个源写入同一个目标
+    pairs = []
+    for folder in source_folders:
+        mark = source_marks.get(folder)
+        if not mark or mark not in target_by_mark:
+            continue
+        pairs.append((mark, folder, target_by_mark.pop(mark)))
+    return pairs
+
+class StorageError(Exception):
+    """备份存储操作失败"""
+
+class BackupStorage:
+    """备份存储后端基类，键使用 "服务器/角色文件夹/文件名" 形式"""
+    max_workers = 8
+    retries = 3
+
+    def location(self, key=""):
+        """获取键对应的显示位置"""
+        raise NotImplementedError
+
+    def list_files(self, prefix=""):
+        """列出前缀下的所有文件，返回 {键: 修改时间}"""
+        raise NotImplementedError
+
+    def upload_file(self, local_path, key):
+        """上传单个文件"""
+        raise NotImplementedError
+
+    def download_file(self, key, local_path):
+        """下载单个文件"""
+        raise NotImplementedError
+
+    def exists(self, prefix):
+        """前缀下是否存在文件"""
+        return bool(self.list_files(prefix))
+
+    def backup_times(self, server_folder, folders):
+        """获取各角色备份的最新修改时间，未备份为 None，时间未知为 0"""
+        times = {}
+        for key, mtime in self.list_files(server_folder).items():
+            parts = key.split("/")
+            if len(parts) < 3:
+                continue
+            folder = parts[1]
+            latest = times.get(folder, 0)
+            if key.endswith(".DAT"):
+                latest = max(latest, mtime)
+            times[folder] = latest
+        return {folder: times.get(folder) for folder in folders}
+
+    def with_retry(self, func, *args):
+        """失败时按指数退避重试"""
+        for attempt in range(self.retries):
+            try:
+                return func(*args)
+            except StorageError:
+                raise
+            except Exception:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def matches(self, key, local_path, remote_mtime):
+        """判断已存储的文件与本地文件是否一致，默认比较原文件修改时间，无法得知时视为不一致"""
+        mtime = self.stored_mtime(key, remote_mtime)
+        return mtime is not None and abs(mtime - os.path.getmtime(local_path)) < 1
+
+    def stored_mtime(self, key, remote_mtime):
+        """已存储文件对应的原文件修改时间，remote_mtime 为列表中的修改时间，无法得知时返回 None"""
+        return remote_mtime
+
+    def is_identical(self, key, local_path):
+        """不下载即可确认内容相同时返回 True，远程存储无法确认"""
+        return False
+
+    def local_path(self, key):
+        """键对应的本地文件路径，远程存储返回 None"""
+        return None
+
+    def stored_hash(self, key):
+        """已存储内容的哈希，需要下载才能计算时返回 None"""
+        path = self.local_path(key)
+        return hash_file(path, CHECKSUM_BUFFER_SIZE) if path else None
+
+    def read_bytes(self, key):
+        """读取存储中的小文件，不存在时返回 None"""
+        if key not in self.list_files(key.rsplit("/", 1)[0]):
+            return None
+        fd, temp_path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.download_file(key, temp_path)
+            with open(temp_path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(temp_path)
+
+    def write_bytes(self, key, data):
+        """写入小文件到存储"""
+        fd, temp_path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            self.upload_file(temp_path, key)
+        finally:
+            os.remove(temp_path)
+
+    def transfer_many(self, func, pairs, on_done=None, local_index=0):
+        """并发执行传输，返回成功数量和失败列表，每完成一项调用 on_done；local_index 为本地路径在 pair 中的位置"""
+        if not pairs:
+            return 0, []
+        
+        def run(pair):
+            try:
+                with scheduler.io_slots, io_throttle.limit(pair[local_index]):
+                    self.with_retry(func, *pair)
+                # 上传写入存储中的位置，下载写入本地路径
+                batch.written(pair[1] if local_index == 1 else self.local_path(pair[1]))
+                if on_done:
+                    on_done(pair)
+                return None
+            except Exception as e:
+                return pair, str(e)
+        
+        with durability.batch() as batch:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pairs))) as executor:
+                errors = [result for result in executor.map(run, pairs) if result]
+        return len(pairs) - len(errors), errors
+
+    def upload_many(self, pairs, on_done=None):
+        """并发上传 (本地路径, 键) 列表"""
+        return self.transfer_many(self.upload_file, pairs, on_done)
+
+    def download_many(self, pairs, on_done=None):
+        """并发下载 (键, 本地路径) 列表"""
+        return self.transfer_many(self.download_file, pairs, on_done, 1)
+
+class LocalStorage(BackupStorage):
+    """本地或已挂载文件夹"""
+
+    def __init__(self, root):
+        self.root = root
+        self.created_dirs = set()
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        """获取键对应的本地路径"""
+        return os.path.normpath(os.path.join(self.root, *key.split("/")))
+
+    def location(self, key=""):
+        return self.path(key)
+
+    def list_files(self, prefix=""):
+        files = {}
+        base = self.path(prefix)
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                files[key] = os.path.getmtime(path)
+        return files
+
+    def exists(self, prefix):
+        return os.path.exists(self.path(prefix))
+
+    def backup_times(self, server_folder, folders):
+        backup_dir = self.path(server_folder)
+        return {folder: get_latest_backup_time(os.path.join(backup_dir, folder)) for folder in folders}
+
+    def matches(self, key, local_path, remote_mtime):
+        """比较大小和内容哈希"""
+        return files_identical(self.path(key), local_path)
+
+    def is_identical(self, key, local_path):
+        return files_identical(self.path(key), local_path)
+
+    def local_path(self, key):
+        return self.path(key)
+
+    def ensure_dir(self, path):
+        """每个目录只创建一次"""
+        directory = os.path.dirname(path)
+        with self.lock:
+            if directory in self.created_dirs:
+                return
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            self.created_dirs.add(directory)
+
+    def upload_file(self, local_path, key):
+        target = self.path(key)
+        self.ensure_dir(target)
+        copy_engine.copy_file(local_path, target)
+
+    def download_file(self, key, local_path):
+        replace_file(self.path(key), local_path)
+
+class HTTPStorage(BackupStorage):
+    """基于 HTTP 的存储，每个线程复用一个连接"""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.scheme = parsed.scheme or "http"
+        self.host = parsed.netloc
+        self.base_path = parsed.path.rstrip("/")
+        self.local = threading.local()
+
+    def connection(self):
+        """获取当前线程的连接"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(self.host, timeout=30)
+            self.local.conn = conn
+        return conn
+
+    def request(self, method, path, body=b"", headers=None, ok=(200, 201, 204)):
+        """发送请求，连接错误和 5xx 由 with_retry 重试"""
+        conn = self.connection()
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            data = response.read()
+        except Exception:
+            conn.close()
+            self.local.conn = None
+            raise
+        if response.status >= 500:
+            raise OSError(f"{method} {path} 失败：HTTP {response.status}")
+        if response.status not in ok:
+            raise StorageError(f"{method} {path} 失败：HTTP {response.status}")
+        return response, data
+
+    def write_download(self, data, local_path, mtime=None):
+        """先写入临时文件再替换，避免留下不完整的文件"""
+        temp_path = f"{local_path}.download"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        if mtime:
+            os.utime(temp_path, (mtime, mtime))
+        os.replace(temp_path, local_path)
+
+class S3Storage(HTTPStorage):
+    """S3 兼容对象存储（路径风格寻址，SigV4 签名）"""
+    part_size = 8 * 1024 * 1024
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, region="us-east-1", prefix=""):
+        super().__init__(endpoint)
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region or "us-east-1"
+        self.prefix = prefix.strip("/")
+
+    def object_key(self, key):
+        """获取带前缀的对象键"""
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def location(self, key=""):
+        return f"s3://{self.bucket}/{self.object_key(key)}"
+
+    def signed_request(self, method, key="", query=None, body=b"", headers=None, ok=(200, 204)):
+        """发送 SigV4 签名请求"""
+        query = query or {}
+        headers = dict(headers or {})
+        now = time.gmtime()
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", now)
+        datestamp = time.strftime("%Y%m%d", now)
+        payload_hash = hashlib.sha256(body).hexdigest()
+        
+        path = urllib.parse.quote(f"{self.base_path}/{self.bucket}" + (f"/{self.object_key(key)}" if key else ""), safe="/-_.~")
+        canonical_query = "&".join(
+            f"{urllib.parse.quote(k, safe='-_.~')}={urllib.parse.quote(v, safe='-_.~')}"
+            for k, v in sorted(query.items())
+        )
+        headers.update({
+            "host": self.host,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash
+        })
+        signed_headers = ";".join(sorted(name.lower() for name in headers))
+        canonical_headers = "".join(
+            f"{name.lower()}:{str(value).strip()}\n"
+            for name, value in sorted(headers.items(), key=lambda item: item[0].lower())
+        )
+        canonical_request = "\n".join([method, path, canonical_query, canonical_headers, signed_headers, payload_hash])
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        signing_key = f"AWS4{self.secret_key}".encode("utf-8")
+        for part in (datestamp, self.region, "s3", "aws4_request"):
+            signing_key = hmac.new(signing_key, part.encode("utf-8"), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        
+        if canonical_query:
+            path = f"{path}?{canonical_query}"
+        return self.request(method, path, body, headers, ok)
+
+    def list_files(self, prefix=""):
+        files = {}
+        query = {"list-type": "2", "prefix": self.object_key(prefix)}
+        while True:
+            _, data = self.with_retry(self.signed_request, "GET", "", query)
+            root = ElementTree.fromstring(data)
+            namespace = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+            for content in root.iter(f"{namespace}Contents"):
+                key = content.findtext(f"{namespace}Key")
+                modified = content.findtext(f"{namespace}LastModified")
+                if self.prefix:
+                    key = key[len(self.prefix) + 1:]
+                files[key] = datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp()
+            token = root.findtext(f"{namespace}NextContinuationToken")
+            if root.findtext(f"{namespace}IsTruncated") != "true" or not token:
+                return files
+            query["continuation-token"] = token
+
+    def upload_file(self, local_path, key):
+        mtime = str(os.path.getmtime(local_path))
+        size = os.path.getsize(local_path)
+        if size <= self.part_size:
+            with open(local_path, 'rb') as f:
+                self.signed_request("PUT", key, body=f.read(), headers={"x-amz-meta-mtime": mtime})
+            return
+        
+        # 大文件使用分段上传，各分段并发上传
+        _, data = self.signed_request("POST", key, {"uploads": ""}, headers={"x-amz-meta-mtime": mtime})
+        root = ElementTree.fromstring(data)
+        upload_id = next(element.text for element in root.iter() if element.tag.endswith("UploadId"))
+        
+        def upload_part(part_number):
+            with open(local_path, 'rb') as f:
+                f.seek((part_number - 1) * self.part_size)
+                body = f.read(self.part_size)
+            response, _ = self.with_retry(
+                self.signed_request, "PUT", key,
+                {"partNumber": str(part_number), "uploadId": upload_id}, body
+            )
+            return part_number, response.getheader("ETag")
+        
+        try:
+            part_count = (size + self.part_size - 1) // self.part_size
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, part_count)) as executor:
+                parts = list(executor.map(upload_part, range(1, part_count + 1)))
+            body = "<CompleteMultipartUpload>" + "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in parts
+            ) + "</CompleteMultipartUpload>"
+            self.signed_request("POST", key, {"uploadId": upload_id}, body.encode("utf-8"))
+        except Exception:
+            self.signed_request("DELETE", key, {"uploadId": upload_id})
+            raise
+
+    def stored_mtime(self, key, remote_mtime):
+        # 列表中的修改时间是上传时间，原文件修改时间保存在对象元数据中
+        response, _ = self.signed_request("HEAD", key, ok=(200,))
+        mtime = response.getheader("x-amz-meta-mtime")
+        return float(mtime) if mtime else None
+
+    def download_file(self, key, local_path):
+        response, data = self.signed_request("GET", key)
+        mtime = response.getheader("x-amz-meta-mtime")
+        self.write_download(data, local_path, float(mtime) if mtime else None)
+
+class WebDAVStorage(HTTPStorage):
+    """WebDAV 存储"""
+
+    def __init__(self, url, username="", password=""):
+        super().__init__(url)
+        self.url = url.rstrip("/")
+        self.auth = None
+        if username:
+            token = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+            self.auth = f"Basic {token}"
+        self.created_dirs = set()
+        self.lock = threading.Lock()
+
+    def location(self, key=""):
+        return f"{self.url}/{key}"
+
+    def path(self, key):
+        """获取键对应的请求路径"""
+        return urllib.parse.quote(f"{self.base_path}/{key}", safe="/-_.~")
+
+    def headers(self, extra=None):
+        """获取带认证的请求头"""
+        headers = dict(extra or {})
+        if self.auth:
+            headers["Authorization"] = self.auth
+        return headers
+
+    def ensure_collections(self, key):
+        """逐级创建上级目录，每个目录只创建一次"""
+        parts = key.split("/")[:-1]
+        for index in range(1, len(parts) + 1):
+            collection = "/".join(parts[:index])
+            with self.lock:
+                if collection in self.created_dirs:
+                    continue
+            # 405 表示目录已存在
+            self.request("MKCOL", self.path(collection) + "/", headers=self.headers(), ok=(200, 201, 405))
+            with self.lock:
+                self.created_dirs.add(collection)
+
+    def list_files(self, prefix=""):
+        files = {}
+        pending = [prefix.strip("/")]
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<d:propfind xmlns:d="DAV:"><d:prop><d:resourcetype/><d:getlastmodified/></d:prop></d:propfind>'
+        ).encode("utf-8")
+        while pending:
+            collection = pending.pop()
+            request_path = self.path(collection) + ("/" if collection else "")
+            try:
+                _, data = self.with_retry(
+                    self.request, "PROPFIND", request_path, body,
+                    self.headers({"Depth": "1", "Content-Type": "application/xml"}), (207,)
+                )
+            except StorageError:
+                # 目录不存在
+                continue
+            for response in ElementTree.fromstring(data).iter("{DAV:}response"):
+                href = urllib.parse.unquote(urllib.parse.urlsplit(response.findtext("{DAV:}href")).path)
+                key = href[len(self.base_path):].strip("/")
+                if key == collection:
+                    continue
+                if response.find(".//{DAV:}collection") is not None:
+                    pending.append(key)
+                    continue
+                modified = response.findtext(".//{DAV:}getlastmodified")
+                files[key] = email.utils.parsedate_to_datetime(modified).timestamp() if modified else 0
+        return files
+
+    def stored_mtime(self, key, remote_mtime):
+        # 服务器记录的是上传时间，不保存原文件修改时间
+        return None
+
+    def upload_file(self, local_path, key):
+        self.ensure_collections(key)
+        with open(local_path, 'rb') as f:
+            self.request("PUT", self.path(key), f.read(), self.headers())
+
+    def download_file(self, key, local_path):
+        _, data = self.request("GET", self.path(key), headers=self.headers(), ok=(200,))
+        self.write_download(data, local_path)
+
+# 加密备份文件格式：魔数、盐、随机数前缀、原修改时间和分块大小组成文件头，
+# 之后是被口令密钥包装的文件密钥，以及逐块 AES-GCM 加密的内容
+ENCRYPTION_MAGIC = b"CCMTENC1"
+ENCRYPTION_CHUNK_SIZE = 1024 * 1024
+ENCRYPTION_TAG_SIZE = 16
+ENCRYPTION_HEADER = struct.Struct("<8s16s8sdI")
+
+class EncryptedStorage(BackupStorage):
+    """加密包装：上传时流式加密，下载时自动识别并解密"""
+    key_cache = {}
+    session_salts = {}
+    key_lock = threading.Lock()
+    # 密码只保存在内存中，每次运行输入一次，不写入配置文件
+    session_passphrase = ""
+
+    def __init__(self, inner, passphrase="", encrypt=False):
+        self.inner = inner
+        self.passphrase = passphrase
+        self.encrypt = encrypt
+        self.max_workers = inner.max_workers
+
+    def location(self, key=""):
+        return self.inner.location(key)
+
+    def list_files(self, prefix=""):
+        return self.inner.list_files(prefix)
+
+    def exists(self, prefix):
+        return self.inner.exists(prefix)
+
+    def backup_times(self, server_folder, folders):
+        return self.inner.backup_times(server_folder, folders)
+
+    def matches(self, key, local_path, remote_mtime):
+        if not self.encrypt:
+            return self.inner.matches(key, local_path, remote_mtime)
+        return super().matches(key, local_path, remote_mtime)
+
+    def stored_mtime(self, key, remote_mtime):
+        return self.inner.stored_mtime(key, remote_mtime)
+
+    def is_identical(self, key, local_path):
+        # 已加密的备份内容与原文件不同，比较结果自然为 False
+        return self.inner.is_identical(key, local_path)
+
+    def local_path(self, key):
+        return self.inner.local_path(key)
+
+    def stored_hash(self, key):
+        return self.inner.stored_hash(key)
+
+    def read_bytes(self, key):
+        return self.inner.read_bytes(key)
+
+    def write_bytes(self, key, data):
+        self.inner.write_bytes(key, data)
+
+    def derive_key(self, salt):
+        """由口令派生包装密钥，同一进程内缓存（持锁计算，避免多个线程重复派生）"""
+        with self.key_lock:
+            key = self.key_cache.get((self.passphrase, salt))
+            if key is None:
+                key = hashlib.scrypt(
+                    self.passphrase.encode("utf-8"), salt=salt, n=2 ** 15, r=8, p=1, maxmem=64 * 1024 * 1024, dklen=32
+                )
+                self.key_cache[(self.passphrase, salt)] = key
+        return key
+
+    def session_salt(self):
+        """同一口令在进程内使用同一个盐，避免每个文件都重新派生密钥"""
+        with self.key_lock:
+            salt = self.session_salts.get(self.passphrase)
+            if salt is None:
+                salt = self.session_salts[self.passphrase] = os.urandom(16)
+        return salt
+
+    def encrypt_file(self, source, target):
+        """流式加密文件"""
+        salt = self.session_salt()
+        file_key = os.urandom(32)
+        nonce_prefix = os.urandom(8)
+        wrap_nonce = os.urandom(12)
+        header = ENCRYPTION_HEADER.pack(
+            ENCRYPTION_MAGIC, salt, nonce_prefix, os.path.getmtime(source), ENCRYPTION_CHUNK_SIZE
+        )
+        wrapped_key = AESGCM(self.derive_key(salt)).encrypt(wrap_nonce, file_key, header)
+        cipher = AESGCM(file_key)
+        
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            dst.write(header + wrap_nonce + wrapped_key)
+            chunk = src.read(ENCRYPTION_CHUNK_SIZE)
+            counter = 0
+            while True:
+                # 预读下一块以标记最后一块，防止截断
+                next_chunk = src.read(ENCRYPTION_CHUNK_SIZE)
+                final = not next_chunk
+                nonce = nonce_prefix + struct.pack(">I", counter)
+                data = cipher.encrypt(nonce, chunk, header + struct.pack(">I?", counter, final))
+                dst.write(struct.pack("<I", len(data)) + data)
+                if final:
+                    break
+                chunk = next_chunk
+                counter += 1
+
+    def decrypt_file(self, source, target):
+        """流式解密文件"""
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            header = src.read(ENCRYPTION_HEADER.size)
+            _, salt, nonce_prefix, mtime, _ = ENCRYPTION_HEADER.unpack(header)
+            wrap_nonce = src.read(12)
+            wrapped_key = src.read(48)
+            try:
+                file_key = AESGCM(self.derive_key(salt)).decrypt(wrap_nonce, wrapped_key, header)
+            except InvalidTag:
+                raise StorageError("密码错误或备份已损坏")
+            cipher = AESGCM(file_key)
+            
+            counter = 0
+            length = src.read(4)
+            while length:
+                # 长度未经认证，先检查再读取，避免损坏的文件导致分配过大的内存
+                size = struct.unpack("<I", length)[0] if len(length) == 4 else 0
+                if not 0 < size <= ENCRYPTION_CHUNK_SIZE + ENCRYPTION_TAG_SIZE:
+                    raise StorageError("备份已损坏或不完整")
+                data = src.read(size)
+                length = src.read(4)
+                final = not length
+                nonce = nonce_prefix + struct.pack(">I", counter)
+                try:
+                    dst.write(cipher.decrypt(nonce, data, header + struct.pack(">I?", counter, final)))
+                except InvalidTag:
+                    raise StorageError("备份已损坏或不完整")
+                counter += 1
+            if counter == 0:
+                raise StorageError("备份已损坏或不完整")
+        os.utime(target, (mtime, mtime))
+
+    def upload_file(self, local_path, key):
+        if not self.encrypt:
+            self.inner.upload_file(local_path, key)
+            return
+        if AESGCM is None:
+            raise StorageError("加密备份需要安装 cryptography")
+        if not self.passphrase:
+            raise StorageError("已启用加密，请先在备份存储设置中填写密码")
+        
+        mtime = os.path.getmtime(local_path)
+        if isinstance(self.inner, LocalStorage):
+            # 本地存储直接加密写入目标，省去一次复制
+            target = self.inner.path(key)
+            self.inner.ensure_dir(target)
+            self.encrypt_file(local_path, f"{target}.ccmt-tmp")
+            os.utime(f"{target}.ccmt-tmp", (mtime, mtime))
+            os.replace(f"{target}.ccmt-tmp", target)
+            return
+        
+        fd, temp_path = tempfile.mkstemp(suffix=".enc")
+        os.close(fd)
+        try:
+            self.encrypt_file(local_path, temp_path)
+            os.utime(temp_path, (mtime, mtime))
+            self.inner.upload_file(temp_path, key)
+        finally:
+            os.remove(temp_path)
+
+    def download_file(self, key, local_path):
+        temp_path = f"{local_path}.ccmt-enc"
+        self.inner.download_file(key, temp_path)
+        try:
+            with open(temp_path, 'rb') as f:
+                encrypted = f.read(len(ENCRYPTION_MAGIC)) == ENCRYPTION_MAGIC
+            if not encrypted:
+                os.replace(temp_path, local_path)
+                return
+            if not self.passphrase:
+                raise StorageError("备份已加密，请先在备份存储设置中填写密码")
+            if AESGCM is None:
+                raise StorageError("加密备份需要安装 cryptography")
+            self.decrypt_file(temp_path, f"{local_path}.ccmt-tmp")
+            os.replace(f"{local_path}.ccmt-tmp", local_path)
+        finally:
+            for path in (temp_path, f"{local_path}.ccmt-tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+# 压缩备份文件格式：魔数之后是一个 zstd 帧，帧头中记录所用字典的 ID
+COMPRESSION_MAGIC = b"CCMTZST1"
+# 使用训练的字典后较低的级别即可获得接近的压缩率，高级别在备份时逐文件压缩太慢
+COMPRESSION_LEVEL = 6
+DICTIONARY_PREFIX = "_dictionaries"
+# 样本数达到下限才训练字典，增长到上次训练时的 1.5 倍后训练新版本
+DICTIONARY_MIN_SAMPLES = 8
+DICTIONARY_RETRAIN_GROWTH = 1.5
+DICTIONARY_MAX_SIZE = 64 * 1024
+# 同一游戏目录在该间隔（秒）内只检查一次样本数，之后的备份重新检查是否需要训练
+DICTIONARY_REFRESH_INTERVAL = 60
+
+class ZstdDictionaries:
+    """按文件类型训练的 zstd 字典，与备份保存在同一存储中，旧版本一直保留以便解压旧备份"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        # 锁只保护内存中的索引和缓存，读写存储和训练都在锁外进行
+        self.lock = threading.Lock()
+        self.publish_lock = threading.Lock()
+        self.index = None
+        self.cache = {}
+        self.refreshed_roots = {}
+
+    def read(self, key):
+        """下载存储中的文件内容"""
+        fd, temp_path = tempfile.mkstemp(suffix=".zdict")
+        os.close(fd)
+        try:
+            self.storage.download_file(key, temp_path)
+            with open(temp_path, 'rb') as f:
+                return f.read()
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def write(self, key, data):
+        """上传内容到存储"""
+        fd, temp_path = tempfile.mkstemp(suffix=".zdict")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            self.storage.upload_file(temp_path, key)
+        finally:
+            os.remove(temp_path)
+
+    def load_index(self):
+        """加载 {文件类型: [各版本字典信息]}，返回的索引不会被修改"""
+        with self.lock:
+            if self.index is not None:
+                return self.index
+        index_key = f"{DICTIONARY_PREFIX}/index.json"
+        if index_key in self.storage.list_files(DICTIONARY_PREFIX):
+            index = json.loads(self.read(index_key))
+        else:
+            index = {}
+        with self.lock:
+            if self.index is None:
+                self.index = index
+            return self.index
+
+    def get(self, dict_id):
+        """按 ID 获取字典，解压时使用"""
+        with self.lock:
+            dictionary = self.cache.get(dict_id)
+        if dictionary is None:
+            dictionary = zstd.ZstdCompressionDict(self.read(f"{DICTIONARY_PREFIX}/{dict_id}.zdict"))
+            with self.lock:
+                dictionary = self.cache.setdefault(dict_id, dictionary)
+        return dictionary
+
+    def current(self, config_file):
+        """获取文件类型的最新字典，尚未训练时返回 None"""
+        versions = self.load_index().get(config_file)
+        return self.get(versions[-1]["id"]) if versions else None
+
+    def refresh(self, root):
+        """以角色文件夹中的同类文件为样本，样本足够且明显增多时训练新版本字典"""
+        now = time.monotonic()
+        with self.lock:
+            # 其他线程正在检查或刚检查过时直接使用现有字典，不等待训练
+            if now - self.refreshed_roots.get(root, -DICTIONARY_REFRESH_INTERVAL) < DICTIONARY_REFRESH_INTERVAL:
+                return
+            self.refreshed_roots[root] = now
+        index = self.load_index()
+        folders = list_character_folders(root)
+        trained = {}
+        for config_file, _ in CONFIG_FILES:
+            paths = [os.path.join(root, folder, config_file) for folder in folders]
+            paths = [path for path in paths if os.path.exists(path)]
+            versions = index.get(config_file, [])
+            samples_count = versions[-1]["samples"] if versions else 0
+            if len(paths) < DICTIONARY_MIN_SAMPLES or len(paths) < samples_count * DICTIONARY_RETRAIN_GROWTH:
+                continue
+            
+            samples = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    samples.append(f.read())
+            dict_size = min(DICTIONARY_MAX_SIZE, max(1024, sum(map(len, samples)) // 10))
+            try:
+                dictionary = zstd.train_dictionary(dict_size, samples)
+            except zstd.ZstdError:
+                # 样本内容太少或差异太大时无法训练，继续使用现有字典
+                continue
+            
+            # 先保存字典再更新索引，索引损坏时字典仍可按 ID 找到
+            self.write(f"{DICTIONARY_PREFIX}/{dictionary.dict_id()}.zdict", dictionary.as_bytes())
+            trained[config_file] = (dictionary, len(paths))
+        if trained:
+            self.publish(index, trained)
+
+    def publish(self, base_index, trained):
+        """把新训练的字典加入索引；某个文件类型在训练期间已被其他线程更新时放弃该类型的结果，字典文件保留"""
+        with self.lock:
+            index = dict(self.index)
+            for config_file, (dictionary, samples) in trained.items():
+                versions = index.get(config_file, [])
+                if versions != base_index.get(config_file, []):
+                    continue
+                self.cache[dictionary.dict_id()] = dictionary
+                index[config_file] = versions + [{
+                    "id": dictionary.dict_id(),
+                    "version": len(versions) + 1,
+                    "samples": samples,
+                    "created": time.time()
+                }]
+            self.index = index
+        with self.publish_lock:
+            # 按发布顺序写入，较早的索引不会覆盖较新的
+            with self.lock:
+                if self.index is not index:
+                    return
+            self.write(f"{DICTIONARY_PREFIX}/index.json", json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8"))
+
+class CompressedStorage(BackupStorage):
+    """上传前用按文件类型训练的字典压缩，下载时根据文件头判断是否需要解压"""
+
+    def __init__(self, inner, compress=False, level=COMPRESSION_LEVEL):
+        self.inner = inner
+        self.compress = compress
+        self.level = level
+        self.dictionaries = ZstdDictionaries(inner)
+
+    def location(self, key=""):
+        return self.inner.location(key)
+
+    def list_files(self, prefix=""):
+        return self.inner.list_files(prefix)
+
+    def exists(self, prefix):
+        return self.inner.exists(prefix)
+
+    def backup_times(self, server_folder, folders):
+        return self.inner.backup_times(server_folder, folders)
+
+    def matches(self, key, local_path, remote_mtime):
+        if not self.compress:
+            return self.inner.matches(key, local_path, remote_mtime)
+        return super().matches(key, local_path, remote_mtime)
+
+    def stored_mtime(self, key, remote_mtime):
+        return self.inner.stored_mtime(key, remote_mtime)
+
+    def is_identical(self, key, local_path):
+        return self.inner.is_identical(key, local_path)
+
+    def local_path(self, key):
+        return self.inner.local_path(key)
+
+    def stored_hash(self, key):
+        return self.inner.stored_hash(key)
+
+    def read_bytes(self, key):
+        return self.inner.read_bytes(key)
+
+    def write_bytes(self, key, data):
+        self.inner.write_bytes(key, data)
+
+    def upload_file(self, local_path, key):
+        if not self.compress:
+            self.inner.upload_file(local_path, key)
+            return
+        if zstd is None:
+            raise StorageError("压缩备份需要安装 zstandard")
+        
+        # 上传游戏目录的文件时检查是否需要训练字典
+        self.dictionaries.refresh(os.path.dirname(os.path.dirname(os.path.abspath(local_path))))
+        dictionary = self.dictionaries.current(key.rsplit("/", 1)[-1])
+        compressor = zstd.ZstdCompressor(level=self.level, dict_data=dictionary)
+        with open(local_path, 'rb') as f:
+            data = compressor.compress(f.read())
+        
+        mtime = os.path.getmtime(local_path)
+        fd, temp_path = tempfile.mkstemp(suffix=".zst")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(COMPRESSION_MAGIC)
+            f.write(data)
+        try:
+            os.utime(temp_path, (mtime, mtime))
+            self.inner.upload_file(temp_path, key)
+        finally:
+            os.remove(temp_path)
+
+    def download_file(self, key, local_path):
+        temp_path = f"{local_path}.ccmt-zst"
+        self.inner.download_file(key, temp_path)
+        try:
+            with open(temp_path, 'rb') as f:
+                data = f.read()
+            if not data.startswith(COMPRESSION_MAGIC):
+                os.replace(temp_path, local_path)
+                return
+            if zstd is None:
+                raise StorageError("备份已压缩，需要安装 zstandard")
+            
+            # 按帧头中的字典 ID 选择字典，旧版本字典压缩的备份同样可以解压
+            frame = data[len(COMPRESSION_MAGIC):]
+            dict_id = zstd.get_frame_parameters(frame).dict_id
+            dictionary = self.dictionaries.get(dict_id) if dict_id else None
+            with open(f"{local_path}.ccmt-tmp", 'wb') as f:
+                f.write(zstd.ZstdDecompressor(dict_data=dictionary).decompress(frame))
+            mtime = os.path.getmtime(temp_path)
+            os.utime(f"{local_path}.ccmt-tmp", (mtime, mtime))
+            os.replace(f"{local_path}.ccmt-tmp", local_path)
+        finally:
+            for path in (temp_path, f"{local_path}.ccmt-tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+# 备份包格式：每个文件独立压缩为一帧，帧之后是按键排序的中央索引，文件末尾为 (索引偏移, 索引长度, 魔数)。
+# 索引由条目数、定长条目和键字符串表组成，通过内存映射二分查找，列出或恢复单个角色、文件时只读取所需的索引页和数据帧
+ARCHIVE_MAGIC = b"CCMTPAK1"
+ARCHIVE_FOOTER = struct.Struct("<QQ8s")
+# 条目：帧偏移、帧长度、原始大小、CRC32、修改时间、键在字符串表中的偏移和长度、压缩方式
+ARCHIVE_ENTRY = struct.Struct("<QIIIdIIB3x")
+ARCHIVE_STORED, ARCHIVE_ZLIB, ARCHIVE_ZSTD = 0, 1, 2
+
+def write_archive(output_path, items):
+    """把 [(键, 本地路径, 修改时间)] 写入备份包"""
+    items = sorted(items, key=lambda item: item[0].encode("utf-8"))
+    compressor = zstd.ZstdCompressor(level=10) if zstd else None
+    entries = []
+    names = bytearray()
+    temp_path = f"{output_path}.ccmt-tmp"
+    with open(temp_path, 'wb') as f:
+        for key, path, mtime in items:
+            with open(path, 'rb') as source:
+                data = source.read()
+            if compressor:
+                frame, codec = compressor.compress(data), ARCHIVE_ZSTD
+            else:
+                frame, codec = zlib.compress(data, 6), ARCHIVE_ZLIB
+            if len(frame) >= len(data):
+                frame, codec = data, ARCHIVE_STORED
+            name = key.encode("utf-8")
+            entries.append(ARCHIVE_ENTRY.pack(f.tell(), len(frame), len(data), zlib.crc32(data), mtime, len(names), len(name), codec))
+            names += name
+            f.write(frame)
+        index_offset = f.tell()
+        f.write(struct.pack("<I", len(entries)))
+        f.write(b"".join(entries))
+        f.write(names)
+        f.write(ARCHIVE_FOOTER.pack(index_offset, f.tell() - index_offset, ARCHIVE_MAGIC))
+    with durability.batch() as batch:
+        batch.written(temp_path)
+    os.replace(temp_path, output_path)
+
+class BackupArchive:
+    """只读打开备份包"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("不是有效的备份包")
+        size = len(self.map)
+        if size >= ARCHIVE_FOOTER.size:
+            index_offset, index_length, magic = ARCHIVE_FOOTER.unpack_from(self.map, size - ARCHIVE_FOOTER.size)
+        else:
+            magic = None
+        if magic != ARCHIVE_MAGIC or index_offset + index_length + ARCHIVE_FOOTER.size != size:
+            self.close()
+            raise ValueError("不是有效的备份包")
+        self.count = struct.unpack_from("<I", self.map, index_offset)[0]
+        self.entries_offset = index_offset + 4
+        self.names_offset = self.entries_offset + self.count * ARCHIVE_ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """关闭内存映射和文件"""
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+        self.file.close()
+
+    def raw_entry(self, index):
+        """读取第 index 个索引条目"""
+        return ARCHIVE_ENTRY.unpack_from(self.map, self.entries_offset + index * ARCHIVE_ENTRY.size)
+
+    def key_at(self, index):
+        """第 index 个条目的键（字节）"""
+        *_, name_offset, name_length, _ = self.raw_entry(index)
+        start = self.names_offset + name_offset
+        return self.map[start:start + name_length]
+
+    def lower_bound(self, key):
+        """二分查找第一个不小于 key 的条目"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entry(self, index):
+        """第 index 个条目的信息"""
+        offset, length, size, crc, mtime, _, _, codec = self.raw_entry(index)
+        return {
+            "key": self.key_at(index).decode("utf-8"),
+            "offset": offset, "length": length, "size": size, "crc": crc, "mtime": mtime, "codec": codec
+        }
+
+    def entries(self, prefix=""):
+        """列出键以 prefix 开头的条目"""
+        prefix = prefix.encode("utf-8")
+        index = self.lower_bound(prefix)
+        while index < self.count and self.key_at(index).startswith(prefix):
+            yield self.entry(index)
+            index += 1
+
+    def find(self, key):
+        """查找键对应的条目，不存在时返回 None"""
+        index = self.lower_bound(key.encode("utf-8"))
+        if index < self.count and self.key_at(index) == key.encode("utf-8"):
+            return self.entry(index)
+        return None
+
+    def read(self, entry):
+        """读取并解压条目对应的帧"""
+        frame = self.map[entry["offset"]:entry["offset"] + entry["length"]]
+        if entry["codec"] == ARCHIVE_ZSTD and zstd is None:
+            raise StorageError("读取该备份包需要安装 zstandard")
+        try:
+            if entry["codec"] == ARCHIVE_ZSTD:
+                data = zstd.ZstdDecompressor().decompress(frame, max_output_size=entry["size"])
+            elif entry["codec"] == ARCHIVE_ZLIB:
+                data = zlib.decompress(frame)
+            else:
+                data = frame
+        except Exception:
+            data = None
+        if data is None or len(data) != entry["size"] or zlib.crc32(data) != entry["crc"]:
+            raise StorageError(f"备份包中的 {entry['key']} 已损坏")
+        return data
+
+class ArchiveStorage(BackupStorage):
+    """以备份包作为只读存储，用于从备份包恢复"""
+
+    def __init__(self, path):
+        self.archive = BackupArchive(path)
+
+    def location(self, key=""):
+        return f"{self.archive.path}:{key}" if key else self.archive.path
+
+    def list_files(self, prefix=""):
+        prefix = f"{prefix.rstrip('/')}/" if prefix else ""
+        return {entry["key"]: entry["mtime"] for entry in self.archive.entries(prefix)}
+
+    def upload_file(self, local_path, key):
+        raise StorageError("备份包为只读")
+
+    def download_file(self, key, local_path):
+        entry = self.archive.find(key)
+        if entry is None:
+            raise FileNotFoundError(key)
+        temp_path = f"{local_path}.ccmt-tmp"
+        data = self.archive.read(entry)
+        if data.startswith(ENCRYPTION_MAGIC):
+            # 从加密备份导出的备份包，使用本次运行输入的密码解密
+            if not EncryptedStorage.session_passphrase:
+                raise StorageError("备份包已加密，请先在备份存储设置中填写密码")
+            if AESGCM is None:
+                raise StorageError("加密备份需要安装 cryptography")
+            with open(f"{local_path}.ccmt-enc", 'wb') as f:
+                f.write(data)
+            try:
+                EncryptedStorage(self, EncryptedStorage.session_passphrase).decrypt_file(f"{local_path}.ccmt-enc", temp_path)
+            finally:
+                os.remove(f"{local_path}.ccmt-enc")
+        else:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+        os.utime(temp_path, (entry["mtime"], entry["mtime"]))
+        os.replace(temp_path, local_path)
+
+    def is_identical(self, key, local_path):
+        entry = self.archive.find(key)
+        if entry is None or os.path.getsize(local_path) != entry["size"]:
+            return False
+        with open(local_path, 'rb') as f:
+            return zlib.crc32(f.read()) == entry["crc"]
+
+    def close(self):
+        """关闭备份包"""
+        self.archive.close()
+
+def pack_backups(config, output_path):
+    """把备份存储中所有角色的配置文件打包为备份包，返回 (角色数, 文件数)；启用加密时各文件加密后写入"""
+    storage_config = config.get("backup_storage") or {}
+    storage = create_backup_storage(storage_config, config.get("backup_path", ""))
+    if storage is None:
+        raise ValueError("未设置备份路径")
+    if storage_config.get("encrypt"):
+        if AESGCM is None:
+            raise StorageError("加密备份需要安装 cryptography")
+        if not EncryptedStorage.session_passphrase:
+            raise StorageError("已启用加密，请先在备份存储设置中填写密码")
+    names = {name for name, _ in CONFIG_FILES}
+    files = {}
+    for server_type in ("international", "china"):
+        for key, mtime in storage.list_files(get_server_folder(server_type)).items():
+            if key.count("/") == 2 and key.rsplit("/", 1)[1] in names:
+                files[key] = mtime
+    
+    with tempfile.TemporaryDirectory() as directory:
+        pairs = [(key, os.path.join(directory, str(index))) for index, key in enumerate(files)]
+        _, errors = storage.download_many(pairs)
+        if errors:
+            (key, _), error = errors[0]
+            raise StorageError(f"读取 {key} 失败：{error}")
+        # 存储中的备份已加密时，备份包中也不写入明文
+        if storage_config.get("encrypt"):
+            encryption = EncryptedStorage(storage, EncryptedStorage.session_passphrase, True)
+            for _, path in pairs:
+                encryption.encrypt_file(path, f"{path}.enc")
+            pairs = [(key, f"{path}.enc") for key, path in pairs]
+        write_archive(output_path, [(key, path, files[key]) for key, path in pairs])
+    return len({key.rsplit("/", 1)[0] for key in files}), len(files)
+
+def restore_from_archive(config, storage, selection):
+    """从备份包恢复，selection 为 {服务器: {文件夹: 文件列表或 None}}，返回 {服务器文件夹/角色文件夹: 结果}"""
+    results = {}
+    for server_type, folders in selection.items():
+        base_path = get_game_path(config, server_type)
+        if not base_path:
+            raise ValueError("未设置对应的游戏路径")
+        jobs = run_character_jobs(
+            lambda folder: schedule_restore(storage, base_path, server_type, folder, folders[folder], priority=PRIORITY_HIGH),
+            list(folders)
+        )
+        for folder, result in jobs.items():
+            results[f"{get_server_folder(server_type)}/{folder}"] = result
+    return results
+
+def create_backup_storage(storage_config, backup_base):
+    """根据配置创建备份存储"""
+    storage_config = storage_config or {}
+    storage = create_inner_storage(storage_config, backup_base)
+    if storage is None:
+        return None
+    # 先压缩再加密
+    return CompressedStorage(
+        EncryptedStorage(storage, EncryptedStorage.session_passphrase, storage_config.get("encrypt", False)),
+        storage_config.get("compress", False),
+        storage_config.get("compression_level", COMPRESSION_LEVEL)
+    )
+
+def create_inner_storage(storage_config, backup_base):
+    """根据配置创建未加密的备份存储"""
+    storage_type = storage_config.get("type", "local")
+    if storage_type == "s3":
+        return S3Storage(
+            storage_config.get("endpoint", ""),
+            storage_config.get("bucket", ""),
+            storage_config.get("access_key", ""),
+            storage_config.get("secret_key", ""),
+            storage_config.get("region", ""),
+            storage_config.get("prefix", "")
+        )
+    if storage_type == "webdav":
+        return WebDAVStorage(
+            storage_config.get("url", ""),
+            storage_config.get("username", ""),
+            storage_config.get("password", "")
+        )
+    if not backup_base:
+        return None
+    return LocalStorage(backup_base)
+
+def build_manifest(root):
+    """生成备份文件夹清单 {键: {大小, 修改时间, 哈希}}，只包含同步服务接受的键"""
+    manifest = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            key = os.path.relpath(path, root).replace(os.sep, "/")
+            if not is_sync_key(key):
+                continue
+            stat = os.stat(path)
+            manifest[key] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": hash_cache.get(path)}
+    hash_cache.save()
+    return manifest
+
+def resolve_key(root, key):
+    """获取键对应的本地路径，拒绝跳出根目录的键"""
+    path = os.path.normpath(os.path.join(root, *key.split("/")))
+    if os.path.commonpath([os.path.abspath(root), os.path.abspath(path)]) != os.path.abspath(root):
+        raise StorageError(f"非法路径：{key}")
+    return path
+
+# 同步服务接受写入的单个文件大小上限
+SYNC_MAX_FILE = 16 * 1024 * 1024
+# 请求签名的有效时间（秒），两端时钟误差需小于该值
+SYNC_SIGNATURE_WINDOW = 300
+
+def sign_sync_request(token, method, path, timestamp, content_hash, mtime=""):
+    """用令牌对请求签名，令牌本身不在网络上传输"""
+    message = "\n".join([method, path, timestamp, content_hash, mtime]).encode("utf-8")
+    return hmac.new(token.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+def is_sync_key(key):
+    """同步服务只接受角色配置文件、校验清单和压缩字典的键"""
+    parts = key.split("/")
+    if len(parts) == 2 and parts[0] == DICTIONARY_PREFIX:
+        return bool(parts[1]) and parts[1] not in (".", "..")
+    return (
+        len(parts) == 3
+        and parts[0] in (get_server_folder("international"), get_server_folder("china"))
+        and "FFXIV_" in parts[1] and parts[1] not in (".", "..")
+        and (parts[2] in {name for name, _ in CONFIG_FILES} or parts[2] == CHECKSUM_FILE)
+    )
+
+def write_sync_file(file_path, data, mtime):
+    """写入对端上传的文件"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temp_path = f"{file_path}.download"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    if mtime:
+        os.utime(temp_path, (mtime, mtime))
+    os.replace(temp_path, file_path)
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """局域网同步服务的请求处理"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body=b"", headers=None):
+        """发送响应"""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def check_request(self):
+        """校验请求签名并解析路径"""
+        timestamp = self.headers.get("X-Sync-Time", "")
+        expected = sign_sync_request(
+            self.server.token, self.command, self.path, timestamp,
+            self.headers.get("X-Sync-Content-Sha256", ""), self.headers.get("X-Mtime", "")
+        )
+        try:
+            fresh = abs(time.time() - float(timestamp)) <= SYNC_SIGNATURE_WINDOW
+        except ValueError:
+            fresh = False
+        if not fresh or not hmac.compare_digest(self.headers.get("X-Sync-Signature", ""), expected):
+            self.close_connection = True
+            self.send_body(403)
+            return None
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        return path
+
+    def do_GET(self):
+        path = self.check_request()
+        if path is None:
+            return
+        if path == "/manifest":
+            body = json.dumps(build_manifest(self.server.root), ensure_ascii=False).encode("utf-8")
+            self.send_body(200, body, {"Content-Type": "application/json"})
+            return
+        if not path.startswith("/files/"):
+            self.send_body(404)
+            return
+        try:
+            key = path[len("/files/"):]
+            if not is_sync_key(key):
+                raise StorageError(f"非法路径：{path}")
+            file_path = resolve_key(self.server.root, key)
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except StorageError:
+            self.send_body(400)
+            return
+        except FileNotFoundError:
+            self.send_body(404)
+            return
+        self.send_body(200, data, {"X-Mtime": str(os.path.getmtime(file_path))})
+
+    def do_PUT(self):
+        path = self.check_request()
+        if path is None:
+            return
+        
+        # 先校验键和大小再读取请求内容，拒绝时不读取内容并关闭连接
+        key = path[len("/files/"):] if path.startswith("/files/") else None
+        try:
+            length = int(self.headers.get("Content-Length", -1))
+            mtime = float(self.headers.get("X-Mtime") or 0)
+            if key is None or not is_sync_key(key):
+                raise StorageError(f"非法路径：{path}")
+            file_path = resolve_key(self.server.root, key)
+        except (ValueError, StorageError):
+            self.close_connection = True
+            self.send_body(400)
+            return
+        if not 0 <= length <= SYNC_MAX_FILE:
+            self.close_connection = True
+            self.send_body(413)
+            return
+        data = self.rfile.read(length)
+        if not hmac.compare_digest(hashlib.sha256(data).hexdigest(), self.headers.get("X-Sync-Content-Sha256", "")):
+            self.send_body(400)
+            return
+        
+        # 与备份、恢复一样通过调度器获取该备份文件夹的写锁
+        future = scheduler.submit(
+            write_sync_file, file_path, data, mtime,
+            priority=PRIORITY_HIGH,
+            writes=[os.path.dirname(file_path)]
+        )
+        try:
+            future.result()
+        except Exception:
+            self.send_body(500)
+            return
+        self.send_body(201)
+
+class SyncServer:
+    """局域网同步服务，对外提供本机备份文件夹"""
+
+    def __init__(self, root, port, token, host="0.0.0.0"):
+        # 服务监听局域网，必须设置令牌
+        if not token:
+            raise ValueError("必须设置同步令牌")
+        self.server = ThreadingHTTPServer((host, port), SyncRequestHandler)
+        self.server.daemon_threads = True
+        self.server.root = root
+        self.server.token = token
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def stop(self):
+        """停止服务"""
+        self.server.shutdown()
+        self.server.server_close()
+
+class PeerStorage(HTTPStorage):
+    """对端同步服务的客户端"""
+
+    def __init__(self, url, token=""):
+        if "://" not in url:
+            url = f"http://{url}"
+        super().__init__(url)
+        self.url = url.rstrip("/")
+        self.token = token
+
+    def headers(self, method, path, body=b"", extra=None):
+        """获取带签名的请求头"""
+        headers = dict(extra or {})
+        headers["X-Sync-Time"] = str(time.time())
+        headers["X-Sync-Content-Sha256"] = hashlib.sha256(body).hexdigest()
+        headers["X-Sync-Signature"] = sign_sync_request(
+            self.token, method, path, headers["X-Sync-Time"], headers["X-Sync-Content-Sha256"], headers.get("X-Mtime", "")
+        )
+        return headers
+
+    def path(self, key):
+        """获取键对应的请求路径"""
+        return urllib.parse.quote(f"{self.base_path}/files/{key}", safe="/-_.~")
+
+    def location(self, key=""):
+        return f"{self.url}/{key}"
+
+    def manifest(self):
+        """获取对端清单"""
+        # 每次重试重新签名，避免签名过期
+        _, data = self.with_retry(
+            lambda: self.request("GET", f"{self.base_path}/manifest", b"", self.headers("GET", f"{self.base_path}/manifest"), (200,))
+        )
+        return json.loads(data)
+
+    def list_files(self, prefix=""):
+        return {
+            key: entry["mtime"]
+            for key, entry in self.manifest().items()
+            if key.startswith(prefix)
+        }
+
+    def upload_file(self, local_path, key):
+        with open(local_path, 'rb') as f:
+            data = f.read()
+        path = self.path(key)
+        self.request("PUT", path, data, self.headers("PUT", path, data, {"X-Mtime": str(os.path.getmtime(local_path))}))
+
+    def download_file(self, key, local_path):
+        path = self.path(key)
+        response, data = self.request("GET", path, headers=self.headers("GET", path), ok=(200,))
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        mtime = response.getheader("X-Mtime")
+        self.write_download(data, local_path, float(mtime) if mtime else None)
+
+def plan_sync(local_manifest, remote_manifest):
+    """比较两端清单，返回需要拉取和推送的键（内容不同时以较新的为准）"""
+    pull = []
+    push = []
+    for key, remote in remote_manifest.items():
+        local = local_manifest.get(key)
+        if local is None or (local["hash"] != remote["hash"] and remote["mtime"] > local["mtime"]):
+            pull.append(key)
+    for key, local in local_manifest.items():
+        remote = remote_manifest.get(key)
+        if remote is None or (remote["hash"] != local["hash"] and local["mtime"] > remote["mtime"]):
+            push.append(key)
+    return sorted(pull), sorted(push)
+
+def sync_with_peer(root, peer_url, token=""):
+    """与对端双向同步备份文件夹，只传输对方缺少或较旧的文件"""
+    peer = PeerStorage(peer_url, token)
+    pull, push = plan_sync(build_manifest(root), peer.manifest())
+    # 只同步服务端接受的键，对端清单中的其他文件不写入本机
+    pull = [key for key in pull if is_sync_key(key)]
+    push = [key for key in push if is_sync_key(key)]
+    pulled, pull_errors = peer.download_many([(key, resolve_key(root, key)) for key in pull])
+    pushed, push_errors = peer.upload_many([(resolve_key(root, key), key) for key in push])
+    return {
+        "pulled": pulled,
+        "pushed": pushed,
+        "errors": [(key, error) for (key, _), error in pull_errors] + [(key, error) for (_, key), error in push_errors]
+    }
+
+# 任务优先级，数值越小越先执行
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# 低影响模式：游戏进程名、检测间隔，以及游戏运行时的速率系数
+GAME_PROCESS_NAME = "ffxiv_dx11.exe"
+GAME_CHECK_INTERVAL = 5
+GAME_RUNNING_FACTOR = 0.25
+# 单次传输超过该耗时视为磁盘或网络繁忙，速率减半，否则逐步恢复
+LOW_IMPACT_SLOW_OPERATION = 0.25
+
+def is_game_running():
+    """检查游戏进程是否正在运行"""
+    if sys.platform == "win32":
+        from ctypes import wintypes
+        
+        class PROCESSENTRY32W(ctypes.Structure):
+            _fields_ = [
+                ("dwSize", wintypes.DWORD),
+                ("cntUsage", wintypes.DWORD),
+                ("th32ProcessID", wintypes.DWORD),
+                ("th32DefaultHeapID", ctypes.c_size_t),
+                ("th32ModuleID", wintypes.DWORD),
+                ("cntThreads", wintypes.DWORD),
+                ("th32ParentProcessID", wintypes.DWORD),
+                ("pcPriClassBase", ctypes.c_long),
+                ("dwFlags", wintypes.DWORD),
+                ("szExeFile", ctypes.c_wchar * 260)
+            ]
+        
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+        snapshot = kernel32.CreateToolhelp32Snapshot(0x00000002, 0)
+        if snapshot in (None, wintypes.HANDLE(-1).value):
+            return False
+        try:
+            entry = PROCESSENTRY32W()
+            entry.dwSize = ctypes.sizeof(PROCESSENTRY32W)
+            found = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+            while found:
+                if entry.szExeFile.lower() == GAME_PROCESS_NAME:
+                    return True
+                found = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+            return False
+        finally:
+            kernel32.CloseHandle(snapshot)
+    
+    # 其他系统（如 Wine）从 /proc 读取进程名
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return False
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/comm", 'r', encoding='utf-8', errors='ignore') as f:
+                if f.read().strip().lower() == GAME_PROCESS_NAME[:15]:
+                    return True
+        except OSError:
+            continue
+    return False
+
+class IoThrottle:
+    """低影响模式：按每秒字节数和操作数限速，工作线程降低优先级，游戏运行或传输变慢时进一步降速"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mode = "off"
+        self.bytes_per_second = 4 * 1024 * 1024
+        self.ops_per_second = 20
+        self.byte_tokens = 0.0
+        self.op_tokens = 0.0
+        self.updated = time.monotonic()
+        self.factor = 1.0
+        self.game_running = False
+        self.game_checked = 0
+
+    def configure(self, settings):
+        """应用设置，mode 为 off（关闭）、game（游戏运行时）或 always（始终）"""
+        with self.lock:
+            self.mode = settings.get("mode", "off")
+            self.bytes_per_second = max(1, int(settings.get("bytes_per_second", self.bytes_per_second)))
+            self.ops_per_second = max(1, int(settings.get("ops_per_second", self.ops_per_second)))
+
+    def check_game(self):
+        """定期检测游戏进程，结果缓存一段时间"""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.game_checked < GAME_CHECK_INTERVAL:
+                return self.game_running
+            self.game_checked = now
+        try:
+            running = is_game_running()
+        except Exception:
+            running = False
+        with self.lock:
+            self.game_running = running
+        return running
+
+    def active(self):
+        """当前是否需要限速，游戏未运行时“游戏运行时”模式保持全速"""
+        if self.mode == "off":
+            return False
+        game_running = self.check_game()
+        return self.mode == "always" or game_running
+
+    def refill(self, now):
+        """按经过的时间补充额度，最多积累一秒的额度；调用方需持有锁"""
+        rate = self.factor * (GAME_RUNNING_FACTOR if self.game_running else 1)
+        elapsed = now - self.updated
+        self.updated = now
+        self.byte_tokens = min(self.bytes_per_second * rate, self.byte_tokens + elapsed * self.bytes_per_second * rate)
+        self.op_tokens = min(max(1.0, self.ops_per_second * rate), self.op_tokens + elapsed * self.ops_per_second * rate)
+        return rate
+
+    def acquire(self):
+        """等待到有操作额度且字节额度不为负"""
+        while True:
+            with self.lock:
+                rate = self.refill(time.monotonic())
+                if self.op_tokens >= 1 and self.byte_tokens >= 0:
+                    self.op_tokens -= 1
+                    return
+                wait = max(
+                    (1 - self.op_tokens) / (self.ops_per_second * rate),
+                    -self.byte_tokens / (self.bytes_per_second * rate)
+                )
+            time.sleep(min(wait, 0.5))
+
+    def charge(self, copied_bytes, seconds):
+        """扣除已传输的字节数（可透支），并按耗时调整速率"""
+        with self.lock:
+            self.byte_tokens -= copied_bytes
+            if seconds > LOW_IMPACT_SLOW_OPERATION:
+                self.factor = max(0.1, self.factor / 2)
+            else:
+                self.factor = min(1.0, self.factor + 0.1)
+
+    def limit(self, local_path):
+        """包裹一次文件传输的上下文，未启用低影响模式时不做任何处理"""
+        return ThrottledOperation(self, local_path)
+
+class ThrottledOperation:
+    """一次受限速的传输，期间 Windows 上将当前线程切换为后台模式以降低 CPU 和 I/O 优先级"""
+
+    def __init__(self, throttle, local_path):
+        self.throttle = throttle
+        self.local_path = local_path
+        self.active = False
+
+    def __enter__(self):
+        self.active = self.throttle.active()
+        if not self.active:
+            return self
+        self.throttle.acquire()
+        if sys.platform == "win32":
+            # THREAD_MODE_BACKGROUND_BEGIN
+            ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(), 0x00010000)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if not self.active:
+            return False
+        if sys.platform == "win32":
+            # THREAD_MODE_BACKGROUND_END
+            ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(), 0x00020000)
+        try:
+            copied_bytes = os.path.getsize(self.local_path)
+        except OSError:
+            copied_bytes = 0
+        self.throttle.charge(copied_bytes, time.monotonic() - self.started)
+        return False
+
+io_throttle = IoThrottle()
+
+class JobScheduler:
+    """操作调度器：优先级队列、按文件夹的读写锁和全局并发上限"""
+
+    def __init__(self, max_workers=4, io_limit=8):
+        self.condition = threading.Condition()
+        self.queue = []
+        self.sequence = itertools.count()
+        self.readers = {}
+        self.writers = set()
+        self.io_slots = threading.BoundedSemaphore(io_limit)
+        for _ in range(max_workers):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def submit(self, func, *args, priority=PRIORITY_NORMAL, reads=(), writes=()):
+        """提交任务，reads/writes 为任务读写的文件夹，返回 Future"""
+        future = Future()
+        reads = {self.lock_key(path) for path in reads}
+        writes = {self.lock_key(path) for path in writes}
+        with self.condition:
+            bisect.insort(self.queue, (priority, next(self.sequence), func, args, future, reads - writes, writes))
+            self.condition.notify_all()
+        return future
+
+    def lock_key(self, path):
+        """获取锁的键，本地路径统一大小写和分隔符"""
+        if "://" in path:
+            return path.rstrip("/")
+        return os.path.normcase(os.path.abspath(path)).replace(os.sep, "/").rstrip("/")
+
+    def overlaps(self, path, paths):
+        """路径与任一路径相同或互为上级目录"""
+        return any(
+            path == other or path.startswith(other + "/") or other.startswith(path + "/")
+            for other in paths
+        )
+
+    def next_job(self):
+        """取出优先级最高且锁可用的任务，排在前面的等待任务会阻止后面的任务抢占同一文件夹"""
+        waiting_reads = set()
+        waiting_writes = set()
+        for index, job in enumerate(self.queue):
+            reads, writes = job[5], job[6]
+            busy_writes = self.writers | waiting_writes
+            busy_all = busy_writes | self.readers.keys() | waiting_reads
+            blocked = (
+                any(self.overlaps(path, busy_all) for path in writes)
+                or any(self.overlaps(path, busy_writes) for path in reads)
+            )
+            if not blocked:
+                return self.queue.pop(index)
+            waiting_reads |= reads
+            waiting_writes |= writes
+        return None
+
+    def worker(self):
+        """工作线程"""
+        while True:
+            with self.condition:
+                job = self.next_job()
+                while job is None:
+                    self.condition.wait()
+                    job = self.next_job()
+                _, _, func, args, future, reads, writes = job
+                for path in reads:
+                    self.readers[path] = self.readers.get(path, 0) + 1
+                self.writers |= writes
+            
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(*args))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                with self.condition:
+                    for path in reads:
+                        self.readers[path] -= 1
+                        if not self.readers[path]:
+                            del self.readers[path]
+                    self.writers -= writes
+                    self.condition.notify_all()
+
+scheduler = JobScheduler()
+
+def schedule_backup(storage, source_base, server_type, folder, files=None, priority=PRIORITY_NORMAL, journal=None):
+    """提交备份任务"""
+    return scheduler.submit(
+        backup_character, storage, source_base, server_type, folder, files, journal,
+        priority=priority,
+        reads=[os.path.join(source_base, folder)],
+        writes=[storage.location(f"{get_server_folder(server_type)}/{folder}")]
+    )
+
+def schedule_restore(storage, target_base, server_type, folder, files=None, backup_files=None, priority=PRIORITY_NORMAL, journal=None, verify=False):
+    """提交恢复任务"""
+    return scheduler.submit(
+        restore_character, storage, target_base, server_type, folder, files, backup_files, journal, verify,
+        priority=priority,
+        reads=[storage.location(f"{get_server_folder(server_type)}/{folder}")],
+        writes=[os.path.join(target_base, folder)]
+    )
+
+def schedule_undo(count, priority=PRIORITY_HIGH):
+    """提交撤销最近若干次操作的任务"""
+    folders = set()
+    for entry in snapshot_store.list()[:count]:
+        folders.update(os.path.dirname(target) for target in snapshot_store.targets(entry["id"]))
+    return scheduler.submit(snapshot_store.undo_latest, count, priority=priority, writes=folders)
+
+def schedule_migration(source_folder, target_folder, files, priority=PRIORITY_NORMAL):
+    """提交迁移任务"""
+    return scheduler.submit(
+        copy_config_files, source_folder, target_folder, files,
+        priority=priority,
+        reads=[source_folder],
+        writes=[target_folder]
+    )
+
+# 本地 API 保留的任务记录数，超出时丢弃最早结束的任务
+JOB_HISTORY_LIMIT = 200
+
+class JobManager:
+    """后台任务管理，任务在线程池中执行，可轮询状态"""
+
+    def __init__(self, max_workers=4, history_limit=JOB_HISTORY_LIMIT):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.history_limit = history_limit
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.next_id = 1
+
+    def submit(self, job_type, func, *args):
+        """提交任务，返回任务信息"""
+        with self.lock:
+            job_id = str(self.next_id)
+            self.next_id += 1
+            job = {
+                "id": job_id,
+                "type": job_type,
+                "status": "pending",
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "result": None,
+                "error": None
+            }
+            self.jobs[job_id] = job
+            self.evict()
+        
+        def run():
+            with self.lock:
+                job["status"] = "running"
+                job["started"] = time.time()
+            try:
+                result = func(*args)
+                with self.lock:
+                    job["status"] = "done"
+                    job["result"] = result
+            except Exception as e:
+                with self.lock:
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+            with self.lock:
+                job["finished"] = time.time()
+        
+        self.executor.submit(run)
+        return self.get(job_id)
+
+    def evict(self):
+        """任务记录超出上限时按提交顺序丢弃已结束的任务，调用方需持有锁"""
+        excess = len(self.jobs) - self.history_limit
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished"] is not None]
+        for job_id in finished[:excess]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        """获取任务信息"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        """列出所有任务（不含结果）"""
+        with self.lock:
+            return [
+                {key: value for key, value in job.items() if key != "result"}
+                for job in self.jobs.values()
+            ]
+
+def get_roster(config, server_type):
+    """获取角色列表、标记及备份状态"""
+    base_path = get_game_path(config, server_type)
+    if not base_path:
+        raise ValueError("未设置对应的游戏路径")
+    storage = create_backup_storage(config.get("backup_storage"), config.get("backup_path", ""))
+    folders, backups = scan_roster(base_path, storage, get_server_folder(server_type))
+    marks = load_marks(server_type)
+    meta = roster_model.rows(base_path, folders, backups)
+    return [
+        {
+            "folder": folder, "mark": marks.get(folder), "backup_time": backups.get(folder),
+            "last_played": meta[folder]["played"], "config_size": meta[folder]["size"]
+        }
+        for folder in folders
+    ]
+
+def get_cached_roster(config, server_type):
+    """从角色元数据读取上次扫描的角色列表，不访问磁盘和备份存储"""
+    base_path = get_game_path(config, server_type)
+    if not base_path:
+        raise ValueError("未设置对应的游戏路径")
+    folders = roster_model.folders(base_path)
+    if folders is None:
+        raise ValueError("尚未扫描该服务器的角色，请先提交 scan 任务")
+    marks = load_marks(server_type)
+    meta = roster_model.rows(base_path, folders)
+    return [
+        {
+            "folder": folder, "mark": marks.get(folder), "backup_time": meta[folder]["backup"],
+            "last_played": meta[folder]["played"], "config_size": meta[folder]["size"]
+        }
+        for folder in folders
+    ]
+
+def run_character_jobs(schedule, folders):
+    """通过调度器处理多个角色，返回 {文件夹: 结果}"""
+    futures = {folder: schedule(folder) for folder in folders}
+    results = {}
+    for folder, future in futures.items():
+        try:
+            count, errors, unchanged = future.result()
+            results[folder] = {"copied": count, "unchanged": unchanged, "errors": errors}
+        except Exception as e:
+            results[folder] = {"copied": 0, "unchanged": 0, "errors": [("", str(e))]}
+    return results
+
+def backup_characters(config, server_type, folders=None, files=None):
+    """批量备份角色配置，未指定文件夹时备份全部角色"""
+    base_path = get_game_path(config, server_type)
+    storage = create_backup_storage(config.get("backup_storage"), config.get("backup_path", ""))
+    if not base_path or storage is None:
+        raise ValueError("未设置游戏路径或备份路径")
+    folders = folders or list_character_folders(base_path)
+    
+    # 进度日志记录已完成的角色和文件，中断后再次执行同一批量备份时从中断处继续
+    journal = TransferJournal(
+        "backup", server_type, storage.location(), folders, files or [name for name, _ in CONFIG_FILES]
+    )
+    try:
+        return run_character_jobs(
+            lambda folder: schedule_backup(storage, base_path, server_type, folder, files, journal=journal), folders
+        )
+    finally:
+        journal.close()
+
+def restore_characters(config, server_type, folders, files=None):
+    """批量恢复角色配置"""
+    base_path = get_game_path(config, server_type)
+    storage = create_backup_storage(config.get("backup_storage"), config.get("backup_path", ""))
+    if not base_path or storage is None:
+        raise ValueError("未设置游戏路径或备份路径")
+    journal = TransferJournal(
+        "restore", server_type, storage.location(), folders, files or [name for name, _ in CONFIG_FILES]
+    )
+    try:
+        return run_character_jobs(
+            lambda folder: schedule_restore(
+                storage, base_path, server_type, folder, files, journal=journal,
+                verify=(config.get("backup_storage") or {}).get("verify_restore", False)
+            ),
+            folders
+        )
+    finally:
+        journal.close()
+
+class PresetLibrary:
+    """命名配置预设库，每个预设是若干配置文件，文件内容按哈希去重保存"""
+
+    def __init__(self, root=os.path.join("data", "presets")):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest):
+        """文件内容按哈希保存，多个预设中相同的内容只存一份"""
+        return os.path.join(self.root, "blobs", digest)
+
+    def load(self):
+        """加载 {预设名: {文件: {文件名: 哈希}, 来源, 时间}}"""
+        try:
+            with open(os.path.join(self.root, "presets.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_index(self, presets):
+        """保存预设列表，调用方需持有锁"""
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = os.path.join(self.root, "presets.json.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(presets, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, os.path.join(self.root, "presets.json"))
+
+    def list(self):
+        """列出所有预设，按名称排序"""
+        with self.lock:
+            presets = self.load()
+        return [dict(presets[name], name=name) for name in sorted(presets)]
+
+    def save(self, name, contents, source):
+        """保存预设，contents 为 {文件名: 内容}，同名预设被替换"""
+        if not contents:
+            raise ValueError("没有可保存的配置文件")
+        files = {}
+        for filename, data in contents.items():
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            path = self.blob_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(f"{path}.tmp", 'wb') as f:
+                    f.write(data)
+                os.replace(f"{path}.tmp", path)
+            files[filename] = digest
+        with self.lock:
+            presets = self.load()
+            presets[name] = {"files": files, "source": source, "time": time.time()}
+            self.save_index(presets)
+        self.collect_blobs()
+        return len(files)
+
+    def save_from_folder(self, name, folder, files):
+        """从角色文件夹保存预设"""
+        contents = {}
+        for filename in files:
+            path = os.path.join(folder, filename)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    contents[filename] = f.read()
+        return self.save(name, contents, folder)
+
+    def save_from_snapshot(self, name, snapshot_id, folder, files):
+        """从快照中某个角色文件夹的原内容保存预设"""
+        targets = {os.path.abspath(os.path.join(folder, filename)): filename for filename in files}
+        contents = {
+            targets[target]: data
+            for target, data in snapshot_store.read_files(snapshot_id, targets).items()
+        }
+        return self.save(name, contents, f"{folder}（快照 {snapshot_id}）")
+
+    def delete(self, name):
+        """删除预设"""
+        with self.lock:
+            presets = self.load()
+            presets.pop(name, None)
+            self.save_index(presets)
+        self.collect_blobs()
+
+    def collect_blobs(self):
+        """删除不再被任何预设引用的内容"""
+        directory = os.path.join(self.root, "blobs")
+        with self.lock:
+            referenced = {digest for preset in self.load().values() for digest in preset["files"].values()}
+            for digest in os.listdir(directory) if os.path.isdir(directory) else []:
+                if digest not in referenced:
+                    os.remove(os.path.join(directory, digest))
+
+    def items(self, name):
+        """预设的 [(文件名, 内容路径, 文件状态)]，用于复制"""
+        with self.lock:
+            preset = self.load().get(name)
+        if preset is None:
+            raise ValueError(f"预设不存在：{name}")
+        items = []
+        for filename, digest in sorted(preset["files"].items()):
+            path = self.blob_path(digest)
+            items.append((filename, path, os.stat(path)))
+        return items
+
+preset_library = PresetLibrary()
+
+def preview_preset(name, target_base, folders):
+    """预览应用预设的结果，返回 {文件夹: [(文件名, 状态)]}，状态为 new、same 或 overwrite"""
+    items = preset_library.items(name)
+    preview = {}
+    for folder in folders:
+        target_folder = os.path.join(target_base, folder)
+        target_stats = copy_engine.stat_many(target_folder, [filename for filename, _, _ in items])
+        rows = []
+        for filename, path, stat in items:
+            target_stat = target_stats.get(os.path.normcase(filename))
+            if target_stat is None:
+                rows.append((filename, "new"))
+            elif target_stat.st_size == stat.st_size and files_identical(path, os.path.join(target_folder, filename)):
+                rows.append((filename, "same"))
+            else:
+                rows.append((filename, "overwrite"))
+        preview[folder] = rows
+    return preview
+
+def schedule_preset(name, items, target_folder, priority=PRIORITY_NORMAL):
+    """提交应用预设任务"""
+    return scheduler.submit(
+        copy_files, items, target_folder, f"应用预设 {name} → {os.path.basename(target_folder)}", "preset",
+        priority=priority,
+        reads=[preset_library.root],
+        writes=[target_folder]
+    )
+
+def apply_preset(name, target_base, folders):
+    """把预设并发应用到多个角色，返回 {文件夹: 结果}"""
+    items = preset_library.items(name)
+    return run_character_jobs(
+        lambda folder: schedule_preset(name, items, os.path.join(target_base, folder), PRIORITY_HIGH), folders
+    )
+
+def migrate_characters(config, source_type, target_type, pairs, files=None):
+    """批量迁移角色配置，pairs 为 [源文件夹, 目标文件夹] 列表"""
+    source_base = get_game_path(config, source_type)
+    target_base = get_game_path(config, target_type)
+    if not source_base or not target_base:
+        raise ValueError("未设置对应的游戏路径")
+    files = files or [name for name, _ in CONFIG_FILES]
+    targets = dict(pairs)
+    results = run_character_jobs(
+        lambda source: schedule_migration(os.path.join(source_base, source), os.path.join(target_base, targets[source]), files),
+        list(targets)
+    )
+    return {f"{source} -> {targets[source]}": result for source, result in results.items()}
+
+# 本地 API 请求内容的大小上限
+API_MAX_BODY = 1024 * 1024
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """本地 API 的请求处理"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        """发送 JSON 响应"""
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def parse_request_path(self):
+        """校验令牌并解析路径和查询参数"""
+        if not hmac.compare_digest(self.headers.get("X-Api-Token", ""), self.server.token):
+            self.send_json(403, {"error": "令牌无效"})
+            return None, None
+        parsed = urllib.parse.urlsplit(self.path)
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(parsed.query).items()}
+        return parsed.path.rstrip("/"), query
+
+    def get_server_type(self, value):
+        """校验服务器类型"""
+        if value not in ("international", "china"):
+            raise ValueError("server 必须为 international 或 china")
+        return value
+
+    def get_folders(self, server_type, folders):
+        """校验角色文件夹，只接受游戏路径下实际存在的角色文件夹"""
+        if folders is None:
+            return None
+        existing = set(list_character_folders(get_game_path(self.server.config, server_type)))
+        if not isinstance(folders, list) or not all(isinstance(folder, str) and folder in existing for folder in folders):
+            raise ValueError("folders 必须为该服务器下已有的角色文件夹列表")
+        return folders
+
+    def get_files(self, files):
+        """校验配置文件名，只接受 CONFIG_FILES 中的文件"""
+        if files is None:
+            return None
+        names = {name for name, _ in CONFIG_FILES}
+        if not isinstance(files, list) or not all(isinstance(name, str) and name in names for name in files):
+            raise ValueError("files 必须为配置文件名列表")
+        return files
+
+    def do_GET(self):
+        path, query = self.parse_request_path()
+        if path is None:
+            return
+        try:
+            if path == "/roster":
+                self.send_json(200, get_cached_roster(self.server.config, self.get_server_type(query.get("server", "international"))))
+            elif path == "/marks":
+                self.send_json(200, load_marks(self.get_server_type(query.get("server", "international"))))
+            elif path == "/jobs":
+                self.send_json(200, self.server.jobs.list())
+            elif path.startswith("/jobs/"):
+                job = self.server.jobs.get(path[len("/jobs/"):])
+                self.send_json(200 if job else 404, job or {"error": "任务不存在"})
+            else:
+                self.send_json(404, {"error": "接口不存在"})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+    def do_POST(self):
+        path, _ = self.parse_request_path()
+        if path is None:
+            return
+        # 只接受 JSON 请求，网页无法不经预检跨域发送
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self.send_json(415, {"error": "Content-Type 必须为 application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= API_MAX_BODY:
+            self.send_json(413, {"error": "请求内容过大"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError
+        except ValueError:
+            self.send_json(400, {"error": "请求内容不是有效的 JSON"})
+            return
+        if path != "/jobs":
+            self.send_json(404, {"error": "接口不存在"})
+            return
+        
+        config = self.server.config
+        jobs = self.server.jobs
+        job_type = body.get("type")
+        try:
+            if job_type == "scan":
+                job = jobs.submit(job_type, get_roster, config, self.get_server_type(body.get("server")))
+            elif job_type == "backup":
+                server_type = self.get_server_type(body.get("server"))
+                job = jobs.submit(
+                    job_type, backup_characters, config,
+                    server_type, self.get_folders(server_type, body.get("folders")), self.get_files(body.get("files"))
+                )
+            elif job_type == "restore":
+                if not body.get("folders"):
+                    raise ValueError("恢复任务必须指定 folders")
+                server_type = self.get_server_type(body.get("server"))
+                job = jobs.submit(
+                    job_type, restore_characters, config,
+                    server_type, self.get_folders(server_type, body["folders"]), self.get_files(body.get("files"))
+                )
+            elif job_type == "migrate":
+                pairs = body.get("pairs")
+                if not pairs or not isinstance(pairs, list) or not all(isinstance(pair, list) and len(pair) == 2 for pair in pairs):
+                    raise ValueError("迁移任务必须指定 pairs（[源文件夹, 目标文件夹] 列表）")
+                source_type = self.get_server_type(body.get("source_server"))
+                target_type = self.get_server_type(body.get("target_server"))
+                self.get_folders(source_type, [source for source, _ in pairs])
+                self.get_folders(target_type, [target for _, target in pairs])
+                job = jobs.submit(
+                    job_type, migrate_characters, config,
+                    source_type, target_type, pairs, self.get_files(body.get("files"))
+                )
+            else:
+                raise ValueError("type 必须为 scan、backup、restore 或 migrate")
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(202, job)
+
+class ApiServer:
+    """本地 HTTP/JSON API 服务，仅监听本机地址，所有请求都需要令牌"""
+
+    def __init__(self, config, port, token):
+        if not token:
+            raise ValueError("本地 API 必须设置令牌")
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), ApiRequestHandler)
+        self.server.daemon_threads = True
+        self.server.config = config
+        self.server.token = token
+        self.server.jobs = JobManager()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def stop(self):
+        """停止服务"""
+        self.server.shutdown()
+        self.server.server_close()
+
+# 运行指标：Prometheus 文本格式，抓取时只读取内存中增量维护的数据
+METRICS_REFRESH_INTERVAL = 600
+
+class OperationMetrics:
+    """记录单次操作的耗时、复制文件数和字节数，操作抛出异常时记为失败"""
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+        self.copied = []
+        self.failed = []
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def finish(self, paths, failed):
+        """记录本次操作处理的本地文件和其中失败的文件"""
+        failed = set(failed)
+        self.copied = [path for path in paths if path not in failed]
+        self.failed = list(failed)
+
+    def __exit__(self, exc_type, exc, traceback):
+        copied_bytes = 0
+        for path in self.copied:
+            try:
+                copied_bytes += os.path.getsize(path)
+            except OSError:
+                pass
+        self.index.record(
+            self.name,
+            time.perf_counter() - self.started,
+            len(self.copied),
+            copied_bytes,
+            len(self.failed) + (1 if exc_type else 0)
+        )
+        return False
+
+class MetricsIndex:
+    """角色数量、每个角色的备份时间和各类操作的累计数据，备份完成时增量更新，定期在后台重新扫描"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.roots = {}
+        self.backups = {}
+        self.operations = {}
+        self.refreshed = None
+
+    def operation(self, name):
+        """返回用于 with 语句的操作记录"""
+        return OperationMetrics(self, name)
+
+    def record(self, name, seconds, files, copied_bytes, errors):
+        """累计一次操作"""
+        with self.lock:
+            totals = self.operations.setdefault(name, {
+                "success": 0, "failed": 0, "files": 0, "bytes": 0, "errors": 0, "seconds": 0.0
+            })
+            totals["success" if not errors else "failed"] += 1
+            totals["files"] += files
+            totals["bytes"] += copied_bytes
+            totals["errors"] += errors
+            totals["seconds"] += seconds
+
+    def backed_up(self, server_type, folder, backup_time=None):
+        """角色备份完成后更新备份时间"""
+        with self.lock:
+            self.backups.setdefault(server_type, {})[folder] = backup_time or time.time()
+
+    def refresh(self, config):
+        """扫描角色文件夹和备份状态，备份时间取备份文件的修改时间"""
+        storage = create_backup_storage(config.get("backup_storage"), config.get("backup_path", ""))
+        for server_type in ("international", "china"):
+            base_path = get_game_path(config, server_type)
+            if not base_path or not os.path.isdir(base_path):
+                continue
+            folders, backups = scan_roster(base_path, storage, get_server_folder(server_type))
+            with self.lock:
+                self.roots[server_type] = (base_path, folders)
+                known = self.backups.setdefault(server_type, {})
+                for folder in folders:
+                    # 本次运行中记录的备份完成时间晚于文件修改时间，保留较新的值
+                    if backups.get(folder) is not None:
+                        known[folder] = max(known.get(folder, 0), backups[folder])
+        with self.lock:
+            self.refreshed = time.time()
+
+    def render(self):
+        """生成 Prometheus 文本格式的指标"""
+        def labels(**values):
+            escaped = (
+                f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+                for key, value in values.items()
+            )
+            return "{" + ",".join(escaped) + "}"
+        
+        now = time.time()
+        lines = []
+        with self.lock:
+            lines.append("# HELP ccmt_characters 游戏目录中的角色数量")
+            lines.append("# TYPE ccmt_characters gauge")
+            for server_type, (base_path, folders) in self.roots.items():
+                lines.append(f"ccmt_characters{labels(server=server_type, root=base_path)} {len(folders)}")
+            
+            ages = []
+            missing = []
+            for server_type, (_, folders) in self.roots.items():
+                known = self.backups.get(server_type, {})
+                for folder in folders:
+                    backup_time = known.get(folder)
+                    missing.append(f"ccmt_backup_missing{labels(server=server_type, folder=folder)} {0 if backup_time is not None else 1}")
+                    if backup_time:
+                        ages.append(f"ccmt_backup_age_seconds{labels(server=server_type, folder=folder)} {now - backup_time:.0f}")
+            lines.append("# HELP ccmt_backup_age_seconds 角色距最近一次备份的时间")
+            lines.append("# TYPE ccmt_backup_age_seconds gauge")
+            lines.extend(ages)
+            lines.append("# HELP ccmt_backup_missing 角色是否从未备份")
+            lines.append("# TYPE ccmt_backup_missing gauge")
+            lines.extend(missing)
+            
+            for metric, key, help_text in [
+                ("ccmt_operations_total", None, "已完成的操作数"),
+                ("ccmt_copied_files_total", "files", "复制的文件数"),
+                ("ccmt_copied_bytes_total", "bytes", "复制的字节数"),
+                ("ccmt_errors_total", "errors", "失败的文件数")
+            ]:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for name, totals in sorted(self.operations.items()):
+                    if key is None:
+                        for status in ("success", "failed"):
+                            lines.append(f"{metric}{labels(operation=name, status=status)} {totals[status]}")
+                    else:
+                        lines.append(f"{metric}{labels(operation=name)} {totals[key]}")
+            lines.append("# HELP ccmt_operation_duration_seconds 操作耗时")
+            lines.append("# TYPE ccmt_operation_duration_seconds summary")
+            for name, totals in sorted(self.operations.items()):
+                lines.append(f"ccmt_operation_duration_seconds_sum{labels(operation=name)} {totals['seconds']:.3f}")
+                lines.append(f"ccmt_operation_duration_seconds_count{labels(operation=name)} {totals['success'] + totals['failed']}")
+            
+            if self.refreshed:
+                lines.append("# HELP ccmt_index_refresh_timestamp_seconds 最近一次扫描的时间")
+                lines.append("# TYPE ccmt_index_refresh_timestamp_seconds gauge")
+                lines.append(f"ccmt_index_refresh_timestamp_seconds {self.refreshed:.0f}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsIndex()
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """指标接口的请求处理"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path.rstrip("/") != "/metrics":
+            body = "not found\n".encode("utf-8")
+            self.send_response(404)
+        else:
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    """指标服务，仅监听本机地址，后台定期重新扫描角色和备份"""
+
+    def __init__(self, config, port):
+        self.config = config
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.stopped = threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self.refresh_loop, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def refresh_loop(self):
+        """启动时扫描一次，之后按固定间隔扫描"""
+        while not self.stopped.is_set():
+            try:
+                metrics.refresh(self.config)
+            except Exception:
+                pass
+            self.stopped.wait(METRICS_REFRESH_INTERVAL)
+
+    def stop(self):
+        """停止服务"""
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+# DAT 文件头：前 16 字节为文件头，偏移 4 处为数据段长度
+DAT_HEADER_SIZE = 16
+
+def check_dat_file(path):
+    """检查 DAT 文件的文件头和声明长度，返回 (状态, 说明, 文件大小与声明长度之差)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(ENCRYPTION_MAGIC)] == ENCRYPTION_MAGIC:
+        return "skipped", "已加密", None
+    if data[:len(COMPRESSION_MAGIC)] == COMPRESSION_MAGIC:
+        return "skipped", "已压缩", None
+    if len(data) < DAT_HEADER_SIZE:
+        return "bad", f"文件过短（{len(data)} 字节）", None
+    if not any(data):
+        return "bad", "内容全为 0", None
+    declared = struct.unpack_from("<I", data, 4)[0]
+    if declared + DAT_HEADER_SIZE > len(data):
+        return "bad", f"声明长度 {declared} 超出文件大小 {len(data)}，可能被截断", None
+    return "ok", "", len(data) - declared
+
+class IntegrityScanner:
+    """DAT 完整性检查，结果按文件大小和修改时间缓存"""
+
+    def __init__(self, cache_file=os.path.join("data", "integrity_cache.json")):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def check(self, path):
+        """检查单个文件，未变化时使用缓存结果"""
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2], entry[3], entry[4]
+        status, message, overhead = check_dat_file(path)
+        with self.lock:
+            self.entries[path] = [stat.st_size, stat.st_mtime, status, message, overhead]
+        return status, message, overhead
+
+    def scan(self, items, max_workers=8):
+        """在线程池中检查文件，items 为包含 path 的字典列表"""
+        def run(item):
+            try:
+                status, message, overhead = self.check(item["path"])
+            except OSError as e:
+                status, message, overhead = "bad", f"无法读取：{str(e)}", None
+            return dict(item, status=status, message=message, overhead=overhead)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run, items))
+        
+        # 同类文件中大小与声明长度之差与多数不一致时提示结构异常
+        overheads = {}
+        for result in results:
+            if result["overhead"] is not None:
+                overheads.setdefault(result["file"], []).append(result["overhead"])
+        for result in results:
+            values = overheads.get(result["file"], [])
+            if result["status"] != "ok" or len(values) < 3:
+                continue
+            common = max(set(values), key=values.count)
+            if values.count(common) >= len(values) * 0.8 and result["overhead"] != common:
+                result["status"] = "warning"
+                result["message"] = f"结构与其他角色不一致（尾部 {result['overhead']} 字节，通常为 {common} 字节）"
+        
+        self.save()
+        return results
+
+    def save(self):
+        """保存缓存"""
+        with self.lock:
+            entries = dict(self.entries)
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+integrity_scanner = IntegrityScanner()
+
+def scan_integrity(config):
+    """检查所有角色文件夹和本地备份中的 DAT 文件，返回有问题的文件"""
+    storage = create_inner_storage(config.get("backup_storage") or {}, config.get("backup_path", ""))
+    items = []
+    for server_type in ("international", "china"):
+        base_path = get_game_path(config, server_type)
+        if base_path:
+            for folder in list_character_folders(base_path):
+                for config_file, _ in CONFIG_FILES:
+                    path = os.path.join(base_path, folder, config_file)
+                    if os.path.exists(path):
+                        items.append({"location": "live", "server": server_type, "folder": folder, "file": config_file, "path": path})
+        
+        # 远程备份需要下载，只检查本地备份
+        if isinstance(storage, LocalStorage):
+            backup_dir = storage.path(get_server_folder(server_type))
+            if os.path.isdir(backup_dir):
+                for folder in os.listdir(backup_dir):
+                    for config_file, _ in CONFIG_FILES:
+                        path = os.path.join(backup_dir, folder, config_file)
+                        if os.path.exists(path):
+                            items.append({"location": "backup", "server": server_type, "folder": folder, "file": config_file, "path": path})
+    
+    results = integrity_scanner.scan(items)
+    return len(items), [result for result in results if result["status"] in ("bad", "warning")]
+
+def verify_backups(config, max_workers=None):
+    """按校验清单并发校验本地备份，返回 (已校验数, 无校验记录数, 问题列表)"""
+    storage = create_inner_storage(config.get("backup_storage") or {}, config.get("backup_path", ""))
+    if not isinstance(storage, LocalStorage):
+        raise ValueError("远程备份需要下载，暂只支持校验本地备份")
+    
+    items = []
+    unverified = 0
+    for server_type in ("international", "china"):
+        backup_dir = storage.path(get_server_folder(server_type))
+        if not os.path.isdir(backup_dir):
+            continue
+        for folder in os.listdir(backup_dir):
+            folder_path = os.path.join(backup_dir, folder)
+            try:
+                with open(os.path.join(folder_path, CHECKSUM_FILE), 'r', encoding='utf-8') as f:
+                    checksums = json.load(f)
+            except (OSError, ValueError):
+                checksums = {}
+            unverified += sum(
+                1 for config_file, _ in CONFIG_FILES
+                if os.path.exists(os.path.join(folder_path, config_file)) and not checksums.get(config_file, {}).get("stored")
+            )
+            for config_file, entry in checksums.items():
+                if entry.get("stored"):
+                    items.append((server_type, folder, config_file, os.path.join(folder_path, config_file), entry["stored"]))
+    
+    def check(item):
+        server_type, folder, config_file, path, expected = item
+        try:
+            actual = hash_file(path, CHECKSUM_BUFFER_SIZE)
+        except FileNotFoundError:
+            message = "备份文件缺失"
+        except OSError as e:
+            message = f"无法读取：{str(e)}"
+        else:
+            if actual == expected:
+                return None
+            message = "内容与备份时记录的校验值不一致"
+        return {"location": "backup", "server": server_type, "folder": folder, "file": config_file, "status": "bad", "message": message}
+    
+    # 哈希计算会释放 GIL，线程池即可并行读取和计算
+    with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 4) * 2)) as executor:
+        problems = [result for result in executor.map(check, items) if result]
+    return len(items), unverified, problems
+
+def build_inventory(config):
+    """生成所有角色配置文件的清单（大小、修改时间、哈希、备份时间），并按相同文件分组"""
+    now = time.time()
+    storage = create_backup_storage(config.get("backup_storage"), config.get("backup_path", ""))
+    rows = []
+    for server_type in ("international", "china"):
+        base_path = get_game_path(config, server_type)
+        if not base_path:
+            continue
+        server_folder = get_server_folder(server_type)
+        marks = load_marks(server_type)
+        try:
+            backup_files = storage.list_files(server_folder) if storage else {}
+        except Exception:
+            backup_files = {}
+        for folder in list_character_folders(base_path):
+            for config_file, _ in CONFIG_FILES:
+                path = os.path.join(base_path, folder, config_file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                backup_time = backup_files.get(f"{server_folder}/{folder}/{config_file}")
+                rows.append({
+                    "server": server_type,
+                    "folder": folder,
+                    "mark": marks.get(folder, ""),
+                    "file": config_file,
+                    "path": path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "backup_time": backup_time,
+                    "backup_age_days": round((now - backup_time) / 86400, 2) if backup_time else None
+                })
+    
+    # 哈希使用缓存，未缓存的文件在进程池中计算
+    hashes = hash_cache.get_many([row["path"] for row in rows])
+    hash_cache.save()
+    
+    # 按文件名和哈希分组
+    members = {}
+    for row in rows:
+        row["hash"] = hashes.get(row["path"], "")
+        members.setdefault((row["file"], row["hash"]), []).append(f"{row['server']}/{row['folder']}")
+    groups = []
+    for (config_file, digest), characters in sorted(members.items()):
+        if len(characters) > 1 and digest:
+            groups.append({"id": len(groups) + 1, "file": config_file, "hash": digest, "characters": characters})
+    group_ids = {(group["file"], group["hash"]): group["id"] for group in groups}
+    for row in rows:
+        row["group"] = group_ids.get((row["file"], row["hash"]))
+    
+    return {"generated": now, "rows": rows, "groups": groups}
+
+def write_inventory(inventory, output_path):
+    """按扩展名将清单写入 JSON 或 CSV 文件"""
+    if output_path.lower().endswith(".json"):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(inventory, f, ensure_ascii=False, indent=2)
+        return
+    
+    columns = ["server", "folder", "mark", "file", "size", "mtime", "hash", "backup_time", "backup_age_days", "group"]
+    # 使用 utf-8-sig 以便 Excel 正确识别中文
+    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in inventory["rows"]:
+            values = dict(row)
+            for key in ("mtime", "backup_time"):
+                if values[key]:
+                    values[key] = datetime.fromtimestamp(values[key]).strftime('%Y-%m-%d %H:%M:%S')
+            writer.writerow([values[column] if values[column] is not None else "" for column in columns])
+
+def export_inventory(config, output_path):
+    """生成并导出清单，返回角色数和分组数"""
+    inventory = build_inventory(config)
+    write_inventory(inventory, output_path)
+    return len({(row["server"], row["folder"]) for row in inventory["rows"]}), len(inventory["groups"])
+
+# 相似度分析：DAT 文件按固定大小分块，块特征包含文件名和块位置；
+# 签名采用单次哈希分桶的 MinHash，每桶保留最小的 32 位哈希值，空桶为 MINHASH_EMPTY
+SIMILARITY_CHUNK_SIZE = 64
+MINHASH_SIZE = 128
+MINHASH_EMPTY = 0xFFFFFFFF
+LSH_ROWS = 4
+
+def minhash_file(path):
+    """计算单个文件的 MinHash 签名，跳过由同一字节填充的块"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    name = os.path.basename(path).upper().encode("utf-8")
+    signature = [MINHASH_EMPTY] * MINHASH_SIZE
+    for offset in range(0, len(data), SIMILARITY_CHUNK_SIZE):
+        chunk = data[offset:offset + SIMILARITY_CHUNK_SIZE]
+        if chunk.count(chunk[0]) == len(chunk):
+            continue
+        value = int.from_bytes(
+            hashlib.blake2b(chunk, digest_size=8, salt=offset.to_bytes(8, "little"), person=name[:16]).digest(),
+            "little"
+        )
+        bucket, value = value % MINHASH_SIZE, value >> 32
+        if value < signature[bucket]:
+            signature[bucket] = value
+    return signature
+
+def minhash_files(paths):
+    """计算多个文件的签名，返回 (路径, 大小, 修改时间, 签名) 列表"""
+    results = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            results.append((path, stat.st_size, stat.st_mtime, minhash_file(path)))
+        except OSError:
+            continue
+    return results
+
+def estimate_similarity(a, b):
+    """按签名估计两个特征集合的 Jaccard 相似度"""
+    used = equal = 0
+    for x, y in zip(a, b):
+        if x != MINHASH_EMPTY or y != MINHASH_EMPTY:
+            used += 1
+            equal += x == y
+    return equal / used if used else 0
+
+class SimilarityIndex:
+    """角色配置的 MinHash/LSH 相似度索引，文件签名按大小和修改时间缓存"""
+
+    def __init__(self, cache_file=os.path.join("data", "similarity_cache.json")):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.signatures = {}
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def file_signatures(self, paths, processes=None):
+        """批量获取文件签名，未缓存的文件较多时在进程池中计算"""
+        signatures = {}
+        pending = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            with self.lock:
+                entry = self.entries.get(path)
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+                signatures[path] = list(struct.unpack(f"<{MINHASH_SIZE}I", base64.b64decode(entry[2])))
+            else:
+                pending.append(path)
+        
+        if len(pending) < 64:
+            results = minhash_files(pending)
+        else:
+            chunk_size = 64
+            chunks = [pending[index:index + chunk_size] for index in range(0, len(pending), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = [result for chunk in executor.map(minhash_files, chunks) for result in chunk]
+        
+        with self.lock:
+            for path, size, mtime, signature in results:
+                encoded = base64.b64encode(struct.pack(f"<{MINHASH_SIZE}I", *signature)).decode("ascii")
+                self.entries[path] = [size, mtime, encoded]
+                signatures[path] = signature
+        return signatures
+
+    def build(self, characters, files=None):
+        """建立索引，characters 为 {名称: 角色文件夹}，files 指定参与比较的文件类型"""
+        files = files or [name for name, _ in CONFIG_FILES]
+        paths = {
+            name: [os.path.join(folder, config_file) for config_file in files]
+            for name, folder in characters.items()
+        }
+        file_signatures = self.file_signatures([path for character_paths in paths.values() for path in character_paths])
+        self.save()
+        
+        # 特征集合的并集的签名等于各文件签名逐位取最小值
+        self.signatures = {}
+        for name, character_paths in paths.items():
+            signatures = [file_signatures[path] for path in character_paths if path in file_signatures]
+            if signatures:
+                self.signatures[name] = [min(values) for values in zip(*signatures)]
+        return self
+
+    def most_similar(self, name, top_n=10):
+        """与指定角色最相似的角色，返回 [(名称, 相似度)]"""
+        signature = self.signatures[name]
+        scores = [
+            (other, estimate_similarity(signature, other_signature))
+            for other, other_signature in self.signatures.items()
+            if other != name
+        ]
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:top_n]
+
+    def clusters(self, threshold=0.8):
+        """用 LSH 分段找出候选角色，相似度达到阈值的归为一组，返回按人数排序的分组"""
+        buckets = {}
+        for name, signature in self.signatures.items():
+            for start in range(0, MINHASH_SIZE, LSH_ROWS):
+                band = tuple(signature[start:start + LSH_ROWS])
+                if all(value == MINHASH_EMPTY for value in band):
+                    continue
+                buckets.setdefault((start, band), []).append(name)
+        
+        # 并查集合并同一桶中与桶内首个角色足够相似的角色
+        parents = {name: name for name in self.signatures}
+        
+        def find(name):
+            while parents[name] != name:
+                parents[name] = parents[parents[name]]
+                name = parents[name]
+            return name
+        
+        checked = set()
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                pair = (first, other)
+                if pair in checked or find(first) == find(other):
+                    continue
+                checked.add(pair)
+                if estimate_similarity(self.signatures[first], self.signatures[other]) >= threshold:
+                    parents[find(other)] = find(first)
+        
+        groups = {}
+        for name in self.signatures:
+            groups.setdefault(find(name), []).append(name)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+    def save(self):
+        """保存缓存"""
+        with self.lock:
+            entries = dict(self.entries)
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+similarity_index = SimilarityIndex()
+
+def analyze_similarity(config, files=None, threshold=0.8):
+    """建立两个服务器所有角色的相似度索引，返回 (索引, 分组, {名称: 显示名})"""
+    characters = {}
+    labels = {}
+    for server_type in ("international", "china"):
+        base_path = get_game_path(config, server_type)
+        if not base_path:
+            continue
+        server_folder = get_server_folder(server_type)
+        marks = load_marks(server_type)
+        for folder in list_character_folders(base_path):
+            name = f"{server_folder}/{folder}"
+            characters[name] = os.path.join(base_path, folder)
+            labels[name] = f"{server_folder} {marks[folder]} ({folder})" if marks.get(folder) else name
+    index = similarity_index.build(characters, files)
+    return index, index.clusters(threshold), labels
+
+class SettingsWriter:
+    """设置和界面状态的延迟写入：短时间内的多次保存合并为一次，静默一段时间后在后台线程原子替换文件"""
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        # 等待写入和正在写入的内容 {路径: 序列化后的文本}
+        self.queued = {}
+        self.writing = {}
+        self.timer = None
+
+    def save(self, path, data):
+        """登记要保存的内容，调用时立即序列化，之后对 data 的修改不影响本次保存"""
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        with self.lock:
+            self.queued[path] = text
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def pending(self, path):
+        """尚未写入文件的内容，没有时返回 None"""
+        with self.lock:
+            text = self.queued.get(path, self.writing.get(path))
+        return None if text is None else json.loads(text)
+
+    def load(self, path, default=None):
+        """读取设置，有尚未写入的内容时直接使用，不等待磁盘写入"""
+        data = self.pending(path)
+        if data is not None:
+            return data
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def flush(self):
+        """立即写入所有待保存的内容"""
+        with self.write_lock:
+            with self.lock:
+                self.writing, self.queued = self.queued, {}
+                if self.timer:
+                    self.timer.cancel()
+                    self.timer = None
+            for path, text in list(self.writing.items()):
+                try:
+                    directory = os.path.dirname(path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                        f.write(text)
+                    os.replace(f"{path}.tmp", path)
+                except OSError:
+                    # 写入失败时保留，下次保存或退出时重试（期间有新内容则以新内容为准）
+                    with self.lock:
+                        self.queued.setdefault(path, text)
+                finally:
+                    with self.lock:
+                        self.writing.pop(path, None)
+
+settings_writer = SettingsWriter()
+atexit.register(settings_writer.flush)
+
+class RosterModel:
+    """角色元数据：最后游玩时间（配置文件的最新修改时间）、配置大小和备份时间。
+    后台扫描时按文件状态更新，本程序写入配置文件后只更新该文件，界面排序和筛选只读取内存中的数据"""
+
+    def __init__(self, cache_file=os.path.join("data", "roster_meta.json")):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.dirty = False
+        # {游戏路径: {角色文件夹: {"files": {文件名: [大小, 修改时间]}, "backup": 备份时间}}}
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self.rosters = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.rosters = {}
+
+    def update(self, base_path, folders, backups=None):
+        """扫描后更新一个游戏路径下的角色，backups 为 None 时保留原备份时间"""
+        names = [name for name, _ in CONFIG_FILES]
+        scanned = {}
+        for folder in folders:
+            stats = copy_engine.stat_many(os.path.join(base_path, folder), names)
+            scanned[folder] = {name: [stat.st_size, stat.st_mtime] for name, stat in stats.items()}
+        with self.lock:
+            roster = self.rosters.setdefault(base_path, {})
+            for folder in [folder for folder in roster if folder not in scanned]:
+                del roster[folder]
+                self.dirty = True
+            for folder, files in scanned.items():
+                entry = roster.setdefault(folder, {"files": {}, "backup": None})
+                if entry["files"] != files:
+                    entry["files"] = files
+                    self.dirty = True
+                if backups is not None and entry["backup"] != backups.get(folder):
+                    entry["backup"] = backups.get(folder)
+                    self.dirty = True
+        self.save()
+
+    def file_changed(self, path):
+        """本程序写入配置文件后更新对应角色"""
+        folder_path, name = os.path.split(os.path.abspath(path))
+        base_path, folder = os.path.split(folder_path)
         try:
-            ctypes.windll.user32.SetProcessDPIAware()
-        except AttributeError:
-            pass
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self.lock:
+            for root, roster in self.rosters.items():
+                if folder in roster and os.path.abspath(root) == base_path:
+                    roster[folder]["files"][os.path.normcase(name)] = [stat.st_size, stat.st_mtime]
+                    self.dirty = True
+
+    def folders(self, base_path):
+        """上次扫描到的角色文件夹，未扫描过返回 None"""
+        with self.lock:
+            roster = self.rosters.get(base_path)
+            return list(roster) if roster is not None else None
+
+    def rows(self, base_path, folders, backups=None):
+        """角色的 {文件夹: {played, size, backup}}，backups 可覆盖记录的备份时间"""
+        with self.lock:
+            roster = self.rosters.get(base_path, {})
+            rows = {}
+            for folder in folders:
+                entry = roster.get(folder, {"files": {}, "backup": None})
+                files = entry["files"].values()
+                rows[folder] = {
+                    "played": max((mtime for _, mtime in files), default=None),
+                    "size": sum(size for size, _ in files) if files else None,
+                    "backup": backups.get(folder) if backups is not None and folder in backups else entry["backup"]
+                }
+        return rows
+
+    def save(self):
+        """有变化时写入缓存文件"""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            settings_writer.save(self.cache_file, self.rosters)
+
+roster_model = RosterModel()
+atexit.register(roster_model.save)
+
+def latency_bucket(ms):
+    """延迟直方图的桶下界：100ms 以下精度 1ms，1s 以下精度 10ms，之后精度 100ms"""
+    if ms < 100:
+        return int(ms)
+    if ms < 1000:
+        return int(ms // 10 * 10)
+    return int(ms // 100 * 100)
+
+class UiWatchdog:
+    """测量 Tk 主线程的事件循环延迟，记录超过阈值的卡顿及当时正在执行的处理函数。
+    延迟按桶计数，长时间运行时内存占用不随心跳次数增长"""
+
+    def __init__(self, root, threshold_ms=200, interval_ms=50):
+        self.root = root
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.main_thread_id = threading.get_ident()
+        self.started = time.time()
+        # {桶下界毫秒: 次数}，另记样本数、总和与最大值
+        self.histogram = {}
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.stall_count = 0
+        self.stall_ms = 0
+        self.sampled_handler = None
+        self.running = True
+        self.expected = time.perf_counter() + self.interval
+        self.root.after(interval_ms, self.beat)
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    def beat(self):
+        """心跳回调，延迟为实际执行时间与预期时间之差"""
+        if not self.running:
+            return
+        now = time.perf_counter()
+        latency = max(0, now - self.expected)
+        self.add_sample(latency * 1000)
+        if latency > self.threshold:
+            self.record_stall(latency, self.sampled_handler or "未知")
+        self.sampled_handler = None
+        self.expected = now + self.interval
+        self.root.after(int(self.interval * 1000), self.beat)
+
+    def watch(self):
+        """监视线程：心跳超时后采样主线程当前的调用栈"""
+        while self.running:
+            time.sleep(self.threshold / 4)
+            if self.sampled_handler is None and time.perf_counter() - self.expected > self.threshold:
+                frame = sys._current_frames().get(self.main_thread_id)
+                if frame is not None:
+                    self.sampled_handler = self.describe(frame)
+
+    def describe(self, frame):
+        """获取调用栈中属于本程序的函数，由内到外最多三层"""
+        names = []
+        while frame is not None and len(names) < 3:
+            code = frame.f_code
+            if os.path.abspath(code.co_filename) == os.path.abspath(__file__):
+                names.append(f"{getattr(code, 'co_qualname', code.co_name)}:{frame.f_lineno}")
+            frame = frame.f_back
+        return " ← ".join(names) if names else "Tk 内部"
+
+    def add_sample(self, ms):
+        """把一次心跳延迟计入直方图"""
+        bucket = latency_bucket(ms)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        self.samples += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        """按直方图估算百分位延迟，返回所在桶的下界"""
+        if not self.samples:
+            return 0
+        rank = min(self.samples - 1, int(self.samples * p))
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen > rank:
+                return bucket
+        return latency_bucket(self.max_ms)
+
+    def record_stall(self, latency, handler):
+        """记录一次卡顿"""
+        self.stall_count += 1
+        self.stall_ms += round(latency * 1000)
+        os.makedirs("data", exist_ok=True)
+        with open(os.path.join("data", "ui_stalls.log"), 'a', encoding='utf-8') as f:
+            f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {latency * 1000:.0f}ms {handler}\n")
+
+    def summary(self):
+        """本次会话的延迟统计"""
+        return {
+            "version": APP_VERSION,
+            "start": self.started,
+            "duration": round(time.time() - self.started, 1),
+            "samples": self.samples,
+            "mean_ms": round(self.total_ms / self.samples, 1) if self.samples else 0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 1),
+            "stalls": self.stall_count,
+            "stall_ms": self.stall_ms
+        }
+
+    def stop(self):
+        """停止监视并追加本次会话的统计"""
+        self.running = False
+        summary_file = os.path.join("data", "ui_latency.json")
+        try:
+            with open(summary_file, 'r', encoding='utf-8') as f:
+                sessions = json.load(f)
+        except (FileNotFoundError, ValueError):
+            sessions = []
+        sessions.append(self.summary())
+        os.makedirs("data", exist_ok=True)
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(sessions, f, ensure_ascii=False, indent=2)
+
+class RosterView:
+    """角色列表：树列显示标记和文件夹名，元数据显示在可点击排序的列中，排序和筛选不重新扫描磁盘"""
+    column_names = {"played": "最后游玩", "size": "配置大小", "backup": "备份时间"}
+    # 快速筛选条件，参数为角色的元数据
+    quick_filters = {
+        "全部": lambda row: True,
+        "未备份": lambda row: row["backup"] is None,
+        "备份早于最后游玩": lambda row: row["backup"] is not None and bool(row["played"]) and (row["backup"] or 0) < row["played"],
+        "超过 7 天未备份": lambda row: row["backup"] is None or time.time() - (row["backup"] or 0) > 7 * 86400,
+        "超过 30 天未游玩": lambda row: not row["played"] or time.time() - row["played"] > 30 * 86400
+    }
+
+    def __init__(self, parent, columns=("played", "size", "backup"), selectmode="browse"):
+        self.columns = columns
+        self.folders = []
+        self.marks = {}
+        self.meta = {}
+        self.sort_column = "#0"
+        self.sort_reverse = False
+        
+        # 筛选区域
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(fill="x", pady=(0, 5))
+        ttk.Label(filter_frame, text="筛选：").pack(side="left")
+        self.filter_var = ttk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.filter_var, width=15).pack(side="left", fill="x", expand=True)
+        filters = [name for name in self.quick_filters if name == "全部" or "backup" in columns or "备份" not in name]
+        self.quick_var = ttk.StringVar(value="全部")
+        ttk.Combobox(
+            filter_frame, textvariable=self.quick_var, values=filters, state="readonly", width=16
+        ).pack(side="left", padx=(5, 0))
+        self.filter_var.trace_add("write", lambda *args: self.render())
+        self.quick_var.trace_add("write", lambda *args: self.render())
+        
+        # 列表
+        tree_frame = ttk.Frame(parent)
+        tree_frame.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=columns, selectmode=selectmode)
+        self.tree.column("#0", width=200, minwidth=120)
+        for column in columns:
+            self.tree.column(column, width=110 if column != "size" else 80, anchor="e" if column == "size" else "w", stretch=False)
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        self.update_headings()
+
+    def update_headings(self):
+        """设置列标题，当前排序列显示方向"""
+        for column in ("#0",) + tuple(self.columns):
+            text = "角色" if column == "#0" else self.column_names[column]
+            if column == self.sort_column:
+                text += " ▼" if self.sort_reverse else " ▲"
+            self.tree.heading(column, text=text, command=lambda column=column: self.sort_by(column))
+
+    def sort_by(self, column):
+        """按列排序，再次点击同一列时反向；时间和大小默认从大到小"""
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = column != "#0"
+        self.update_headings()
+        self.render()
+
+    def set_rows(self, folders, marks, meta):
+        """更新角色列表和元数据"""
+        self.folders = list(folders)
+        self.marks = marks
+        self.meta = meta
+        self.render()
+
+    def display_name(self, folder):
+        """有标记时显示"标记名 (文件夹名)"，否则显示文件夹名"""
+        return f"{self.marks.get(folder)} ({folder})" if folder in self.marks else folder
+
+    def format_values(self, row):
+        """格式化各列的显示内容"""
+        values = []
+        for column in self.columns:
+            value = row.get(column)
+            if column == "played":
+                values.append(datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M') if value else "")
+            elif column == "size":
+                values.append(f"{value / 1024:.1f} KB" if value is not None else "")
+            elif value is None:
+                values.append("未备份")
+            else:
+                values.append(format_age(value) if value else "已备份")
+        return tuple(values)
+
+    def render(self):
+        """按当前筛选和排序显示，只使用内存中的数据"""
+        empty = {"played": None, "size": None, "backup": None}
+        text = self.filter_var.get().strip().lower()
+        quick_filter = self.quick_filters.get(self.quick_var.get(), self.quick_filters["全部"])
+        folders = [
+            folder for folder in self.folders
+            if (not text or text in self.display_name(folder).lower()) and quick_filter(self.meta.get(folder, empty))
+        ]
+        
+        if self.sort_column == "#0":
+            folders.sort(key=lambda folder: self.display_name(folder).lower(), reverse=self.sort_reverse)
+        else:
+            # 没有数据的行始终排在最后
+            present = [folder for folder in folders if self.meta.get(folder, empty)[self.sort_column] is not None]
+            missing = [folder for folder in folders if self.meta.get(folder, empty)[self.sort_column] is None]
+            present.sort(key=lambda folder: self.meta[folder][self.sort_column], reverse=self.sort_reverse)
+            folders = present + missing
+        
+        sync_treeview(self.tree, [
+            (folder, self.display_name(folder), self.format_values(self.meta.get(folder, empty)))
+            for folder in folders
+        ])
 
 class ConfigManagerWindow:
     def __init__(self, parent, international_path, china_path, backup_path):
@@ -40,10 +4384,11 @@ class ConfigManagerWindow:
         
         # 初始化选择的文件夹
         self.selected_folder = None
+        self.scan_generation = 0
         
         # 设置口大小
-        window_width = 600
-        window_height = 400
+        window_width = 720
+        window_height = 450
         screen_width = self.window.winfo_screenwidth()
         screen_height = self.window.winfo_screenheight()
         x = (screen_width - window_width) // 2
@@ -92,8 +4437,8 @@ class ConfigManagerWindow:
         list_frame = ttk.LabelFrame(main_frame, text="角色列表", padding=5)
         list_frame.pack(side="left", fill="both", expand=True, padx=(0, 5))
         
-        self.listbox = ttk.Treeview(list_frame, show="tree", selectmode="browse")
-        self.listbox.pack(fill="both", expand=True)
+        self.roster = RosterView(list_frame, columns=("played", "size"))
+        self.listbox = self.roster.tree
         
         # 创建右侧操作区域
         operation_frame = ttk.LabelFrame(main_frame, text="操作", padding=5)
@@ -148,52 +4493,56 @@ class ConfigManagerWindow:
     def scan_folders(self):
         """扫描并显示文件夹"""
         # 保存当前选择
-        current_selection = None
         selected = self.listbox.selection()
         if selected:
-            current_selection = selected[0]
-            self.selected_folder = current_selection  # 更新 selected_folder
-        
-        # 清空列表
-        for item in self.listbox.get_children():
-            self.listbox.delete(item)
+            self.selected_folder = selected[0]  # 更新 selected_folder
         
         # 获取当前选择的服务器和对应的路径
         server_type = self.server_var.get()
         path_var = self.international_path if server_type == "international" else self.china_path
-        marks = self.international_marks if server_type == "international" else self.china_marks
         
         # 获取路径
         base_path = path_var.get()
         
+        # 丢弃之前未完成的扫描结果
+        self.scan_generation += 1
+        generation = self.scan_generation
+        
         if not base_path:
+            sync_treeview(self.listbox, [])
             messagebox.showwarning("警告", "请先在路径设置中设置对应的游戏路径！", parent=self.window)
             return
         
-        # 扫描文件夹
+        # 先显示缓存的角色列表，再在后台重新扫描
+        self.show_folders(base_path, load_roster_cache()["rosters"].get(base_path, []))
+        future = run_in_background(scan_roster, base_path)
+        poll_future(self.window, future, lambda f: self.on_scan_done(f, generation, base_path))
+
+    def on_scan_done(self, future, generation, base_path):
+        """后台扫描完成时的处理"""
+        if generation != self.scan_generation:
+            return
         try:
-            first_item = None
-            for item in os.listdir(base_path):
-                if "FFXIV_" in item and os.path.isdir(os.path.join(base_path, item)):
-                    # 检查是否有标记，如果有标记则显示"标记名 (文件夹名)"，否则直接显示文件夹名
-                    display_name = f"{marks.get(item)} ({item})" if item in marks else item
-                    
-                    self.listbox.insert("", "end", item, text=display_name)
-                    if first_item is None:
-                        first_item = item
-            
-            # 优先使用保存的选择
-            if self.selected_folder and self.selected_folder in os.listdir(base_path):
-                self.listbox.selection_set(self.selected_folder)
-            # 其次使用当前选择
-            elif current_selection and current_selection in os.listdir(base_path):
-                self.listbox.selection_set(current_selection)
-            # 最后才使用第一项
-            elif first_item:
-                self.listbox.selection_set(first_item)
-                
+            folders, _ = future.result()
         except Exception as e:
             messagebox.showerror("错误", f"扫描文件夹时出错：{str(e)}", parent=self.window)
+            return
+        save_roster_cache(base_path, folders)
+        self.show_folders(base_path, folders)
+
+    def show_folders(self, base_path, folders):
+        """显示文件夹列表及最后游玩时间、配置大小"""
+        server_type = self.server_var.get()
+        marks = self.international_marks if server_type == "international" else self.china_marks
+        self.roster.set_rows(folders, marks, roster_model.rows(base_path, folders))
+        
+        # 优先保持当前选择，其次使用保存的选择，最后才使用第一项
+        if self.listbox.selection():
+            return
+        if self.selected_folder and self.listbox.exists(self.selected_folder):
+            self.listbox.selection_set(self.selected_folder)
+        elif self.listbox.get_children():
+            self.listbox.selection_set(self.listbox.get_children()[0])
 
     def mark_folder(self):
         """标记选中的文件夹"""
@@ -252,8 +4601,7 @@ class ConfigManagerWindow:
                 marks = self.international_marks if server_type == "international" else self.china_marks
                 marks[folder_id] = new_name
                 self.save_marks(server_type, marks)
-                display_name = f"{new_name} ({folder_id})"
-                self.listbox.item(folder_id, text=display_name)
+                self.roster.render()
                 dialog.destroy()
         
         # 确认按钮
@@ -318,6 +4666,29 @@ class App:
         
         # 添加配置管理器实例变量
         self.config_manager = None
+        self.sync_window = None
+        
+        # 按配置启动本地 API
+        self.api_server = None
+        if self.config["api"].get("enabled"):
+            self.start_api_server()
+        
+        # 按配置启动指标接口
+        self.metrics_server = None
+        if self.config["metrics"].get("enabled"):
+            self.start_metrics_server()
+        
+        # 按配置或 --watchdog 参数启用界面卡顿监视
+        self.watchdog = None
+        if self.config["watchdog"].get("enabled") or "--watchdog" in sys.argv:
+            self.watchdog = UiWatchdog(self.root, self.config["watchdog"].get("threshold_ms", 200))
+        
+        # 启用加密时在启动后询问一次密码
+        if self.config["backup_storage"].get("encrypt") and not EncryptedStorage.session_passphrase:
+            self.root.after_idle(self.ask_passphrase)
+        
+        # 在窗口关闭时保存统计
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         # 设置窗口图标
         self.icon_path = get_resource_path("3.ico")  # 修改为 3.ico
@@ -327,7 +4698,7 @@ class App:
 
     def load_config(self):
         """加载配置"""
-        self.config_file = os.path.join(self.data_dir, "config.json")
+        self.config_file = get_config_file(self.data_dir)
         try:
             with open(self.config_file, 'r', encoding='utf-8') as f:
                 self.config = json.load(f)
@@ -337,16 +4708,45 @@ class App:
                 "china_path": "",
                 "backup_path": ""
             }
+        self.config.setdefault("backup_storage", {"type": "local"})
+        # 旧版本以明文保存了加密密码，读入内存后从配置文件中删除
+        passphrase = self.config["backup_storage"].pop("passphrase", "")
+        if passphrase:
+            EncryptedStorage.session_passphrase = passphrase
+            settings_writer.save(self.config_file, self.config)
+        self.config.setdefault("api", {"enabled": False, "port": 8766, "token": ""})
+        self.config.setdefault("watchdog", {"enabled": False, "threshold_ms": 200})
+        self.config.setdefault("metrics", {"enabled": False, "port": 9466})
+        self.config.setdefault("low_impact", {"mode": "off", "bytes_per_second": 4 * 1024 * 1024, "ops_per_second": 20})
+        io_throttle.configure(self.config["low_impact"])
+        self.config.setdefault("durability", "batch")
+        durability.configure(self.config["durability"])
+
+    def ask_passphrase(self):
+        """询问本次运行使用的加密密码"""
+        passphrase = simpledialog.askstring(
+            "备份密码", "备份已启用加密，请输入密码（仅在本次运行中使用，不会保存）：", show="*", parent=self.root
+        )
+        if passphrase:
+            EncryptedStorage.session_passphrase = passphrase
 
     def save_config(self):
         """保存配置"""
-        self.config = {
+        self.config.update({
             "international_path": self.international_path.get(),
             "china_path": self.china_path.get(),
             "backup_path": self.backup_path.get()
-        }
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, ensure_ascii=False, indent=2)
+        })
+        settings_writer.save(self.config_file, self.config)
+
+    def on_closing(self):
+        """主窗口关闭时的处理"""
+        if self.watchdog:
+            self.watchdog.stop()
+        self.root.destroy()
+        
+        # 写入尚未保存的设置
+        settings_writer.flush()
 
     def create_character_config_section(self):
         """创建角色配置管理区域"""
@@ -365,6 +4765,149 @@ class App:
             width=15,
             command=self.open_config_manager
         ).pack(side="left", padx=5)
+        
+        # 配置清单报告按钮
+        self.inventory_button = ttk.Button(
+            btn_frame,
+            text="配置清单报告",
+            style="info.TButton",
+            width=15,
+            command=self.export_inventory
+        )
+        self.inventory_button.pack(side="left", padx=5)
+        
+        # 完整性检查按钮
+        self.integrity_button = ttk.Button(
+            btn_frame,
+            text="完整性检查",
+            style="info.TButton",
+            width=15,
+            command=self.check_integrity
+        )
+        self.integrity_button.pack(side="left", padx=5)
+        
+        # 相似度分析按钮
+        ttk.Button(
+            btn_frame,
+            text="相似度分析",
+            style="info.TButton",
+            width=15,
+            command=self.open_similarity_window
+        ).pack(side="left", padx=5)
+
+    def verify_backups(self):
+        """按校验清单校验本地备份"""
+        self.verify_button.configure(state="disabled")
+        reads = [self.config["backup_path"]] if self.config["backup_path"] else []
+        future = scheduler.submit(verify_backups, dict(self.config), priority=PRIORITY_LOW, reads=reads)
+        poll_future(self.root, future, self.on_verify_done)
+
+    def on_verify_done(self, future):
+        """备份校验完成时的处理"""
+        self.verify_button.configure(state="normal")
+        try:
+            checked, unverified, problems = future.result()
+        except Exception as e:
+            self.show_custom_messagebox("showerror", "错误", f"校验备份出错：{str(e)}")
+            return
+        note = f"\n另有 {unverified} 个文件没有校验记录（早期备份），重新备份后即可校验。" if unverified else ""
+        if not problems:
+            self.show_custom_messagebox("showinfo", "校验备份", f"已校验 {checked} 个文件，全部与备份时一致。{note}")
+            return
+        IntegrityReportWindow(self.root, checked, problems)
+
+    def pack_backups(self):
+        """把所有角色的备份导出为备份包"""
+        output_path = filedialog.asksaveasfilename(
+            title="导出备份包",
+            defaultextension=".ccmtpak",
+            filetypes=[("备份包", "*.ccmtpak")],
+            initialfile=f"备份包_{datetime.now().strftime('%Y%m%d')}.ccmtpak"
+        )
+        if not output_path:
+            return
+        self.pack_button.configure(state="disabled")
+        # 打包期间不允许写入备份位置，保证备份包内容一致
+        reads = [self.config["backup_path"]] if self.config["backup_path"] else []
+        future = scheduler.submit(pack_backups, dict(self.config), output_path, priority=PRIORITY_LOW, reads=reads)
+        poll_future(self.root, future, self.on_pack_done)
+
+    def on_pack_done(self, future):
+        """备份包导出完成时的处理"""
+        self.pack_button.configure(state="normal")
+        try:
+            character_count, file_count = future.result()
+        except Exception as e:
+            self.show_custom_messagebox("showerror", "错误", f"导出备份包出错：{str(e)}")
+            return
+        self.show_custom_messagebox("showinfo", "导出完成", f"已将 {character_count} 个角色的 {file_count} 个配置文件导出为备份包。")
+
+    def open_archive_window(self):
+        """打开备份包并选择要恢复的角色或文件"""
+        path = filedialog.askopenfilename(title="打开备份包", filetypes=[("备份包", "*.ccmtpak"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            storage = ArchiveStorage(path)
+        except (OSError, ValueError) as e:
+            self.show_custom_messagebox("showerror", "错误", f"无法打开备份包：{str(e)}")
+            return
+        ArchiveWindow(self.root, self.config, storage)
+
+    def open_similarity_window(self):
+        """打开相似度分析窗口"""
+        SimilarityWindow(self.root, self.config)
+
+    def check_integrity(self):
+        """检查所有角色文件夹和备份中的 DAT 文件"""
+        reads = [path for path in (self.config["international_path"], self.config["china_path"], self.config["backup_path"]) if path]
+        self.integrity_button.configure(state="disabled")
+        future = scheduler.submit(scan_integrity, dict(self.config), priority=PRIORITY_LOW, reads=reads)
+        poll_future(self.root, future, self.on_integrity_done)
+
+    def on_integrity_done(self, future):
+        """完整性检查完成时的处理"""
+        self.integrity_button.configure(state="normal")
+        try:
+            checked, problems = future.result()
+        except Exception as e:
+            self.show_custom_messagebox("showerror", "错误", f"完整性检查出错：{str(e)}")
+            return
+        if not problems:
+            self.show_custom_messagebox("showinfo", "完整性检查", f"已检查 {checked} 个文件，未发现问题。")
+            return
+        IntegrityReportWindow(self.root, checked, problems)
+
+    def export_inventory(self):
+        """导出所有角色的配置清单"""
+        output_path = filedialog.asksaveasfilename(
+            title="导出配置清单",
+            defaultextension=".csv",
+            filetypes=[("CSV 文件", "*.csv"), ("JSON 文件", "*.json")],
+            initialfile="配置清单.csv"
+        )
+        if not output_path:
+            return
+        
+        # 在调度器中读取两个服务器的角色文件夹
+        reads = [path for path in (self.config["international_path"], self.config["china_path"]) if path]
+        self.inventory_button.configure(state="disabled")
+        future = scheduler.submit(export_inventory, dict(self.config), output_path, priority=PRIORITY_LOW, reads=reads)
+        poll_future(self.root, future, lambda f: self.on_inventory_done(f, output_path))
+
+    def on_inventory_done(self, future, output_path):
+        """清单导出完成时的处理"""
+        self.inventory_button.configure(state="normal")
+        try:
+            character_count, group_count = future.result()
+        except Exception as e:
+            self.show_custom_messagebox("showerror", "错误", f"导出配置清单出错：{str(e)}")
+            return
+        self.show_custom_messagebox(
+            "showinfo",
+            "导出完成",
+            f"已导出 {character_count} 个角色的配置清单，共 {group_count} 组相同文件。\n\n{self.format_path(output_path)}"
+        )
 
     def open_config_manager(self):
         """打开配置管理器窗口"""
@@ -408,6 +4951,57 @@ class App:
             width=15,
             command=self.open_character_backup_window
         ).pack(side="left", padx=5)
+        
+        # 撤销按钮
+        ttk.Button(
+            btn_frame,
+            text="撤销",
+            style="warning.TButton",
+            width=15,
+            command=self.open_undo_window
+        ).pack(side="left", padx=5)
+        
+        # 局域网同步按钮
+        ttk.Button(
+            btn_frame,
+            text="局域网同步",
+            style="info.TButton",
+            width=15,
+            command=self.open_sync_window
+        ).pack(side="left", padx=5)
+        
+        # 第二行按钮
+        btn_frame2 = ttk.Frame(frame)
+        btn_frame2.pack(fill="x", pady=(5, 0))
+        
+        # 校验备份按钮
+        self.verify_button = ttk.Button(
+            btn_frame2,
+            text="校验备份",
+            style="info.TButton",
+            width=15,
+            command=self.verify_backups
+        )
+        self.verify_button.pack(side="left", padx=5)
+        
+        # 导出备份包按钮
+        self.pack_button = ttk.Button(
+            btn_frame2,
+            text="导出备份包",
+            style="info.TButton",
+            width=15,
+            command=self.pack_backups
+        )
+        self.pack_button.pack(side="left", padx=5)
+        
+        # 打开备份包按钮
+        ttk.Button(
+            btn_frame2,
+            text="打开备份包",
+            style="info.TButton",
+            width=15,
+            command=self.open_archive_window
+        ).pack(side="left", padx=5)
 
     def create_path_section(self):
         """创建路径设置区域"""
@@ -426,6 +5020,209 @@ class App:
         
         # 备份路径
         self.create_path_row(frame, "备份路径：", "backup_path")
+        
+        # 备份存储
+        storage_frame = ttk.Frame(frame)
+        storage_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(
+            storage_frame,
+            text="备份存储：",
+            style="PathLabel.TLabel"
+        ).pack(side="left")
+        
+        self.storage_label = ttk.Label(storage_frame, style="PathLabel.TLabel")
+        self.storage_label.pack(side="left", fill="x", expand=True)
+        self.update_storage_label()
+        
+        ttk.Button(
+            storage_frame,
+            text="设置",
+            style="secondary.TButton",
+            command=self.open_storage_settings
+        ).pack(side="right")
+        
+        # 本地 API
+        api_frame = ttk.Frame(frame)
+        api_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(
+            api_frame,
+            text="本地 API：",
+            style="PathLabel.TLabel"
+        ).pack(side="left")
+        
+        self.api_label = ttk.Label(api_frame, text="未启用", style="PathLabel.TLabel")
+        self.api_label.pack(side="left", fill="x", expand=True)
+        
+        self.api_var = ttk.BooleanVar(value=self.config["api"].get("enabled", False))
+        ttk.Checkbutton(
+            api_frame,
+            text="启用",
+            variable=self.api_var,
+            command=self.toggle_api_server
+        ).pack(side="right")
+        
+        # 请求需要在 X-Api-Token 中携带令牌
+        ttk.Button(
+            api_frame,
+            text="复制令牌",
+            style="secondary.TButton",
+            command=self.copy_api_token
+        ).pack(side="right", padx=5)
+        
+        # 指标接口
+        metrics_frame = ttk.Frame(frame)
+        metrics_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(
+            metrics_frame,
+            text="指标接口：",
+            style="PathLabel.TLabel"
+        ).pack(side="left")
+        
+        self.metrics_label = ttk.Label(metrics_frame, text="未启用", style="PathLabel.TLabel")
+        self.metrics_label.pack(side="left", fill="x", expand=True)
+        
+        self.metrics_var = ttk.BooleanVar(value=self.config["metrics"].get("enabled", False))
+        ttk.Checkbutton(
+            metrics_frame,
+            text="启用",
+            variable=self.metrics_var,
+            command=self.toggle_metrics_server
+        ).pack(side="right")
+        
+        # 低影响模式
+        throttle_frame = ttk.Frame(frame)
+        throttle_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(
+            throttle_frame,
+            text="低影响模式：",
+            style="PathLabel.TLabel"
+        ).pack(side="left")
+        
+        self.throttle_modes = {"off": "关闭", "game": "游戏运行时", "always": "始终"}
+        self.throttle_var = ttk.StringVar(value=self.throttle_modes.get(self.config["low_impact"].get("mode"), "关闭"))
+        throttle_combo = ttk.Combobox(
+            throttle_frame,
+            textvariable=self.throttle_var,
+            values=list(self.throttle_modes.values()),
+            state="readonly",
+            width=12
+        )
+        throttle_combo.pack(side="right")
+        throttle_combo.bind("<<ComboboxSelected>>", self.on_throttle_mode_change)
+        
+        # 落盘保障
+        durability_frame = ttk.Frame(frame)
+        durability_frame.pack(fill="x", pady=2)
+        
+        ttk.Label(
+            durability_frame,
+            text="写入保障：",
+            style="PathLabel.TLabel"
+        ).pack(side="left")
+        
+        self.durability_levels = {"none": "不同步", "batch": "每批同步", "file": "逐个文件同步"}
+        self.durability_var = ttk.StringVar(value=self.durability_levels.get(self.config["durability"], "每批同步"))
+        durability_combo = ttk.Combobox(
+            durability_frame,
+            textvariable=self.durability_var,
+            values=list(self.durability_levels.values()),
+            state="readonly",
+            width=12
+        )
+        durability_combo.pack(side="right")
+        durability_combo.bind("<<ComboboxSelected>>", self.on_durability_change)
+
+    def toggle_api_server(self):
+        """启用或停用本地 API"""
+        self.config["api"]["enabled"] = self.api_var.get()
+        self.save_config()
+        if self.api_var.get():
+            self.start_api_server()
+        elif self.api_server:
+            self.api_server.stop()
+            self.api_server = None
+            self.api_label.configure(text="未启用")
+
+    def copy_api_token(self):
+        """复制本地 API 令牌到剪贴板"""
+        token = self.config["api"].get("token")
+        if not token:
+            self.show_custom_messagebox("showwarning", "警告", "请先启用本地 API，启用时会生成令牌。")
+            return
+        self.root.clipboard_clear()
+        self.root.clipboard_append(token)
+        self.show_custom_messagebox("showinfo", "已复制", "本地 API 令牌已复制到剪贴板，请求时放在 X-Api-Token 请求头中。")
+
+    def start_api_server(self):
+        """启动本地 API"""
+        if self.api_server:
+            return
+        # 首次启用时生成随机令牌
+        if not self.config["api"].get("token"):
+            self.config["api"]["token"] = secrets.token_urlsafe(24)
+            self.save_config()
+        try:
+            self.api_server = ApiServer(self.config, int(self.config["api"].get("port", 8766)), self.config["api"]["token"])
+        except Exception as e:
+            self.api_var.set(False)
+            self.show_custom_messagebox("showerror", "错误", f"启动本地 API 失败：{str(e)}")
+            return
+        self.api_label.configure(text=f"http://127.0.0.1:{self.api_server.port}")
+
+    def on_durability_change(self, event=None):
+        """切换落盘保障级别"""
+        levels = {text: level for level, text in self.durability_levels.items()}
+        self.config["durability"] = levels[self.durability_var.get()]
+        durability.configure(self.config["durability"])
+        self.save_config()
+
+    def on_throttle_mode_change(self, event=None):
+        """切换低影响模式"""
+        modes = {text: mode for mode, text in self.throttle_modes.items()}
+        self.config["low_impact"]["mode"] = modes[self.throttle_var.get()]
+        io_throttle.configure(self.config["low_impact"])
+        self.save_config()
+
+    def toggle_metrics_server(self):
+        """启用或停用指标接口"""
+        self.config["metrics"]["enabled"] = self.metrics_var.get()
+        self.save_config()
+        if self.metrics_var.get():
+            self.start_metrics_server()
+        elif self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+            self.metrics_label.configure(text="未启用")
+
+    def start_metrics_server(self):
+        """启动指标接口"""
+        if self.metrics_server:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.config, int(self.config["metrics"].get("port", 9466)))
+        except Exception as e:
+            self.metrics_var.set(False)
+            self.show_custom_messagebox("showerror", "错误", f"启动指标接口失败：{str(e)}")
+            return
+        self.metrics_label.configure(text=f"http://127.0.0.1:{self.metrics_server.port}/metrics")
+
+    def update_storage_label(self):
+        """更新备份存储显示"""
+        storage_names = {"local": "本地文件夹（备份路径）", "s3": "S3 兼容对象存储", "webdav": "WebDAV"}
+        self.storage_label.configure(text=storage_names.get(self.config["backup_storage"].get("type"), "本地文件夹（备份路径）"))
+
+    def open_storage_settings(self):
+        """打开备份存储设置窗口"""
+        StorageSettingsWindow(self.root, self.config["backup_storage"], self.on_storage_saved)
+
+    def on_storage_saved(self):
+        """备份存储设置保存后的处理"""
+        self.save_config()
+        self.update_storage_label()
 
     def create_path_row(self, parent, label_text, path_var_name):
         """创建路径设置行"""
@@ -495,7 +5292,18 @@ class App:
 
     def open_character_backup_window(self):
         """打开角色配置备份窗口"""
-        CharacterBackupWindow(self.root, self.international_path, self.china_path, self.backup_path)
+        CharacterBackupWindow(self.root, self.international_path, self.china_path, self.backup_path, self.config["backup_storage"])
+
+    def open_undo_window(self):
+        """打开撤销窗口"""
+        UndoWindow(self.root)
+
+    def open_sync_window(self):
+        """打开局域网同步窗口"""
+        if self.sync_window is None or not self.sync_window.window.winfo_exists():
+            self.sync_window = SyncWindow(self.root, self.backup_path, self.config.setdefault("lan_sync", {}), self.save_config)
+        else:
+            self.sync_window.window.lift()
 
     def open_software_backup_window(self):
         """打开软件配置备份窗口"""
@@ -505,6 +5313,179 @@ class App:
         """格式化路径用于显示"""
         return path.replace(os.sep, '/')
 
+class StorageSettingsWindow:
+    def __init__(self, parent, storage_config, on_save):
+        # 创建新窗口
+        self.window = ttk.Toplevel(parent)
+        self.window.title("备份存储设置")
+        self.window.transient(parent)
+        
+        # 保存参数
+        self.storage_config = storage_config
+        self.on_save = on_save
+        
+        # 设置窗口大小
+        window_width = 500
+        window_height = 780
+        x = (self.window.winfo_screenwidth() - window_width) // 2
+        y = (self.window.winfo_screenheight() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 存储类型
+        self.type_var = ttk.StringVar(value=storage_config.get("type", "local"))
+        type_frame = ttk.Frame(main_frame)
+        type_frame.pack(fill="x", pady=(0, 10))
+        for value, text in [("local", "本地文件夹"), ("s3", "S3 兼容"), ("webdav", "WebDAV")]:
+            ttk.Radiobutton(
+                type_frame,
+                text=text,
+                value=value,
+                variable=self.type_var
+            ).pack(side="left", padx=5)
+        
+        # 各存储类型的设置项
+        self.field_vars = {}
+        s3_frame = ttk.LabelFrame(main_frame, text="S3 兼容对象存储", padding=5)
+        s3_frame.pack(fill="x", pady=(0, 10))
+        for name, label in [
+            ("endpoint", "服务地址："),
+            ("bucket", "存储桶："),
+            ("region", "区域："),
+            ("prefix", "路径前缀："),
+            ("access_key", "Access Key："),
+            ("secret_key", "Secret Key：")
+        ]:
+            self.create_field(s3_frame, "s3", name, label, show="*" if name == "secret_key" else "")
+        
+        webdav_frame = ttk.LabelFrame(main_frame, text="WebDAV", padding=5)
+        webdav_frame.pack(fill="x", pady=(0, 10))
+        for name, label in [
+            ("url", "地址："),
+            ("username", "用户名："),
+            ("password", "密码：")
+        ]:
+            self.create_field(webdav_frame, "webdav", name, label, show="*" if name == "password" else "")
+        
+        # 加密设置（对所有存储类型生效，恢复加密备份时也需要密码）
+        encrypt_frame = ttk.LabelFrame(main_frame, text="加密", padding=5)
+        encrypt_frame.pack(fill="x", pady=(0, 10))
+        self.encrypt_var = ttk.BooleanVar(value=storage_config.get("encrypt", False))
+        ttk.Checkbutton(
+            encrypt_frame,
+            text="加密新备份" if AESGCM else "加密新备份（需要安装 cryptography）",
+            variable=self.encrypt_var,
+            state="normal" if AESGCM else "disabled"
+        ).pack(anchor="w")
+        passphrase_frame = ttk.Frame(encrypt_frame)
+        passphrase_frame.pack(fill="x", pady=2)
+        ttk.Label(passphrase_frame, text="密码：", width=12).pack(side="left")
+        self.passphrase_var = ttk.StringVar(value=EncryptedStorage.session_passphrase)
+        ttk.Entry(passphrase_frame, textvariable=self.passphrase_var, show="*").pack(side="left", fill="x", expand=True)
+        ttk.Label(encrypt_frame, text="密码不会保存，每次启动后需要重新输入", style="secondary.TLabel").pack(anchor="w")
+        
+        # 压缩设置，字典根据角色文件夹中的同类文件自动训练
+        compress_frame = ttk.LabelFrame(main_frame, text="压缩", padding=5)
+        compress_frame.pack(fill="x", pady=(0, 10))
+        self.compress_var = ttk.BooleanVar(value=storage_config.get("compress", False))
+        ttk.Checkbutton(
+            compress_frame,
+            text="压缩新备份" if zstd else "压缩新备份（需要安装 zstandard）",
+            variable=self.compress_var,
+            state="normal" if zstd else "disabled"
+        ).pack(anchor="w")
+        
+        # 恢复设置
+        restore_frame = ttk.LabelFrame(main_frame, text="恢复", padding=5)
+        restore_frame.pack(fill="x", pady=(0, 10))
+        self.verify_restore_var = ttk.BooleanVar(value=storage_config.get("verify_restore", False))
+        ttk.Checkbutton(
+            restore_frame,
+            text="恢复后回读校验",
+            variable=self.verify_restore_var
+        ).pack(anchor="w")
+        
+        # 按钮区域
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill="x")
+        
+        self.status_label = ttk.Label(btn_frame, text="")
+        self.status_label.pack(side="left")
+        
+        ttk.Button(
+            btn_frame,
+            text="确定",
+            style="primary.TButton",
+            command=self.save
+        ).pack(side="right", padx=2)
+        
+        ttk.Button(
+            btn_frame,
+            text="测试连接",
+            command=self.test_connection
+        ).pack(side="right", padx=2)
+
+    def create_field(self, parent, storage_type, name, label, show=""):
+        """创建设置项"""
+        frame = ttk.Frame(parent)
+        frame.pack(fill="x", pady=2)
+        ttk.Label(frame, text=label, width=12).pack(side="left")
+        
+        # 只显示当前类型保存的值
+        value = self.storage_config.get(name, "") if self.storage_config.get("type") == storage_type else ""
+        var = ttk.StringVar(value=value)
+        self.field_vars[(storage_type, name)] = var
+        ttk.Entry(frame, textvariable=var, show=show).pack(side="left", fill="x", expand=True)
+
+    def get_config(self):
+        """获取界面上的存储配置"""
+        storage_type = self.type_var.get()
+        config = {
+            "type": storage_type,
+            "encrypt": self.encrypt_var.get(),
+            "compress": self.compress_var.get(),
+            "verify_restore": self.verify_restore_var.get()
+        }
+        for (field_type, name), var in self.field_vars.items():
+            if field_type == storage_type:
+                config[name] = var.get().strip()
+        return config
+
+    def test_connection(self):
+        """在后台测试连接"""
+        config = self.get_config()
+        if config["type"] == "local":
+            self.status_label.configure(text="本地文件夹无需测试")
+            return
+        storage = create_backup_storage(config, "")
+        self.status_label.configure(text="正在连接…")
+        future = run_in_background(storage.list_files, "")
+        poll_future(self.window, future, self.on_test_done)
+
+    def on_test_done(self, future):
+        """连接测试完成时的处理"""
+        try:
+            files = future.result()
+            self.status_label.configure(text=f"连接成功，共 {len(files)} 个文件")
+        except Exception as e:
+            self.status_label.configure(text="")
+            messagebox.showerror("连接失败", str(e), parent=self.window)
+
+    def save(self):
+        """保存设置"""
+        if self.encrypt_var.get() and not self.passphrase_var.get():
+            messagebox.showwarning("警告", "启用加密时必须填写密码！", parent=self.window)
+            return
+        EncryptedStorage.session_passphrase = self.passphrase_var.get()
+        # 原地更新，已打开的窗口也会使用新设置
+        self.storage_config.clear()
+        self.storage_config.update(self.get_config())
+        self.on_save()
+        self.window.destroy()
+
 class MigrationWindow:
     def __init__(self, parent, international_path, china_path):
         # 创建新窗口
@@ -543,6 +5524,10 @@ class MigrationWindow:
         self.source_var.trace_add("write", self.update_lists)
         self.target_var.trace_add("write", self.update_lists)
         
+        # 初始化列表选择和扫描状态
+        self.selected_folders = {}
+        self.scan_generation = 0
+        
         # 创建左侧面板
         self.create_left_panel(main_frame)
         
@@ -598,8 +5583,8 @@ class MigrationWindow:
         list_frame = ttk.LabelFrame(panel, text="角色列表", padding=5)
         list_frame.pack(fill="both", expand=True)
         
-        self.left_listbox = ttk.Treeview(list_frame, show="tree", selectmode="browse")
-        self.left_listbox.pack(fill="both", expand=True)
+        self.left_roster = RosterView(list_frame, columns=("played",))
+        self.left_listbox = self.left_roster.tree
 
     def create_right_panel(self, parent):
         """创建右侧板（目标）"""
@@ -632,8 +5617,8 @@ class MigrationWindow:
         list_frame = ttk.LabelFrame(panel, text="角色列表", padding=5)
         list_frame.pack(fill="both", expand=True)
         
-        self.right_listbox = ttk.Treeview(list_frame, show="tree", selectmode="browse")
-        self.right_listbox.pack(fill="both", expand=True)
+        self.right_roster = RosterView(list_frame, columns=("played",))
+        self.right_listbox = self.right_roster.tree
 
     def create_control_panel(self, parent):
         """创建中间控制面板"""
@@ -643,34 +5628,37 @@ class MigrationWindow:
         # 创建迁移按钮
         self.migrate_button = ttk.Button(
             control_panel,
-            text="迁移 →",
-            style="success.TButton",
+            text="迁移 →",
+            style="success.TButton",
+            width=10,
+            command=self.migrate_config
+        )
+        self.migrate_button.pack(pady=(0, 5))
+        
+        # 创建按标记批量迁移按钮
+        ttk.Button(
+            control_panel,
+            text="按标记批量",
+            style="info.TButton",
+            width=10,
+            command=self.open_bulk_migration
+        ).pack(pady=(0, 5))
+        
+        # 创建配置预设按钮
+        ttk.Button(
+            control_panel,
+            text="配置预设",
+            style="info.TButton",
             width=10,
-            command=self.migrate_config
-        )
-        self.migrate_button.pack(pady=(0, 20))
+            command=self.open_preset_window
+        ).pack(pady=(0, 20))
         
         # 创建配置选项框架
         options_frame = ttk.LabelFrame(control_panel, text="配置选项", padding=5)
         options_frame.pack(fill="both", expand=True)
         
         # 定义配置选项
-        self.config_options = {
-            "ACQ.DAT": "近期悄悄话人员列表",
-            "ADDON.DAT": "界面设置",
-            "COMMON.DAT": "角色设置",
-            "CONTROL0.DAT": "角色设置(鼠标模式)",
-            "CONTROL1.DAT": "角色设置(手柄模式)",
-            "GEARSET.DAT": "套装列表",
-            "GS.DAT": "九宫幻卡卡组",
-            "HOTBAR.DAT": "热键栏设置",
-            "ITEMFDR.DAT": "雇员物品顺序",
-            "ITEMODR.DAT": "物品栏、兵装库物品顺序",
-            "KEYBIND.DAT": "键位设置",
-            "LOGFLTR.DAT": "消息窗口设置",
-            "MACRO.DAT": "用户宏(该角色专用)",
-            "UISAVE.DAT": "UI使用记录"
-        }
+        self.config_options = dict(CONFIG_FILES)
         
         # 创建复选框变量
         self.option_vars = {}
@@ -732,30 +5720,11 @@ class MigrationWindow:
 
     def update_lists(self, *args):
         """更新列表显示"""
-        # 获取当前选择
-        left_selection = self.left_listbox.selection()
-        right_selection = self.right_listbox.selection()
-        
         # 保存当前选择的原始文件夹名
-        left_selected_folder = None
-        right_selected_folder = None
-        
-        if left_selection:
-            try:
-                left_selected_folder = self.left_listbox.item(left_selection[0])["values"][0]
-            except:
-                pass
-        
-        if right_selection:
-            try:
-                right_selected_folder = self.right_listbox.item(right_selection[0])["values"][0]
-            except:
-                pass
-        
-        # 清空两个列表
         for listbox in [self.left_listbox, self.right_listbox]:
-            for item in listbox.get_children():
-                listbox.delete(item)
+            selection = listbox.selection()
+            if selection:
+                self.selected_folders[str(listbox)] = selection[0]
         
         # 获取源和目标的路径和标记
         source_type = self.source_var.get()
@@ -768,79 +5737,60 @@ class MigrationWindow:
         source_marks = self.international_marks if source_type == "international" else self.china_marks
         target_marks = self.international_marks if target_type == "international" else self.china_marks
         
-        # 加载源列表
-        first_source_item = self.load_folder_list(self.left_listbox, source_path.get(), source_marks)
-        # 加载目标列表
-        first_target_item = self.load_folder_list(self.right_listbox, target_path.get(), target_marks)
-        
-        # 恢复左侧选择
-        if left_selected_folder:
-            # 查找匹配的项
-            for item in self.left_listbox.get_children():
-                try:
-                    if self.left_listbox.item(item)["values"][0] == left_selected_folder:
-                        self.left_listbox.selection_set(item)
-                        break
-                except:
-                    continue
-            else:
-                # 如果没找到匹配项，选择第一项
-                if first_source_item:
-                    self.left_listbox.selection_set(first_source_item)
-        elif first_source_item:
-            self.left_listbox.selection_set(first_source_item)
-        
-        # 恢复右侧选择
-        if right_selected_folder:
-            # 查找匹配的项
-            for item in self.right_listbox.get_children():
-                try:
-                    if self.right_listbox.item(item)["values"][0] == right_selected_folder:
-                        self.right_listbox.selection_set(item)
-                        break
-                except:
-                    continue
-            else:
-                # 如果没找到匹配项，选择第一项
-                if first_target_item:
-                    self.right_listbox.selection_set(first_target_item)
-        elif first_target_item:
-            self.right_listbox.selection_set(first_target_item)
-
-    def load_folder_list(self, listbox, path, marks):
-        """加载文件夹列表"""
-        if not path:
-            return None
-            
+        # 丢弃之前未完成的扫描结果
+        self.scan_generation += 1
+        generation = self.scan_generation
+        
+        # 先显示缓存的角色列表，再在后台重新扫描
+        cache = load_roster_cache()
+        for roster, path, marks in [
+            (self.left_roster, source_path.get(), source_marks),
+            (self.right_roster, target_path.get(), target_marks)
+        ]:
+            self.show_folder_list(roster, path, cache["rosters"].get(path, []) if path else [], marks)
+            if path:
+                future = run_in_background(scan_roster, path)
+                poll_future(
+                    self.window,
+                    future,
+                    lambda f, roster=roster, path=path, marks=marks: self.on_scan_done(f, generation, roster, path, marks)
+                )
+
+    def on_scan_done(self, future, generation, roster, path, marks):
+        """后台扫描完成时的处理"""
+        if generation != self.scan_generation:
+            return
         try:
-            first_item = None
-            for item in os.listdir(path):
-                if "FFXIV_" in item and os.path.isdir(os.path.join(path, item)):
-                    # 使用与角色配置管理相同的显示格式
-                    display_name = f"{marks.get(item, item)} ({item})" if item in marks else item
-                    # 为每个项目添加唯一标识符
-                    unique_id = f"{listbox}_{item}"
-                    listbox.insert("", "end", unique_id, text=display_name, values=(item,))
-                    if first_item is None:
-                        first_item = unique_id
-            return first_item
+            folders, _ = future.result()
         except Exception as e:
-            self.show_message("error", "错误", f"扫描文件夹时出错：{str(e)}")
-            return None
+            self.show_message("showerror", "错误", f"扫描文件夹时出错：{str(e)}")
+            return
+        save_roster_cache(path, folders)
+        self.show_folder_list(roster, path, folders, marks)
+
+    def show_folder_list(self, roster, path, folders, marks):
+        """显示文件夹列表及最后游玩时间，排序和筛选使用角色元数据"""
+        roster.set_rows(folders, marks, roster_model.rows(path, folders) if path else {})
+        
+        # 优先保持当前选择，其次使用保存的选择，最后才使用第一项
+        listbox = roster.tree
+        if listbox.selection():
+            return
+        selected_folder = self.selected_folders.get(str(listbox))
+        if selected_folder and listbox.exists(selected_folder):
+            listbox.selection_set(selected_folder)
+        elif listbox.get_children():
+            listbox.selection_set(listbox.get_children()[0])
 
     def load_options_config(self):
         """加载选项配置"""
         config_file = os.path.join("data", "migration_options.json")
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                saved_options = json.load(f)
-                # 更新选项状态
-                for filename, state in saved_options.items():
-                    if filename in self.option_vars:
-                        self.option_vars[filename].set(state)
-        except FileNotFoundError:
-            # 如果配置文件不在，使用默认值（选）
-            pass
+        # 窗口关闭后很快重新打开时，使用尚未写入的状态；配置文件不存在时使用默认值（选）
+        saved_options = settings_writer.load(config_file, {})
+        # 更新选项状态
+        for filename, state in saved_options.items():
+            if filename in self.option_vars:
+                self.option_vars[filename].set(state)
 
     def save_options_config(self):
         """保存选项配置"""
@@ -849,8 +5799,7 @@ class MigrationWindow:
             filename: var.get()
             for filename, var in self.option_vars.items()
         }
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(options_state, f, ensure_ascii=False, indent=2)
+        settings_writer.save(config_file, options_state)
 
     def migrate_config(self):
         """执行配置迁移"""
@@ -868,9 +5817,9 @@ class MigrationWindow:
         source_path = self.international_path if source_type == "international" else self.china_path
         target_path = self.international_path if target_type == "international" else self.china_path
         
-        # 获取实际的文件夹名（从values中获取）
-        source_folder = self.left_listbox.item(source_selection[0])["values"][0]
-        target_folder = self.right_listbox.item(target_selection[0])["values"][0]
+        # 列表项的 ID 即文件夹名
+        source_folder = source_selection[0]
+        target_folder = target_selection[0]
         
         # 构建完整路径
         source_folder_path = os.path.join(source_path.get(), source_folder)
@@ -896,20 +5845,18 @@ class MigrationWindow:
         ):
             return
         
-        # 执行迁移
+        # 通过调度器执行迁移，完成后显示结果
+        self.migrate_button.configure(state="disabled")
+        future = schedule_migration(source_folder_path, target_folder_path, selected_files, PRIORITY_HIGH)
+        poll_future(self.window, future, lambda f: self.on_migration_done(f, source_folder_path, target_folder_path))
+
+    def on_migration_done(self, future, source_folder_path, target_folder_path):
+        """迁移完成时的处理"""
+        self.migrate_button.configure(state="normal")
         try:
-            success_count = 0
-            for filename in selected_files:
-                source_file = os.path.join(source_folder_path, filename)
-                target_file = os.path.join(target_folder_path, filename)
-                
-                if os.path.exists(source_file):
-                    try:
-                        import shutil
-                        shutil.copy2(source_file, target_file)
-                        success_count += 1
-                    except Exception as e:
-                        self.show_message("error", "错", f"复制文件失败{str(e)}")
+            success_count, errors, unchanged_count = future.result()
+            for filename, error in errors:
+                self.show_message("error", "错", f"复制文件失败{error}")
             
             # 只在成功迁移后保存选项配置
             self.save_options_config()
@@ -920,7 +5867,7 @@ class MigrationWindow:
             # 显示成功消息
             messagebox.showinfo(
                 "迁移完成",
-                f"迁移完成！成功迁移 {success_count} 个配置文件。\n\n" +
+                f"迁移完成！成功迁移 {success_count} 个配置文件，{unchanged_count} 个已是最新。\n\n" +
                 f"从：{self.format_path(source_folder_path)}\n" +
                 f"到：{self.format_path(target_folder_path)}",
                 parent=self.window
@@ -930,6 +5877,22 @@ class MigrationWindow:
             self.window.lift()
             messagebox.showerror("错误", f"迁移过程出错：{str(e)}", parent=self.window)
 
+    def open_bulk_migration(self):
+        """打开按标记批量迁移窗口"""
+        selected_files = [
+            filename
+            for filename, var in self.option_vars.items()
+            if var.get()
+        ]
+        if not selected_files:
+            self.show_message("showwarning", "警告", "请至少选择一个配置文件！")
+            return
+        BulkMigrationWindow(self, selected_files)
+
+    def open_preset_window(self):
+        """打开配置预设窗口"""
+        PresetWindow(self)
+
     def show_message(self, type_, title, message, **kwargs):
         """显示息框"""
         # 放提示音
@@ -946,26 +5909,21 @@ class MigrationWindow:
 
     def load_selection_state(self):
         """加载选择状态"""
-        try:
-            with open(os.path.join("data", "migration_state.json"), 'r', encoding='utf-8') as f:
-                state = json.load(f)
-                self.source_var.set(state.get("source_server", "international"))
-                self.target_var.set(state.get("target_server", "international"))
-                
-                # 加载选中的配置
-                if "source_config" in state:
-                    for item in self.left_listbox.get_children():
-                        if self.left_listbox.item(item)["values"][0] == state["source_config"]:
-                            self.left_listbox.selection_set(item)
-                            break
-                
-                if "target_config" in state:
-                    for item in self.right_listbox.get_children():
-                        if self.right_listbox.item(item)["values"][0] == state["target_config"]:
-                            self.right_listbox.selection_set(item)
-                            break
-        except FileNotFoundError:
-            pass
+        state = settings_writer.load(os.path.join("data", "migration_state.json"))
+        if state is None:
+            return
+        self.source_var.set(state.get("source_server", "international"))
+        self.target_var.set(state.get("target_server", "international"))
+        
+        # 加载选中的配置（列表尚未扫描完成时，在扫描完成后选中）
+        for key, listbox in (("source_config", self.left_listbox), ("target_config", self.right_listbox)):
+            if key not in state:
+                continue
+            self.selected_folders[str(listbox)] = state[key]
+            if listbox.exists(state[key]):
+                listbox.selection_set(state[key])
+            else:
+                listbox.selection_remove(listbox.selection())
 
     def save_selection_state(self):
         """保存选择状态"""
@@ -977,14 +5935,13 @@ class MigrationWindow:
         # 保存选中的配置
         source_selection = self.left_listbox.selection()
         if source_selection:
-            state["source_config"] = self.left_listbox.item(source_selection[0])["values"][0]
+            state["source_config"] = source_selection[0]
         
         target_selection = self.right_listbox.selection()
         if target_selection:
-            state["target_config"] = self.right_listbox.item(target_selection[0])["values"][0]
+            state["target_config"] = target_selection[0]
         
-        with open(os.path.join("data", "migration_state.json"), 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        settings_writer.save(os.path.join("data", "migration_state.json"), state)
 
     def on_closing(self):
         """窗口关闭时的处理"""
@@ -995,8 +5952,556 @@ class MigrationWindow:
         """格式化路径用于显示"""
         return path.replace(os.sep, '/')
 
+class BulkMigrationWindow:
+    def __init__(self, migration_window, selected_files):
+        # 创建新窗口
+        self.migration_window = migration_window
+        self.window = ttk.Toplevel(migration_window.window)
+        self.window.title("按标记批量迁移")
+        self.window.transient(migration_window.window)
+        
+        # 保存参数
+        self.selected_files = selected_files
+        self.source_type = migration_window.source_var.get()
+        self.target_type = migration_window.target_var.get()
+        source_path = migration_window.international_path if self.source_type == "international" else migration_window.china_path
+        target_path = migration_window.international_path if self.target_type == "international" else migration_window.china_path
+        self.source_base = source_path.get()
+        self.target_base = target_path.get()
+        self.source_marks = migration_window.international_marks if self.source_type == "international" else migration_window.china_marks
+        self.target_marks = migration_window.international_marks if self.target_type == "international" else migration_window.china_marks
+        
+        # 批量任务状态
+        self.future = None
+        
+        # 设置窗口大小
+        window_width = 700
+        window_height = 450
+        x = migration_window.window.winfo_x() + (migration_window.window.winfo_width() - window_width) // 2
+        y = migration_window.window.winfo_y() + (migration_window.window.winfo_height() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        self.window.minsize(600, 350)
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 创建配对列表
+        list_frame = ttk.LabelFrame(main_frame, text="配对列表（双击修改目标）", padding=5)
+        list_frame.pack(fill="both", expand=True)
+        
+        self.pair_list = ttk.Treeview(
+            list_frame,
+            columns=("mark", "source", "target"),
+            show="headings",
+            selectmode="extended"
+        )
+        self.pair_list.heading("mark", text="标记")
+        self.pair_list.heading("source", text="源文件夹")
+        self.pair_list.heading("target", text="目标文件夹")
+        self.pair_list.column("mark", width=150)
+        self.pair_list.pack(fill="both", expand=True)
+        self.pair_list.bind("<Double-1>", self.edit_pair)
+        
+        # 创建按钮区域
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill="x", pady=(10, 0))
+        
+        ttk.Button(
+            btn_frame,
+            text="重新匹配",
+            command=self.match_pairs,
+            width=10
+        ).pack(side="left", padx=2)
+        
+        ttk.Button(
+            btn_frame,
+            text="删除所选",
+            command=self.remove_pairs,
+            width=10
+        ).pack(side="left", padx=2)
+        
+        self.status_label = ttk.Label(btn_frame, text="")
+        self.status_label.pack(side="left", padx=10)
+        
+        self.start_button = ttk.Button(
+            btn_frame,
+            text="开始迁移",
+            style="success.TButton",
+            command=self.start_migration,
+            width=10
+        )
+        self.start_button.pack(side="right", padx=2)
+        
+        # 自动配对
+        self.match_pairs()
+
+    def match_pairs(self):
+        """按标记自动配对"""
+        for item in self.pair_list.get_children():
+            self.pair_list.delete(item)
+        
+        try:
+            self.source_folders = list_character_folders(self.source_base)
+            self.target_folders = list_character_folders(self.target_base)
+        except Exception as e:
+            self.show_message("showerror", "错误", f"扫描文件夹时出错：{str(e)}")
+            return
+        
+        pairs = match_folders_by_mark(self.source_folders, self.source_marks, self.target_folders, self.target_marks)
+        for mark, source_folder, target_folder in pairs:
+            # 同一服务器下跳过自身
+            if self.source_base == self.target_base and source_folder == target_folder:
+                continue
+            self.pair_list.insert("", "end", values=(mark, source_folder, target_folder))
+        
+        self.status_label.configure(text=f"共 {len(self.pair_list.get_children())} 对")
+
+    def remove_pairs(self):
+        """删除选中的配对"""
+        for item in self.pair_list.selection():
+            self.pair_list.delete(item)
+        self.status_label.configure(text=f"共 {len(self.pair_list.get_children())} 对")
+
+    def edit_pair(self, event):
+        """修改配对的目标文件夹"""
+        item = self.pair_list.identify_row(event.y)
+        if not item:
+            return
+        mark, source_folder, target_folder = self.pair_list.item(item, "values")
+        
+        # 弹出选择对话框
+        dialog = ttk.Toplevel(self.window)
+        dialog.title("修改目标")
+        dialog.transient(self.window)
+        
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill="both", expand=True)
+        
+        ttk.Label(frame, text=f"{mark} ({source_folder}) 的目标：").pack(pady=(0, 5))
+        
+        # 目标选项显示为"标记名 (文件夹名)"
+        choices = [
+            f"{self.target_marks.get(folder)} ({folder})" if folder in self.target_marks else folder
+            for folder in self.target_folders
+        ]
+        target_var = ttk.StringVar(value=choices[self.target_folders.index(target_folder)] if target_folder in self.target_folders else "")
+        combo = ttk.Combobox(frame, textvariable=target_var, values=choices, state="readonly", width=40)
+        combo.pack(fill="x", pady=(0, 15))
+        
+        def confirm():
+            index = combo.current()
+            if index >= 0:
+                self.pair_list.item(item, values=(mark, source_folder, self.target_folders[index]))
+            dialog.destroy()
+        
+        ttk.Button(frame, text="确定", command=confirm, style="primary.TButton").pack()
+        
+        dialog.grab_set()
+        dialog.wait_window()
+
+    def start_migration(self):
+        """并发执行所有配对的迁移"""
+        pairs = [self.pair_list.item(item, "values") for item in self.pair_list.get_children()]
+        if not pairs:
+            self.show_message("showwarning", "警告", "没有可迁移的配对！")
+            return
+        
+        # 目标文件夹不能重复，否则结果取决于执行顺序
+        targets = [target_folder for _, _, target_folder in pairs]
+        duplicates = sorted({folder for folder in targets if targets.count(folder) > 1})
+        if duplicates:
+            self.show_message("showwarning", "警告", "以下目标文件夹被多次配对：\n" + "\n".join(duplicates))
+            return
+        
+        if not self.show_message(
+            "askyesno",
+            "确认",
+            f"确定要迁移以下 {len(pairs)} 对角色配置？\n\n" +
+            "\n".join(f"• {mark}：{source} → {target}" for mark, source, target in pairs[:20]) +
+            ("\n…" if len(pairs) > 20 else "") +
+            "\n\n此操作将覆盖目标文件夹的同名文件！"
+        ):
+            return
+        
+        self.start_button.configure(state="disabled")
+        self.status_label.configure(text="迁移中…")
+        self.future = run_in_background(self.run_pairs, pairs)
+        self.window.after(100, self.poll_migration)
+
+    def run_pairs(self, pairs):
+        """通过调度器执行所有配对"""
+        futures = [
+            (pair, schedule_migration(
+                os.path.join(self.source_base, pair[1]),
+                os.path.join(self.target_base, pair[2]),
+                self.selected_files
+            ))
+            for pair in pairs
+        ]
+        return [(pair, future.result()) for pair, future in futures]
+
+    def poll_migration(self):
+        """检查批量迁移是否完成"""
+        if not self.window.winfo_exists():
+            return
+        if not self.future.done():
+            self.window.after(100, self.poll_migration)
+            return
+        
+        self.start_button.configure(state="normal")
+        self.status_label.configure(text="")
+        try:
+            results = self.future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"迁移过程出错：{str(e)}")
+            return
+        
+        # 汇总报告
+        total_files = sum(count for _, (count, _, _) in results)
+        unchanged_files = sum(unchanged for _, (_, _, unchanged) in results)
+        failed = [(pair, errors) for pair, (_, errors, _) in results if errors]
+        lines = [f"迁移完成！共 {len(results)} 对，成功迁移 {total_files} 个配置文件，{unchanged_files} 个已是最新。"]
+        if failed:
+            lines.append(f"\n以下 {len(failed)} 对存在失败：")
+            for (mark, source_folder, target_folder), errors in failed[:10]:
+                lines.append(f"• {mark}：" + "，".join(f"{filename}（{error}）" for filename, error in errors))
+            if len(failed) > 10:
+                lines.append("…")
+        
+        # 只在成功迁移后保存选项配置
+        self.migration_window.save_options_config()
+        
+        self.window.lift()
+        self.show_message("showwarning" if failed else "showinfo", "批量迁移完成", "\n".join(lines))
+
+    def show_message(self, type_, title, message, **kwargs):
+        """显示消息框"""
+        # 播放提示音
+        self.window.bell()
+        
+        if type_ == "showinfo":
+            return messagebox.showinfo(title, message, parent=self.window, **kwargs)
+        elif type_ == "showwarning":
+            return messagebox.showwarning(title, message, parent=self.window, **kwargs)
+        elif type_ == "showerror":
+            return messagebox.showerror(title, message, parent=self.window, **kwargs)
+        elif type_ == "askyesno":
+            return messagebox.askyesno(title, message, parent=self.window, **kwargs)
+
+class PresetWindow:
+    def __init__(self, migration_window):
+        # 创建新窗口
+        self.migration_window = migration_window
+        self.window = ttk.Toplevel(migration_window.window)
+        self.window.title("配置预设")
+        self.window.transient(migration_window.window)
+        
+        # 目标为迁移窗口中选择的目标服务器
+        self.target_type = migration_window.target_var.get()
+        target_path = migration_window.international_path if self.target_type == "international" else migration_window.china_path
+        self.target_base = target_path.get()
+        self.target_marks = migration_window.international_marks if self.target_type == "international" else migration_window.china_marks
+        self.future = None
+        
+        # 设置窗口大小
+        window_width = 900
+        window_height = 550
+        x = migration_window.window.winfo_x() + (migration_window.window.winfo_width() - window_width) // 2
+        y = migration_window.window.winfo_y() + (migration_window.window.winfo_height() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        self.window.minsize(700, 400)
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 左侧预设列表
+        left_frame = ttk.LabelFrame(main_frame, text="预设", padding=5)
+        left_frame.pack(side="left", fill="both", expand=True, padx=(0, 5))
+        
+        self.preset_list = ttk.Treeview(left_frame, columns=("name", "files", "source"), show="headings", selectmode="browse")
+        self.preset_list.heading("name", text="名称")
+        self.preset_list.heading("files", text="文件")
+        self.preset_list.heading("source", text="来源")
+        self.preset_list.column("name", width=120)
+        self.preset_list.column("files", width=160)
+        self.preset_list.pack(fill="both", expand=True)
+        self.preset_list.bind("<<TreeviewSelect>>", lambda event: self.clear_preview())
+        
+        preset_buttons = ttk.Frame(left_frame)
+        preset_buttons.pack(fill="x", pady=(5, 0))
+        ttk.Button(preset_buttons, text="从源角色保存", command=self.save_from_source, width=12).pack(side="left", padx=2)
+        ttk.Button(preset_buttons, text="从快照保存", command=self.save_from_snapshot, width=12).pack(side="left", padx=2)
+        ttk.Button(preset_buttons, text="删除", style="danger.TButton", command=self.delete_preset, width=8).pack(side="right", padx=2)
+        
+        # 右侧目标角色和预览
+        right_frame = ttk.LabelFrame(main_frame, text="应用到（可多选）", padding=5)
+        right_frame.pack(side="left", fill="both", expand=True, padx=(5, 0))
+        
+        self.target_roster = RosterView(right_frame, columns=("played",), selectmode="extended")
+        self.target_list = self.target_roster.tree
+        self.target_list.configure(height=8)
+        self.target_list.bind("<<TreeviewSelect>>", lambda event: self.clear_preview())
+        
+        self.preview_list = ttk.Treeview(right_frame, columns=("folder", "file", "status"), show="headings", height=8)
+        self.preview_list.heading("folder", text="角色")
+        self.preview_list.heading("file", text="文件")
+        self.preview_list.heading("status", text="结果")
+        self.preview_list.column("status", width=80)
+        self.preview_list.pack(fill="both", expand=True, pady=(5, 0))
+        
+        target_buttons = ttk.Frame(right_frame)
+        target_buttons.pack(fill="x", pady=(5, 0))
+        ttk.Button(target_buttons, text="预览冲突", command=self.preview, width=10).pack(side="left", padx=2)
+        self.status_label = ttk.Label(target_buttons, text="")
+        self.status_label.pack(side="left", padx=10)
+        self.apply_button = ttk.Button(target_buttons, text="应用预设", style="success.TButton", command=self.apply, width=10)
+        self.apply_button.pack(side="right", padx=2)
+        
+        self.load_presets()
+        self.load_targets()
+
+    def load_presets(self):
+        """加载预设列表"""
+        sync_treeview(self.preset_list, [
+            (preset["name"], "", (preset["name"], "、".join(sorted(preset["files"])), preset["source"]))
+            for preset in preset_library.list()
+        ])
+
+    def load_targets(self):
+        """列出目标服务器的角色，先显示缓存的列表，再在后台重新扫描"""
+        self.show_targets(load_roster_cache()["rosters"].get(self.target_base, []))
+        future = run_in_background(scan_roster, self.target_base)
+        poll_future(self.window, future, self.on_targets_scanned)
+
+    def on_targets_scanned(self, future):
+        """后台扫描完成时的处理"""
+        try:
+            folders, _ = future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"扫描文件夹时出错：{str(e)}")
+            return
+        save_roster_cache(self.target_base, folders)
+        self.show_targets(folders)
+
+    def show_targets(self, folders):
+        """显示目标角色及最后游玩时间"""
+        self.target_roster.set_rows(folders, self.target_marks, roster_model.rows(self.target_base, folders))
+
+    def selected_preset(self):
+        """当前选择的预设名"""
+        selection = self.preset_list.selection()
+        return selection[0] if selection else None
+
+    def selected_files(self):
+        """迁移窗口中勾选的配置文件"""
+        return [filename for filename, var in self.migration_window.option_vars.items() if var.get()]
+
+    def ask_name(self, title, extra=None):
+        """输入预设名称，extra 可在对话框中添加其他控件，返回名称或 None"""
+        dialog = ttk.Toplevel(self.window)
+        dialog.title(title)
+        dialog.transient(self.window)
+        
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill="both", expand=True)
+        
+        if extra:
+            extra(frame)
+        ttk.Label(frame, text="预设名称：").pack(anchor="w")
+        name_var = ttk.StringVar(value=self.selected_preset() or "")
+        entry = ttk.Entry(frame, textvariable=name_var, width=40)
+        entry.pack(fill="x", pady=(0, 15))
+        entry.focus_set()
+        
+        result = {}
+        
+        def confirm():
+            name = name_var.get().strip()
+            if name:
+                result["name"] = name
+            dialog.destroy()
+        
+        ttk.Button(frame, text="确定", command=confirm, style="primary.TButton").pack()
+        
+        dialog.grab_set()
+        dialog.wait_window()
+        return result.get("name")
+
+    def confirm_replace(self, name):
+        """同名预设已存在时确认替换"""
+        if name not in {preset["name"] for preset in preset_library.list()}:
+            return True
+        return self.show_message("askyesno", "确认", f"预设“{name}”已存在，确定要替换？")
+
+    def save_from_source(self):
+        """从迁移窗口选择的源角色保存预设"""
+        selection = self.migration_window.left_listbox.selection()
+        files = self.selected_files()
+        if not selection or not files:
+            self.show_message("showwarning", "警告", "请先在迁移窗口选择源角色并勾选配置文件！")
+            return
+        source_type = self.migration_window.source_var.get()
+        source_path = self.migration_window.international_path if source_type == "international" else self.migration_window.china_path
+        folder = os.path.join(source_path.get(), selection[0])
+        
+        name = self.ask_name("从源角色保存")
+        if not name or not self.confirm_replace(name):
+            return
+        try:
+            count = preset_library.save_from_folder(name, folder, files)
+        except Exception as e:
+            self.show_message("showerror", "错误", f"保存预设出错：{str(e)}")
+            return
+        self.load_presets()
+        self.show_message("showinfo", "保存完成", f"已将 {count} 个配置文件保存为预设“{name}”。")
+
+    def save_from_snapshot(self):
+        """从撤销记录中的快照保存预设"""
+        files = self.selected_files()
+        snapshots = snapshot_store.list()
+        if not snapshots or not files:
+            self.show_message("showwarning", "警告", "没有可用的快照，或未在迁移窗口勾选配置文件！")
+            return
+        
+        # 快照和其中的角色文件夹
+        choices = {}
+        
+        def add_controls(frame):
+            ttk.Label(frame, text="快照：").pack(anchor="w")
+            snapshot_combo = ttk.Combobox(frame, state="readonly", width=50, values=[
+                f"{datetime.fromtimestamp(entry['time']).strftime('%Y-%m-%d %H:%M:%S')}  {entry['description']}"
+                for entry in snapshots
+            ])
+            snapshot_combo.pack(fill="x", pady=(0, 10))
+            ttk.Label(frame, text="角色文件夹：").pack(anchor="w")
+            folder_combo = ttk.Combobox(frame, state="readonly", width=50)
+            folder_combo.pack(fill="x", pady=(0, 10))
+            
+            def on_snapshot(event=None):
+                folders = sorted({os.path.dirname(target) for target in snapshot_store.targets(snapshots[snapshot_combo.current()]["id"])})
+                folder_combo.configure(values=folders)
+                folder_combo.set(folders[0] if folders else "")
+                choices["snapshot"] = snapshots[snapshot_combo.current()]["id"]
+            
+            snapshot_combo.bind("<<ComboboxSelected>>", on_snapshot)
+            folder_combo.bind("<<ComboboxSelected>>", lambda event: choices.update(folder=folder_combo.get()))
+            snapshot_combo.current(0)
+            on_snapshot()
+            choices["folder"] = folder_combo.get()
+        
+        name = self.ask_name("从快照保存", add_controls)
+        if not name or not choices.get("folder") or not self.confirm_replace(name):
+            return
+        try:
+            count = preset_library.save_from_snapshot(name, choices["snapshot"], choices["folder"], files)
+        except Exception as e:
+            self.show_message("showerror", "错误", f"保存预设出错：{str(e)}")
+            return
+        self.load_presets()
+        self.show_message("showinfo", "保存完成", f"已将快照中的 {count} 个配置文件保存为预设“{name}”。")
+
+    def delete_preset(self):
+        """删除所选预设"""
+        name = self.selected_preset()
+        if not name:
+            self.show_message("showwarning", "警告", "请先选择预设！")
+            return
+        if not self.show_message("askyesno", "确认删除", f"确定要删除预设“{name}”？"):
+            return
+        preset_library.delete(name)
+        self.load_presets()
+        self.clear_preview()
+
+    def clear_preview(self):
+        """预设或目标改变后清空预览"""
+        for item in self.preview_list.get_children():
+            self.preview_list.delete(item)
+        self.status_label.configure(text="")
+
+    def preview(self):
+        """预览所选预设应用到所选角色时的结果"""
+        name = self.selected_preset()
+        folders = list(self.target_list.selection())
+        if not name or not folders:
+            self.show_message("showwarning", "警告", "请先选择预设和目标角色！")
+            return None
+        try:
+            preview = preview_preset(name, self.target_base, folders)
+        except Exception as e:
+            self.show_message("showerror", "错误", f"预览出错：{str(e)}")
+            return None
+        
+        status_names = {"new": "新建", "same": "相同", "overwrite": "覆盖"}
+        self.clear_preview()
+        for folder, rows in preview.items():
+            mark = self.target_marks.get(folder)
+            for filename, status in rows:
+                self.preview_list.insert("", "end", values=(f"{mark} ({folder})" if mark else folder, filename, status_names[status]))
+        overwrite = sum(1 for rows in preview.values() for _, status in rows if status == "overwrite")
+        self.status_label.configure(text=f"{overwrite} 个文件将被覆盖")
+        return preview
+
+    def apply(self):
+        """把所选预设并发应用到所选角色"""
+        preview = self.preview()
+        if not preview:
+            return
+        name = self.selected_preset()
+        overwrite = sum(1 for rows in preview.values() for _, status in rows if status == "overwrite")
+        if not self.show_message(
+            "askyesno",
+            "确认",
+            f"确定要将预设“{name}”应用到 {len(preview)} 个角色？\n\n" +
+            (f"将覆盖 {overwrite} 个内容不同的文件，可以通过撤销还原。" if overwrite else "不会覆盖任何内容不同的文件。")
+        ):
+            return
+        
+        self.apply_button.configure(state="disabled")
+        self.status_label.configure(text="应用中…")
+        self.future = run_in_background(apply_preset, name, self.target_base, list(preview))
+        poll_future(self.window, self.future, self.on_apply_done)
+
+    def on_apply_done(self, future):
+        """应用预设完成时的处理"""
+        self.apply_button.configure(state="normal")
+        self.clear_preview()
+        try:
+            results = future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"应用预设出错：{str(e)}")
+            return
+        
+        copied = sum(result["copied"] for result in results.values())
+        unchanged = sum(result["unchanged"] for result in results.values())
+        failed = [(folder, result["errors"]) for folder, result in results.items() if result["errors"]]
+        lines = [f"应用完成！共 {len(results)} 个角色，写入 {copied} 个配置文件，{unchanged} 个已是最新。"]
+        if failed:
+            lines.append(f"\n以下 {len(failed)} 个角色存在失败：")
+            for folder, errors in failed[:10]:
+                lines.append(f"• {folder}：" + "，".join(f"{filename}（{error}）" for filename, error in errors))
+            if len(failed) > 10:
+                lines.append("…")
+        self.window.lift()
+        self.show_message("showwarning" if failed else "showinfo", "应用预设完成", "\n".join(lines))
+
+    def show_message(self, type_, title, message, **kwargs):
+        """显示消息框"""
+        # 播放提示音
+        self.window.bell()
+        
+        if type_ == "showinfo":
+            return messagebox.showinfo(title, message, parent=self.window, **kwargs)
+        elif type_ == "showwarning":
+            return messagebox.showwarning(title, message, parent=self.window, **kwargs)
+        elif type_ == "showerror":
+            return messagebox.showerror(title, message, parent=self.window, **kwargs)
+        elif type_ == "askyesno":
+            return messagebox.askyesno(title, message, parent=self.window, **kwargs)
+
 class CharacterBackupWindow:
-    def __init__(self, parent, international_path, china_path, backup_path):
+    def __init__(self, parent, international_path, china_path, backup_path, storage_config=None):
         # 创建新窗口
         self.window = ttk.Toplevel(parent)
         self.window.title("角色配置备份")
@@ -1009,10 +6514,12 @@ class CharacterBackupWindow:
         self.international_path = international_path
         self.china_path = china_path
         self.backup_path = backup_path
+        self.storage_config = storage_config
         
         # 初始化选择的文件夹和当前服务器
         self.selected_folder = None
         self.current_server = "international"  # 设置默认值
+        self.scan_generation = 0
         
         # 加载配置数据
         self.load_configs()
@@ -1021,25 +6528,10 @@ class CharacterBackupWindow:
         self.load_selection_state()
         
         # 定义配置文件列表
-        self.config_files = [
-            ("ACQ.DAT", "近期悄悄话人员列表"),
-            ("ADDON.DAT", "界面设置"),
-            ("COMMON.DAT", "角色设置"),
-            ("CONTROL0.DAT", "角色设置(鼠标模式)"),
-            ("CONTROL1.DAT", "角色设置(手柄模式)"),
-            ("GEARSET.DAT", "套装列表"),
-            ("GS.DAT", "九宫幻卡卡组"),
-            ("HOTBAR.DAT", "热键栏设置"),
-            ("ITEMFDR.DAT", "雇员物品顺序"),
-            ("ITEMODR.DAT", "物品栏、兵装库物品顺序"),
-            ("KEYBIND.DAT", "键位设置"),
-            ("LOGFLTR.DAT", "消息窗口设置"),
-            ("MACRO.DAT", "用户宏(该角色专用)"),
-            ("UISAVE.DAT", "UI使用记录")
-        ]
+        self.config_files = CONFIG_FILES
         
         # 设置窗口大小
-        window_width = 800
+        window_width = 900
         window_height = 500
         screen_width = self.window.winfo_screenwidth()
         screen_height = self.window.winfo_screenheight()
@@ -1048,7 +6540,7 @@ class CharacterBackupWindow:
         self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
         
         # 设置窗口最小大小
-        self.window.minsize(700, 400)
+        self.window.minsize(800, 400)
         
         # 设置样式
         style = ttk.Style()
@@ -1087,8 +6579,8 @@ class CharacterBackupWindow:
         list_frame = ttk.LabelFrame(main_frame, text="角色列表", padding=5)
         list_frame.pack(side="left", fill="both", expand=True, padx=(0, 5))
         
-        self.listbox = ttk.Treeview(list_frame, show="tree", selectmode="browse")
-        self.listbox.pack(fill="both", expand=True)
+        self.roster = RosterView(list_frame)
+        self.listbox = self.roster.tree
         
         # 创建右侧操作区域
         operation_frame = ttk.LabelFrame(main_frame, text="操作", padding=5)
@@ -1142,84 +6634,75 @@ class CharacterBackupWindow:
     def scan_folders(self):
         """扫描并显示文件夹"""
         # 保存当前选择
-        current_selection = None
         selected = self.listbox.selection()
         if selected:
-            current_selection = selected[0]
-            self.selected_folder = current_selection  # 更新 selected_folder
-        
-        # 清空列表
-        for item in self.listbox.get_children():
-            self.listbox.delete(item)
+            self.selected_folder = selected[0]  # 更新 selected_folder
         
         # 获取当前选择的服务器和对应的路径
         server_type = self.server_var.get()
         path_var = self.international_path if server_type == "international" else self.china_path
-        marks = self.international_marks if server_type == "international" else self.china_marks
         
         # 获取路径
         base_path = path_var.get()
         backup_base = self.backup_path.get()
         
+        # 丢弃之前未完成的扫描结果
+        self.scan_generation += 1
+        generation = self.scan_generation
+        
         if not base_path:
+            sync_treeview(self.listbox, [])
             messagebox.showwarning("警告", "请先在路径设置中设置对应的游戏路径！", parent=self.window)
             return
         
-        if not backup_base:
+        storage = create_backup_storage(self.storage_config, backup_base)
+        if storage is None:
+            sync_treeview(self.listbox, [])
             messagebox.showwarning("警告", "请先在路径设置中设置备份路径！", parent=self.window)
             return
         
+        # 先显示缓存的角色列表和备份状态，再在后台重新扫描
+        server_folder = get_server_folder(server_type)
+        backup_dir = storage.location(server_folder)
+        cache = load_roster_cache()
+        self.show_folders(base_path, cache["rosters"].get(base_path, []), cache["backups"].get(backup_dir, {}))
+        future = run_in_background(scan_roster, base_path, storage, server_folder)
+        poll_future(self.window, future, lambda f: self.on_scan_done(f, generation, base_path, backup_dir))
+
+    def on_scan_done(self, future, generation, base_path, backup_dir):
+        """后台扫描完成时的处理"""
+        if generation != self.scan_generation:
+            return
         try:
-            first_item = None
-            for item in os.listdir(base_path):
-                if "FFXIV_" in item and os.path.isdir(os.path.join(base_path, item)):
-                    # 检查是否有标记，如果有标记则显示"标记名 (文件夹名)"，否则直接显示文件夹名
-                    display_name = f"{marks.get(item)} ({item})" if item in marks else item
-                    
-                    # 检查是否有备份（使用汉字识服务器类型）
-                    server_folder = "国际服" if server_type == "international" else "国服"
-                    backup_path = os.path.join(backup_base, server_folder, item)
-                    has_backup = os.path.exists(backup_path)
-                    
-                    # 如果有备份，获取最新的修改时间
-                    backup_time = ""
-                    if has_backup:
-                        try:
-                            # 获取所有配置文件的最后修改时间
-                            backup_files = [f for f in os.listdir(backup_path) if f.endswith('.DAT')]
-                            if backup_files:
-                                file_times = [
-                                    os.path.getmtime(os.path.join(backup_path, f))
-                                    for f in backup_files
-                                ]
-                                latest_time = max(file_times)
-                                from datetime import datetime
-                                time_str = datetime.fromtimestamp(latest_time).strftime('%Y-%m-%d %H:%M:%S')
-                                backup_time = f" [{time_str}]"
-                        except Exception:
-                            backup_time = " [已备份]"
-                    else:
-                        backup_time = " [未备份]"
-                    
-                    # 在显示名称后添加备份状态
-                    display_name = f"{display_name}{backup_time}"
-                    
-                    self.listbox.insert("", "end", item, text=display_name)
-                    if first_item is None:
-                        first_item = item
-            
-            # 优先使用保存的选择
-            if self.selected_folder and self.selected_folder in os.listdir(base_path):
-                self.listbox.selection_set(self.selected_folder)
-            # 其次使用当前选择
-            elif current_selection and current_selection in os.listdir(base_path):
-                self.listbox.selection_set(current_selection)
-            # 最后才使用第一项
-            elif first_item:
-                self.listbox.selection_set(first_item)
-                
+            folders, backups = future.result()
         except Exception as e:
             messagebox.showerror("错误", f"扫描文件夹时出错：{str(e)}", parent=self.window)
+            return
+        save_roster_cache(base_path, folders, backup_dir, backups)
+        self.show_folders(base_path, folders, backups)
+
+    def show_folders(self, base_path, folders, backups):
+        """显示文件夹列表及最后游玩时间、配置大小和备份状态"""
+        server_type = self.server_var.get()
+        marks = self.international_marks if server_type == "international" else self.china_marks
+        self.roster.set_rows(folders, marks, roster_model.rows(base_path, folders, backups))
+        
+        # 优先保持当前选择，其次使用保存的选择，最后才使用第一项
+        if self.listbox.selection():
+            return
+        if self.selected_folder and self.listbox.exists(self.selected_folder):
+            self.listbox.selection_set(self.selected_folder)
+        elif self.listbox.get_children():
+            self.listbox.selection_set(self.listbox.get_children()[0])
+
+    def set_buttons_state(self, state):
+        """设置操作按钮状态"""
+        self.backup_button.configure(state=state)
+        self.restore_button.configure(state=state)
+
+    def get_storage(self):
+        """获取当前的备份存储，未设置时返回 None"""
+        return create_backup_storage(self.storage_config, self.backup_path.get())
 
     def backup_config(self):
         """备份配置"""
@@ -1232,9 +6715,9 @@ class CharacterBackupWindow:
         # 获取当前服务器类型和路径
         server_type = self.server_var.get()
         source_path = self.international_path if server_type == "international" else self.china_path
-        backup_base = self.backup_path.get()
+        storage = self.get_storage()
         
-        if not backup_base:
+        if storage is None:
             self.show_message("warning", "警告", "请先设置备份路径！")
             return
         
@@ -1243,10 +6726,9 @@ class CharacterBackupWindow:
         folder_name = folder_id  # 使用原始文件夹名
         source_folder = os.path.join(source_path.get(), folder_name)
         
-        # 建备份目录（使用汉字标识服务器类型）
-        server_folder = "国际服" if server_type == "international" else "国服"
-        backup_folder = os.path.normpath(os.path.join(backup_base, server_folder, folder_name))
-        os.makedirs(backup_folder, exist_ok=True)
+        # 备份位置（使用汉字标识服务器类型）
+        backup_prefix = f"{get_server_folder(server_type)}/{folder_name}"
+        backup_folder = storage.location(backup_prefix)
         
         # 确认备份操作
         if not self.show_message(
@@ -1258,20 +6740,18 @@ class CharacterBackupWindow:
         ):
             return
         
+        # 通过调度器执行备份，完成后显示结果
+        self.set_buttons_state("disabled")
+        future = schedule_backup(storage, source_path.get(), server_type, folder_name, priority=PRIORITY_HIGH)
+        poll_future(self.window, future, lambda f: self.on_backup_done(f, folder_id, backup_folder))
+
+    def on_backup_done(self, future, folder_id, backup_folder):
+        """备份完成时的处理"""
+        self.set_buttons_state("normal")
         try:
-            # 执行备份
-            success_count = 0
-            for config_file, description in self.config_files:
-                source_file = os.path.normpath(os.path.join(source_folder, config_file))
-                target_file = os.path.normpath(os.path.join(backup_folder, config_file))
-                
-                if os.path.exists(source_file):
-                    try:
-                        import shutil
-                        shutil.copy2(source_file, target_file)
-                        success_count += 1
-                    except Exception as e:
-                        self.show_message("error", "错误", f"备份文件失败：{config_file}\n{str(e)}")
+            success_count, errors, _ = future.result()
+            for config_file, error in errors:
+                self.show_message("error", "错误", f"备份文件失败：{config_file}\n{error}")
             
             # 显示备份结果
             if success_count > 0:
@@ -1313,22 +6793,37 @@ class CharacterBackupWindow:
         # 获取当前服务器类型和路径
         server_type = self.server_var.get()
         target_path = self.international_path if server_type == "international" else self.china_path
-        backup_base = self.backup_path.get()
+        storage = self.get_storage()
         
-        if not backup_base:
+        if storage is None:
             self.show_message("warning", "警告", "请先设置备份路径！")
             return
         
         # 获取选中的文件夹
         folder_id = selected[0]
         folder_name = folder_id  # 使用原始文件夹名
-        target_folder = os.path.join(target_path.get(), folder_name)
-        
-        # 检查备份是否存在
-        server_folder = "国际服" if server_type == "international" else "国服"
-        backup_folder = os.path.normpath(os.path.join(backup_base, server_folder, folder_name))
+        target_base = target_path.get()
+        target_folder = os.path.join(target_base, folder_name)
+        
+        # 在后台列出备份，远程存储的请求不阻塞界面
+        backup_prefix = f"{get_server_folder(server_type)}/{folder_name}"
+        self.set_buttons_state("disabled")
+        future = run_in_background(storage.list_files, backup_prefix)
+        poll_future(self.window, future, lambda f: self.on_backup_listed(
+            f, storage, server_type, folder_name, target_base, target_folder
+        ))
+
+    def on_backup_listed(self, future, storage, server_type, folder_name, target_base, target_folder):
+        """列出备份后确认并开始恢复"""
+        self.set_buttons_state("normal")
+        backup_folder = storage.location(f"{get_server_folder(server_type)}/{folder_name}")
+        try:
+            backup_files = future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"读取备份失败：\n{str(e)}")
+            return
         
-        if not os.path.exists(backup_folder):
+        if not backup_files:
             self.show_message("warning", "警告", f"未找到该角色的备份：\n{backup_folder}")
             return
         
@@ -1343,27 +6838,28 @@ class CharacterBackupWindow:
         ):
             return
         
+        # 通过调度器执行恢复，完成后显示结果
+        self.set_buttons_state("disabled")
+        future = schedule_restore(
+            storage, target_base, server_type, folder_name, backup_files=backup_files, priority=PRIORITY_HIGH,
+            verify=self.storage_config.get("verify_restore", False)
+        )
+        poll_future(self.window, future, lambda f: self.on_restore_done(f, target_folder))
+
+    def on_restore_done(self, future, target_folder):
+        """恢复完成时的处理"""
+        self.set_buttons_state("normal")
         try:
-            # 执行恢复
-            success_count = 0
-            for config_file, description in self.config_files:
-                backup_file = os.path.normpath(os.path.join(backup_folder, config_file))
-                target_file = os.path.normpath(os.path.join(target_folder, config_file))
-                
-                if os.path.exists(backup_file):
-                    try:
-                        import shutil
-                        shutil.copy2(backup_file, target_file)
-                        success_count += 1
-                    except Exception as e:
-                        self.show_message("error", "错误", f"恢复文件失败：{config_file}\n{str(e)}")
+            success_count, errors, unchanged_count = future.result()
+            for config_file, error in errors:
+                self.show_message("error", "错误", f"恢复文件失败：{config_file}\n{error}")
             
             # 显示恢复结果
-            if success_count > 0:
+            if success_count + unchanged_count > 0:
                 self.window.lift()
                 messagebox.showinfo(
                     "恢复完成",
-                    f"成功恢复 {success_count} 个配置文件到：\n{self.format_path(target_folder)}",
+                    f"成功恢复 {success_count} 个配置文件，{unchanged_count} 个已是最新：\n{self.format_path(target_folder)}",
                     parent=self.window
                 )
             else:
@@ -1394,14 +6890,9 @@ class CharacterBackupWindow:
 
     def load_selection_state(self):
         """加载选择状态"""
-        try:
-            with open(os.path.normpath(os.path.join("data", "backup_state.json")), 'r', encoding='utf-8') as f:
-                state = json.load(f)
-                self.current_server = state.get("server", "international")
-                self.selected_folder = state.get("folder", None)
-        except FileNotFoundError:
-            self.current_server = "international"
-            self.selected_folder = None
+        state = settings_writer.load(os.path.normpath(os.path.join("data", "backup_state.json")), {})
+        self.current_server = state.get("server", "international")
+        self.selected_folder = state.get("folder", None)
 
     def save_selection_state(self):
         """保存选择状态"""
@@ -1409,8 +6900,7 @@ class CharacterBackupWindow:
             "server": self.server_var.get(),
             "folder": self.selected_folder
         }
-        with open(os.path.normpath(os.path.join("data", "backup_state.json")), 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        settings_writer.save(os.path.normpath(os.path.join("data", "backup_state.json")), state)
 
     def on_closing(self):
         """窗口关闭时的处理"""
@@ -1424,6 +6914,639 @@ class CharacterBackupWindow:
         """格式化路径用于显示"""
         return path.replace(os.sep, '/')
 
+class UndoWindow:
+    def __init__(self, parent):
+        # 创建新窗口
+        self.window = ttk.Toplevel(parent)
+        self.window.title("撤销恢复与迁移")
+        self.window.transient(parent)
+        
+        # 设置窗口大小
+        window_width = 600
+        window_height = 400
+        x = (self.window.winfo_screenwidth() - window_width) // 2
+        y = (self.window.winfo_screenheight() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        self.window.minsize(500, 300)
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 创建操作列表（最新的在前）
+        list_frame = ttk.LabelFrame(main_frame, text="最近的覆盖操作", padding=5)
+        list_frame.pack(fill="both", expand=True)
+        
+        self.listbox = ttk.Treeview(
+            list_frame,
+            columns=("time", "description", "count"),
+            show="headings",
+            selectmode="browse"
+        )
+        self.listbox.heading("time", text="时间")
+        self.listbox.heading("description", text="操作")
+        self.listbox.heading("count", text="文件数")
+        self.listbox.column("time", width=150)
+        self.listbox.column("count", width=60)
+        self.listbox.pack(fill="both", expand=True)
+        
+        # 创建按钮区域
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill="x", pady=(10, 0))
+        
+        ttk.Label(btn_frame, text="撤销所选操作及其之后的所有操作").pack(side="left")
+        
+        self.undo_button = ttk.Button(
+            btn_frame,
+            text="撤销",
+            style="warning.TButton",
+            command=self.undo,
+            width=10
+        )
+        self.undo_button.pack(side="right")
+        
+        self.load_operations()
+
+    def load_operations(self):
+        """加载可撤销的操作"""
+        sync_treeview(self.listbox, [
+            (
+                entry["id"],
+                "",
+                (
+                    datetime.fromtimestamp(entry["time"]).strftime('%Y-%m-%d %H:%M:%S'),
+                    entry["description"],
+                    entry["count"]
+                )
+            )
+            for entry in snapshot_store.list()
+        ])
+
+    def undo(self):
+        """撤销所选操作及其之后的所有操作"""
+        selected = self.listbox.selection()
+        if not selected:
+            self.show_message("showwarning", "警告", "请先选择要撤销的操作！")
+            return
+        count = self.listbox.index(selected[0]) + 1
+        
+        if not self.show_message(
+            "askyesno",
+            "确认撤销",
+            f"确定要撤销最近的 {count} 次操作？\n\n被覆盖的文件将还原为操作前的内容。"
+        ):
+            return
+        
+        self.undo_button.configure(state="disabled")
+        poll_future(self.window, schedule_undo(count), self.on_undo_done)
+
+    def on_undo_done(self, future):
+        """撤销完成时的处理"""
+        self.undo_button.configure(state="normal")
+        self.load_operations()
+        try:
+            restored = future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"撤销过程出错：{str(e)}")
+            return
+        self.show_message("showinfo", "撤销完成", f"已还原 {restored} 个文件。")
+
+    def show_message(self, type_, title, message, **kwargs):
+        """显示消息框"""
+        # 播放提示音
+        self.window.bell()
+        
+        if type_ == "showinfo":
+            return messagebox.showinfo(title, message, parent=self.window, **kwargs)
+        elif type_ == "showwarning":
+            return messagebox.showwarning(title, message, parent=self.window, **kwargs)
+        elif type_ == "showerror":
+            return messagebox.showerror(title, message, parent=self.window, **kwargs)
+        elif type_ == "askyesno":
+            return messagebox.askyesno(title, message, parent=self.window, **kwargs)
+
+class IntegrityReportWindow:
+    def __init__(self, parent, checked, problems):
+        # 创建新窗口
+        self.window = ttk.Toplevel(parent)
+        self.window.title("完整性检查结果")
+        
+        # 设置窗口大小
+        window_width = 900
+        window_height = 450
+        x = (self.window.winfo_screenwidth() - window_width) // 2
+        y = (self.window.winfo_screenheight() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        bad_backups = sum(1 for problem in problems if problem["location"] == "backup" and problem["status"] == "bad")
+        summary = f"已检查 {checked} 个文件，发现 {len(problems)} 个问题"
+        if bad_backups:
+            summary += f"，其中 {bad_backups} 个备份文件恢复后会写入损坏的数据"
+        ttk.Label(main_frame, text=summary).pack(anchor="w", pady=(0, 10))
+        
+        # 创建问题列表
+        listbox = ttk.Treeview(
+            main_frame,
+            columns=("status", "location", "folder", "file", "message"),
+            show="headings"
+        )
+        for column, text, width in [
+            ("status", "状态", 60),
+            ("location", "位置", 100),
+            ("folder", "角色", 200),
+            ("file", "文件", 100),
+            ("message", "说明", 400)
+        ]:
+            listbox.heading(column, text=text)
+            listbox.column(column, width=width)
+        listbox.pack(fill="both", expand=True)
+        
+        server_names = {"international": "国际服", "china": "国服"}
+        for problem in problems:
+            location = f"{server_names[problem['server']]}{'备份' if problem['location'] == 'backup' else ''}"
+            listbox.insert("", "end", values=(
+                "损坏" if problem["status"] == "bad" else "可疑",
+                location,
+                problem["folder"],
+                problem["file"],
+                problem["message"]
+            ))
+
+class SimilarityWindow:
+    def __init__(self, parent, config):
+        # 创建新窗口
+        self.window = ttk.Toplevel(parent)
+        self.window.title("相似度分析")
+        
+        # 保存参数
+        self.config = config
+        self.index = None
+        self.labels = {}
+        
+        # 设置窗口大小
+        window_width = 1000
+        window_height = 550
+        x = (self.window.winfo_screenwidth() - window_width) // 2
+        y = (self.window.winfo_screenheight() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 比较内容和阈值
+        option_frame = ttk.Frame(main_frame)
+        option_frame.pack(fill="x", pady=(0, 10))
+        ttk.Label(option_frame, text="比较内容：").pack(side="left")
+        self.file_choices = {"全部配置": None}
+        for config_file, description in CONFIG_FILES:
+            self.file_choices[f"{description} ({config_file})"] = [config_file]
+        self.file_var = ttk.StringVar(value="全部配置")
+        ttk.Combobox(
+            option_frame,
+            textvariable=self.file_var,
+            values=list(self.file_choices),
+            state="readonly",
+            width=30
+        ).pack(side="left", padx=5)
+        ttk.Label(option_frame, text="分组阈值：").pack(side="left", padx=(10, 0))
+        self.threshold_var = ttk.StringVar(value="0.8")
+        ttk.Spinbox(
+            option_frame,
+            textvariable=self.threshold_var,
+            from_=0.5,
+            to=1.0,
+            increment=0.05,
+            width=6
+        ).pack(side="left", padx=5)
+        self.analyze_button = ttk.Button(
+            option_frame,
+            text="分析",
+            style="primary.TButton",
+            command=self.analyze
+        )
+        self.analyze_button.pack(side="left", padx=5)
+        self.status_label = ttk.Label(option_frame, text="")
+        self.status_label.pack(side="left", padx=10)
+        
+        # 左侧为分组，右侧为所选角色的相似角色
+        content_frame = ttk.Frame(main_frame)
+        content_frame.pack(fill="both", expand=True)
+        
+        self.cluster_tree = ttk.Treeview(content_frame, columns=("count",), show="tree headings")
+        self.cluster_tree.heading("#0", text="分组")
+        self.cluster_tree.heading("count", text="角色数")
+        self.cluster_tree.column("#0", width=400)
+        self.cluster_tree.column("count", width=80)
+        self.cluster_tree.pack(side="left", fill="both", expand=True)
+        self.cluster_tree.bind("<<TreeviewSelect>>", self.on_select)
+        
+        self.similar_tree = ttk.Treeview(content_frame, columns=("character", "similarity"), show="headings")
+        self.similar_tree.heading("character", text="相似角色")
+        self.similar_tree.heading("similarity", text="相似度")
+        self.similar_tree.column("character", width=320)
+        self.similar_tree.column("similarity", width=80)
+        self.similar_tree.pack(side="left", fill="both", expand=True, padx=(10, 0))
+        
+        self.analyze()
+
+    def analyze(self):
+        """在后台建立相似度索引"""
+        try:
+            threshold = float(self.threshold_var.get())
+        except ValueError:
+            threshold = 0.8
+        reads = [path for path in (self.config["international_path"], self.config["china_path"]) if path]
+        self.analyze_button.configure(state="disabled")
+        self.status_label.configure(text="正在分析…")
+        future = scheduler.submit(
+            analyze_similarity, dict(self.config), self.file_choices[self.file_var.get()], threshold,
+            priority=PRIORITY_LOW, reads=reads
+        )
+        poll_future(self.window, future, self.on_analyze_done)
+
+    def on_analyze_done(self, future):
+        """分析完成时显示分组"""
+        self.analyze_button.configure(state="normal")
+        try:
+            self.index, clusters, self.labels = future.result()
+        except Exception as e:
+            self.status_label.configure(text="")
+            messagebox.showerror("错误", f"相似度分析出错：{str(e)}", parent=self.window)
+            return
+        
+        self.cluster_tree.delete(*self.cluster_tree.get_children())
+        self.similar_tree.delete(*self.similar_tree.get_children())
+        grouped = set()
+        for number, cluster in enumerate(clusters, 1):
+            group_id = self.cluster_tree.insert("", "end", text=f"分组 {number}", values=(len(cluster),))
+            for name in cluster:
+                self.cluster_tree.insert(group_id, "end", iid=name, text=self.labels[name])
+            grouped.update(cluster)
+        
+        # 未与其他角色归为一组的角色单独列出，同样可以查询相似角色
+        others = sorted(name for name in self.index.signatures if name not in grouped)
+        if others:
+            group_id = self.cluster_tree.insert("", "end", text="未分组", values=(len(others),))
+            for name in others:
+                self.cluster_tree.insert(group_id, "end", iid=name, text=self.labels[name])
+        self.status_label.configure(text=f"共 {len(self.index.signatures)} 个角色，{len(clusters)} 个分组")
+
+    def on_select(self, event):
+        """显示所选角色的相似角色"""
+        selection = self.cluster_tree.selection()
+        if not selection or self.index is None or selection[0] not in self.index.signatures:
+            return
+        self.similar_tree.delete(*self.similar_tree.get_children())
+        for name, similarity in self.index.most_similar(selection[0]):
+            self.similar_tree.insert("", "end", values=(self.labels[name], f"{similarity:.0%}"))
+
+class ArchiveWindow:
+    def __init__(self, parent, config, storage):
+        # 创建新窗口
+        self.window = ttk.Toplevel(parent)
+        self.window.title(f"备份包 - {os.path.basename(storage.location())}")
+        self.window.transient(parent)
+        
+        # 保存参数
+        self.config = config
+        self.storage = storage
+        
+        # 设置窗口大小
+        window_width = 700
+        window_height = 500
+        x = (self.window.winfo_screenwidth() - window_width) // 2
+        y = (self.window.winfo_screenheight() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        self.window.minsize(500, 300)
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 角色和文件列表，展开角色时才读取其文件条目
+        list_frame = ttk.LabelFrame(main_frame, text="备份包内容", padding=5)
+        list_frame.pack(fill="both", expand=True)
+        
+        self.tree = ttk.Treeview(list_frame, columns=("size", "time"), selectmode="extended")
+        self.tree.heading("#0", text="角色 / 文件")
+        self.tree.heading("size", text="大小")
+        self.tree.heading("time", text="修改时间")
+        self.tree.column("size", width=100, anchor="e")
+        self.tree.column("time", width=150)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+        
+        # 创建按钮区域
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill="x", pady=(10, 0))
+        
+        ttk.Label(btn_frame, text="可选择整个角色或单个文件").pack(side="left")
+        
+        self.restore_button = ttk.Button(
+            btn_frame,
+            text="恢复所选",
+            style="warning.TButton",
+            command=self.restore,
+            width=10
+        )
+        self.restore_button.pack(side="right")
+        
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.load_characters()
+
+    def load_characters(self):
+        """列出备份包中的角色"""
+        server_names = {"international": "国际服", "china": "国服"}
+        for server_type, server_name in server_names.items():
+            server_folder = get_server_folder(server_type)
+            folders = {}
+            for key, mtime in self.storage.list_files(server_folder).items():
+                folder = key.split("/")[1]
+                folders[folder] = max(folders.get(folder, 0), mtime)
+            if not folders:
+                continue
+            server_node = self.tree.insert("", "end", iid=server_type, text=server_name, open=True)
+            marks = load_marks(server_type)
+            for folder in sorted(folders):
+                text = f"{marks[folder]} ({folder})" if marks.get(folder) else folder
+                node = self.tree.insert(
+                    server_node, "end", iid=f"{server_type}/{folder}", text=text,
+                    values=("", datetime.fromtimestamp(folders[folder]).strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                # 占位子项，展开时替换为文件列表
+                self.tree.insert(node, "end", text="")
+
+    def on_open(self, event):
+        """展开角色时读取其文件条目"""
+        node = self.tree.focus()
+        if node.count("/") != 1:
+            return
+        children = self.tree.get_children(node)
+        if len(children) != 1 or self.tree.item(children[0], "text"):
+            return
+        self.tree.delete(children[0])
+        server_type, folder = node.split("/")
+        for entry in self.storage.archive.entries(f"{get_server_folder(server_type)}/{folder}/"):
+            config_file = entry["key"].rsplit("/", 1)[1]
+            self.tree.insert(node, "end", iid=f"{node}/{config_file}", text=config_file, values=(
+                f"{entry['size']:,}",
+                datetime.fromtimestamp(entry["mtime"]).strftime('%Y-%m-%d %H:%M:%S')
+            ))
+
+    def restore(self):
+        """恢复所选角色或文件"""
+        selection = {}
+        for node in self.tree.selection():
+            parts = node.split("/")
+            if len(parts) == 1:
+                for child in self.tree.get_children(node):
+                    selection.setdefault(parts[0], {})[child.split("/")[1]] = None
+            elif len(parts) == 2:
+                selection.setdefault(parts[0], {})[parts[1]] = None
+            else:
+                files = selection.setdefault(parts[0], {}).setdefault(parts[1], [])
+                if files is not None:
+                    files.append(parts[2])
+        if not selection:
+            self.show_message("showwarning", "警告", "请先选择要恢复的角色或文件！")
+            return
+        
+        count = sum(len(folders) for folders in selection.values())
+        if not self.show_message(
+            "askyesno",
+            "确认恢复",
+            f"确定要从备份包恢复 {count} 个角色的配置？\n\n被覆盖的文件可以通过撤销还原。"
+        ):
+            return
+        
+        self.restore_button.configure(state="disabled")
+        future = run_in_background(restore_from_archive, dict(self.config), self.storage, selection)
+        poll_future(self.window, future, self.on_restore_done)
+
+    def on_restore_done(self, future):
+        """恢复完成时的处理"""
+        self.restore_button.configure(state="normal")
+        try:
+            results = future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"恢复过程出错：{str(e)}")
+            return
+        copied = sum(result["copied"] for result in results.values())
+        unchanged = sum(result["unchanged"] for result in results.values())
+        errors = [
+            f"{folder}/{filename}：{error}" if filename else f"{folder}：{error}"
+            for folder, result in results.items()
+            for filename, error in result["errors"]
+        ]
+        message = f"已恢复 {copied} 个文件，{unchanged} 个已是最新。"
+        if errors:
+            self.show_message("showwarning", "部分失败", message + "\n\n以下文件恢复失败：\n" + "\n".join(errors))
+        else:
+            self.show_message("showinfo", "恢复完成", message)
+
+    def on_closing(self):
+        """关闭窗口时关闭备份包，恢复进行中时不关闭"""
+        if str(self.restore_button.cget("state")) == "disabled":
+            self.show_message("showwarning", "警告", "正在从备份包恢复，请等待完成后再关闭。")
+            return
+        self.window.destroy()
+        self.storage.close()
+
+    def show_message(self, type_, title, message, **kwargs):
+        """显示消息框"""
+        # 播放提示音
+        self.window.bell()
+        
+        if type_ == "showinfo":
+            return messagebox.showinfo(title, message, parent=self.window, **kwargs)
+        elif type_ == "showwarning":
+            return messagebox.showwarning(title, message, parent=self.window, **kwargs)
+        elif type_ == "showerror":
+            return messagebox.showerror(title, message, parent=self.window, **kwargs)
+        elif type_ == "askyesno":
+            return messagebox.askyesno(title, message, parent=self.window, **kwargs)
+
+class SyncWindow:
+    def __init__(self, parent, backup_path, sync_config, save_config):
+        # 创建新窗口
+        self.window = ttk.Toplevel(parent)
+        self.window.title("局域网同步")
+        
+        # 保存参数
+        self.backup_path = backup_path
+        self.sync_config = sync_config
+        self.save_config = save_config
+        self.server = None
+        self.future = None
+        
+        # 设置窗口大小
+        window_width = 500
+        window_height = 370
+        x = (self.window.winfo_screenwidth() - window_width) // 2
+        y = (self.window.winfo_screenheight() - window_height) // 2
+        self.window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        
+        # 创建主框架
+        main_frame = ttk.Frame(self.window, padding=10)
+        main_frame.pack(fill="both", expand=True)
+        
+        # 共享令牌（两端需一致）
+        token_frame = ttk.Frame(main_frame)
+        token_frame.pack(fill="x", pady=(0, 10))
+        ttk.Label(token_frame, text="同步令牌：", width=10).pack(side="left")
+        self.token_var = ttk.StringVar(value=sync_config.get("token", ""))
+        ttk.Entry(token_frame, textvariable=self.token_var, show="*").pack(side="left", fill="x", expand=True)
+        
+        # 本机服务区域
+        server_frame = ttk.LabelFrame(main_frame, text="本机服务", padding=5)
+        server_frame.pack(fill="x", pady=(0, 10))
+        
+        port_frame = ttk.Frame(server_frame)
+        port_frame.pack(fill="x")
+        ttk.Label(port_frame, text="端口：", width=10).pack(side="left")
+        self.port_var = ttk.StringVar(value=str(sync_config.get("port", 8765)))
+        ttk.Entry(port_frame, textvariable=self.port_var, width=8).pack(side="left")
+        self.server_button = ttk.Button(
+            port_frame,
+            text="启动服务",
+            style="primary.TButton",
+            command=self.toggle_server
+        )
+        self.server_button.pack(side="right")
+        
+        self.server_label = ttk.Label(server_frame, text="服务未启动")
+        self.server_label.pack(anchor="w", pady=(5, 0))
+        ttk.Label(
+            server_frame,
+            text="请求用令牌签名，令牌不在网络上传输；但同步内容未加密，请只在可信的局域网中使用。",
+            style="secondary.TLabel",
+            wraplength=460
+        ).pack(anchor="w", pady=(5, 0))
+        
+        # 对端同步区域
+        peer_frame = ttk.LabelFrame(main_frame, text="与对端同步", padding=5)
+        peer_frame.pack(fill="x")
+        
+        address_frame = ttk.Frame(peer_frame)
+        address_frame.pack(fill="x")
+        ttk.Label(address_frame, text="对端地址：", width=10).pack(side="left")
+        self.peer_var = ttk.StringVar(value=sync_config.get("peer", ""))
+        ttk.Entry(address_frame, textvariable=self.peer_var).pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.sync_button = ttk.Button(
+            address_frame,
+            text="开始同步",
+            style="success.TButton",
+            command=self.start_sync
+        )
+        self.sync_button.pack(side="right")
+        
+        self.sync_label = ttk.Label(peer_frame, text="地址格式：192.168.1.10:8765")
+        self.sync_label.pack(anchor="w", pady=(5, 0))
+        
+        # 在窗口关闭时停止服务
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def save_settings(self):
+        """保存同步设置"""
+        self.sync_config.update({
+            "token": self.token_var.get(),
+            "port": self.port_var.get(),
+            "peer": self.peer_var.get().strip()
+        })
+        self.save_config()
+
+    def toggle_server(self):
+        """启动或停止本机服务"""
+        if self.server:
+            self.server.stop()
+            self.server = None
+            self.server_button.configure(text="启动服务")
+            self.server_label.configure(text="服务未启动")
+            return
+        
+        backup_base = self.backup_path.get()
+        if not backup_base:
+            self.show_message("showwarning", "警告", "请先在路径设置中设置备份路径！")
+            return
+        if not self.token_var.get().strip():
+            self.show_message("showwarning", "警告", "请先设置同步令牌！局域网中的其他设备需要相同的令牌才能访问。")
+            return
+        
+        try:
+            self.server = SyncServer(backup_base, int(self.port_var.get()), self.token_var.get())
+        except Exception as e:
+            self.show_message("showerror", "错误", f"启动服务失败：{str(e)}")
+            return
+        
+        self.save_settings()
+        self.server_button.configure(text="停止服务")
+        self.server_label.configure(text=f"服务已启动，端口 {self.server.port}")
+
+    def start_sync(self):
+        """在后台与对端同步"""
+        backup_base = self.backup_path.get()
+        peer = self.peer_var.get().strip()
+        if not backup_base:
+            self.show_message("showwarning", "警告", "请先在路径设置中设置备份路径！")
+            return
+        if not peer:
+            self.show_message("showwarning", "警告", "请输入对端地址！")
+            return
+        
+        self.save_settings()
+        self.sync_button.configure(state="disabled")
+        self.sync_label.configure(text="同步中…")
+        self.future = scheduler.submit(
+            sync_with_peer, backup_base, peer, self.token_var.get(),
+            priority=PRIORITY_LOW,
+            writes=[backup_base]
+        )
+        poll_future(self.window, self.future, self.on_sync_done)
+
+    def on_sync_done(self, future):
+        """同步完成时的处理"""
+        self.sync_button.configure(state="normal")
+        self.sync_label.configure(text="")
+        try:
+            result = future.result()
+        except Exception as e:
+            self.show_message("showerror", "错误", f"同步过程出错：{str(e)}")
+            return
+        
+        lines = [f"同步完成！拉取 {result['pulled']} 个文件，推送 {result['pushed']} 个文件。"]
+        if result["errors"]:
+            lines.append(f"\n以下 {len(result['errors'])} 个文件失败：")
+            lines.extend(f"• {key}（{error}）" for key, error in result["errors"][:10])
+        self.show_message("showwarning" if result["errors"] else "showinfo", "同步完成", "\n".join(lines))
+
+    def show_message(self, type_, title, message, **kwargs):
+        """显示消息框"""
+        # 播放提示音
+        self.window.bell()
+        
+        if type_ == "showinfo":
+            return messagebox.showinfo(title, message, parent=self.window, **kwargs)
+        elif type_ == "showwarning":
+            return messagebox.showwarning(title, message, parent=self.window, **kwargs)
+        elif type_ == "showerror":
+            return messagebox.showerror(title, message, parent=self.window, **kwargs)
+        elif type_ == "askyesno":
+            return messagebox.askyesno(title, message, parent=self.window, **kwargs)
+
+    def on_closing(self):
+        """窗口关闭时的处理"""
+        if self.server:
+            self.server.stop()
+        self.window.destroy()
+
 class SoftwareBackupWindow:
     def __init__(self, parent, international_path, china_path, backup_path):
         # 创建新窗口
@@ -1455,6 +7578,37 @@ class SoftwareBackupWindow:
         # TODO: 添加软件配置备份界面的具体实现
 
 if __name__ == "__main__":
+    # 打包后的程序需要支持进程池
+    multiprocessing.freeze_support()
+    
+    # 命令行基准测试：--benchmark [目录]，输出各落盘保障级别和复制方式的耗时
+    if "--benchmark" in sys.argv:
+        arguments = sys.argv[sys.argv.index("--benchmark") + 1:]
+        with tempfile.TemporaryDirectory(dir=arguments[0] if arguments else None) as directory:
+            print(f"{'级别':<8}{'耗时(秒)':>12}{'文件/秒':>12}")
+            for level, elapsed, rate in benchmark_durability(directory):
+                print(f"{level:<8}{elapsed:>12.3f}{rate:>12.1f}")
+            print()
+            print(f"{'复制方式':<8}{'耗时(秒)':>12}{'文件/秒':>12}")
+            for method, elapsed, rate in benchmark_copy(directory):
+                print(f"{method:<8}{elapsed:>12.3f}{rate:>12.1f}")
+        sys.exit(0)
+    
+    # 命令行校验备份：--verify，使用程序文件夹下 data/config.json 中的备份设置
+    if "--verify" in sys.argv:
+        # 数据文件夹按相对路径访问，先切换到程序文件夹，使结果与工作目录无关
+        os.chdir(get_program_dir())
+        try:
+            with open(get_config_file(), 'r', encoding='utf-8') as f:
+                checked, unverified, problems = verify_backups(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"校验备份出错：{str(e)}")
+            sys.exit(2)
+        for problem in problems:
+            print(f"{get_server_folder(problem['server'])}/{problem['folder']}/{problem['file']}：{problem['message']}")
+        print(f"已校验 {checked} 个文件，{len(problems)} 个问题，{unverified} 个没有校验记录")
+        sys.exit(1 if problems else 0)
+    
     # 设置 DPI 感知
     set_dpi_awareness()
     
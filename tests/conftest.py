@@ -0,0 +1,27 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# 主程序文件名不是合法的模块名，按路径加载
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "3.py")
+
+
+def load_app():
+    """加载主程序模块，只加载一次"""
+    if "ccmt_app" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("ccmt_app", APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["ccmt_app"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["ccmt_app"]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """主程序模块，data 文件夹位于临时目录中"""
+    monkeypatch.chdir(tmp_path)
+    module = load_app()
+    monkeypatch.setattr(module.EncryptedStorage, "session_passphrase", "")
+    return module
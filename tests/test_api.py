@@ -0,0 +1,67 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+TOKEN = "api-token"
+
+
+@pytest.fixture
+def api(app, tmp_path, monkeypatch):
+    """在 127.0.0.1 上启动本地 API，角色元数据使用独立的缓存"""
+    game = tmp_path / "game"
+    (game / "FFXIV_CHR0001").mkdir(parents=True)
+    (game / "FFXIV_CHR0002").mkdir()
+    monkeypatch.setattr(app, "roster_model", app.RosterModel(cache_file=str(tmp_path / "roster_meta.json")))
+    server = app.ApiServer({"international_path": str(game)}, 0, TOKEN)
+    yield server, str(game)
+    server.stop()
+
+
+def get(server, path):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    connection.request("GET", path, headers={"X-Api-Token": TOKEN})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_roster_reads_cached_scan(app, api, monkeypatch):
+    server, game = api
+    status, body = get(server, "/roster?server=international")
+    assert status == 400
+
+    app.roster_model.update(game, ["FFXIV_CHR0001", "FFXIV_CHR0002"], {"FFXIV_CHR0001": 1234.0})
+
+    # 读取角色列表时不扫描游戏路径
+    def no_scan(base_path):
+        raise AssertionError("GET /roster 不应扫描磁盘")
+    monkeypatch.setattr(app, "list_character_folders", no_scan)
+    status, body = get(server, "/roster?server=international")
+    assert status == 200
+    assert {row["folder"]: row["backup_time"] for row in body} == {"FFXIV_CHR0001": 1234.0, "FFXIV_CHR0002": None}
+
+
+def wait_finished(jobs, job_id):
+    deadline = time.monotonic() + 10
+    while not jobs.get(job_id)["finished"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_job_history_is_capped(app):
+    """超出上限时丢弃最早结束的任务，仍在运行的任务保留"""
+    jobs = app.JobManager(max_workers=2, history_limit=3)
+    release = threading.Event()
+    running = jobs.submit("scan", release.wait, 10)
+    submitted = []
+    for _ in range(5):
+        job = jobs.submit("scan", lambda: None)
+        wait_finished(jobs, job["id"])
+        submitted.append(job["id"])
+    ids = [job["id"] for job in jobs.list()]
+    assert ids == [running["id"]] + submitted[-2:]
+    release.set()
+    wait_finished(jobs, running["id"])
+    jobs.executor.shutdown()
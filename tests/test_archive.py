@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+
+def make_backup(app, tmp_path, storage_config):
+    """在本地备份存储中写入一个角色的配置文件，返回配置和原内容"""
+    config = {"backup_path": str(tmp_path / "backup"), "backup_storage": storage_config}
+    storage = app.create_backup_storage(storage_config, config["backup_path"])
+    contents = {}
+    for index, (name, _) in enumerate(app.CONFIG_FILES[:3]):
+        source = tmp_path / name
+        contents[name] = f"PLAINTEXT-MARKER-{index}-".encode("utf-8") * 200
+        source.write_bytes(contents[name])
+        storage.upload_file(str(source), f"国际服/FFXIV_CHR0001/{name}")
+    return config, contents
+
+
+def test_pack_round_trip(app, tmp_path):
+    """未加密的备份打包后可以原样读出"""
+    config, contents = make_backup(app, tmp_path, {"type": "local"})
+    output = str(tmp_path / "out.ccmtpak")
+    assert app.pack_backups(config, output) == (1, 3)
+    
+    storage = app.ArchiveStorage(output)
+    try:
+        for name, data in contents.items():
+            target = tmp_path / f"restored_{name}"
+            storage.download_file(f"国际服/FFXIV_CHR0001/{name}", str(target))
+            assert target.read_bytes() == data
+    finally:
+        storage.close()
+
+
+def test_encrypted_pack_contains_no_plaintext(app, tmp_path):
+    """加密的备份打包后不含明文，只有输入密码才能恢复"""
+    if app.AESGCM is None:
+        pytest.skip("需要 cryptography")
+    app.EncryptedStorage.session_passphrase = "correct horse"
+    config, contents = make_backup(app, tmp_path, {"type": "local", "encrypt": True, "compress": True})
+    output = str(tmp_path / "out.ccmtpak")
+    app.pack_backups(config, output)
+    
+    with open(output, 'rb') as f:
+        packed = f.read()
+    assert b"PLAINTEXT-MARKER" not in packed
+    
+    storage = app.ArchiveStorage(output)
+    try:
+        key = f"国际服/FFXIV_CHR0001/{app.CONFIG_FILES[0][0]}"
+        target = tmp_path / "restored"
+        storage.download_file(key, str(target))
+        assert target.read_bytes() == contents[app.CONFIG_FILES[0][0]]
+        
+        app.EncryptedStorage.session_passphrase = ""
+        with pytest.raises(app.StorageError):
+            storage.download_file(key, str(target))
+    finally:
+        storage.close()
+
+
+def test_encrypted_pack_requires_passphrase(app, tmp_path):
+    """启用加密但未输入密码时拒绝打包"""
+    config = {"backup_path": str(tmp_path / "backup"), "backup_storage": {"type": "local", "encrypt": True}}
+    os.makedirs(config["backup_path"])
+    with pytest.raises(app.StorageError):
+        app.pack_backups(config, str(tmp_path / "out.ccmtpak"))
+    assert not os.path.exists(tmp_path / "out.ccmtpak")
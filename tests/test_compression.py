@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+
+def make_characters(root, start, count, config_file):
+    """在游戏目录中创建若干角色的同类配置文件，内容相近以便训练字典"""
+    for index in range(start, start + count):
+        folder = os.path.join(root, f"FFXIV_CHR{index:016X}")
+        os.makedirs(folder, exist_ok=True)
+        lines = [f"hotbar {slot} = action {(slot * 7 + index) % 97}\n" for slot in range(200)]
+        with open(os.path.join(folder, config_file), 'w', encoding='utf-8') as f:
+            f.write(f"character {index}\n" + "".join(lines))
+
+
+def test_old_dictionary_version_after_retraining(app, tmp_path, monkeypatch):
+    """样本增多后训练新版本字典，用旧版本压缩的备份仍可解压"""
+    if app.zstd is None:
+        pytest.skip("需要 zstandard")
+    monkeypatch.setattr(app, "DICTIONARY_REFRESH_INTERVAL", 0)
+    config_file = app.CONFIG_FILES[0][0]
+    game = str(tmp_path / "game")
+    make_characters(game, 0, app.DICTIONARY_MIN_SAMPLES, config_file)
+    inner = app.LocalStorage(str(tmp_path / "backup"))
+    storage = app.CompressedStorage(inner, compress=True)
+
+    first = os.path.join(game, "FFXIV_CHR0000000000000000", config_file)
+    storage.upload_file(first, f"国际服/FFXIV_CHR0000000000000000/{config_file}")
+    versions = storage.dictionaries.load_index()[config_file]
+    assert [version["version"] for version in versions] == [1]
+
+    # 样本数增长到 1.5 倍后重新训练
+    make_characters(game, app.DICTIONARY_MIN_SAMPLES, app.DICTIONARY_MIN_SAMPLES, config_file)
+    second = os.path.join(game, "FFXIV_CHR0000000000000009", config_file)
+    storage.upload_file(second, f"国际服/FFXIV_CHR0000000000000009/{config_file}")
+    versions = storage.dictionaries.load_index()[config_file]
+    assert [version["version"] for version in versions] == [1, 2]
+    assert versions[0]["id"] != versions[1]["id"]
+
+    # 新实例从存储读取索引和各版本字典
+    reader = app.CompressedStorage(inner, compress=True)
+    for source, key in ((first, "FFXIV_CHR0000000000000000"), (second, "FFXIV_CHR0000000000000009")):
+        target = tmp_path / f"{key}.restored"
+        reader.download_file(f"国际服/{key}/{config_file}", str(target))
+        with open(source, 'rb') as f:
+            assert target.read_bytes() == f.read()
+    with open(inner.path(f"国际服/FFXIV_CHR0000000000000000/{config_file}"), 'rb') as f:
+        frame = f.read()[len(app.COMPRESSION_MAGIC):]
+    assert app.zstd.get_frame_parameters(frame).dict_id == versions[0]["id"]
+
+
+def test_refresh_does_not_block_on_training(app, tmp_path, monkeypatch):
+    """训练进行中其他线程不等待，直接使用现有字典"""
+    if app.zstd is None:
+        pytest.skip("需要 zstandard")
+    config_file = app.CONFIG_FILES[0][0]
+    game = str(tmp_path / "game")
+    make_characters(game, 0, app.DICTIONARY_MIN_SAMPLES, config_file)
+    dictionaries = app.ZstdDictionaries(app.LocalStorage(str(tmp_path / "backup")))
+
+    calls = []
+    original = app.zstd.train_dictionary
+
+    def train(*args):
+        # 训练期间另一次检查立即返回，且不持有锁
+        calls.append(dictionaries.lock.acquire(blocking=False))
+        dictionaries.lock.release()
+        dictionaries.refresh(game)
+        return original(*args)
+
+    monkeypatch.setattr(app.zstd, "train_dictionary", train)
+    dictionaries.refresh(game)
+    assert calls and all(calls)
+    assert len(dictionaries.load_index()[config_file]) == 1
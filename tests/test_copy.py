@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows 由 CopyFileW 复制")
+def test_copy_file_keeps_mode_and_mtime(app, tmp_path):
+    source = tmp_path / "source.DAT"
+    source.write_bytes(os.urandom(300000))
+    os.chmod(source, 0o640)
+    os.utime(source, ns=(1_600_000_000_000_000_000, 1_600_000_000_123_456_789))
+    target = tmp_path / "target.DAT"
+    target.write_bytes(b"old")
+    os.chmod(target, 0o600)
+
+    app.copy_engine.copy_file(str(source), str(target))
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_mode & 0o7777 == 0o640
+    assert target.stat().st_mtime_ns == source.stat().st_mtime_ns
+
+
+def test_benchmark_copy(app, tmp_path):
+    results = app.benchmark_copy(str(tmp_path), count=5, size=1024)
+    assert [method for method, _, _ in results] == ["copy2", "engine"]
+    for name in os.listdir(tmp_path / "copy-source"):
+        assert (tmp_path / "copy-engine" / name).read_bytes() == (tmp_path / "copy-source" / name).read_bytes()
@@ -0,0 +1,115 @@
+import os
+import struct
+
+import pytest
+
+
+@pytest.fixture
+def encryption(app, monkeypatch, tmp_path):
+    """小分块的加密存储，便于构造多块文件"""
+    if app.AESGCM is None:
+        pytest.skip("需要 cryptography")
+    monkeypatch.setattr(app, "ENCRYPTION_CHUNK_SIZE", 1024)
+    return app.EncryptedStorage(app.LocalStorage(str(tmp_path / "backup")), "correct horse", True)
+
+
+def encrypt(app, encryption, tmp_path, data):
+    """加密数据，返回 (文件头及包装密钥, [各块长度前缀和密文])"""
+    source = tmp_path / "plain.DAT"
+    source.write_bytes(data)
+    target = tmp_path / "cipher.enc"
+    encryption.encrypt_file(str(source), str(target))
+    raw = target.read_bytes()
+    # 文件头之后是 12 字节随机数和 48 字节包装后的文件密钥
+    prefix = app.ENCRYPTION_HEADER.size + 12 + 48
+    offset = prefix
+    chunks = []
+    while offset < len(raw):
+        length = struct.unpack_from("<I", raw, offset)[0]
+        chunks.append(raw[offset:offset + 4 + length])
+        offset += 4 + length
+    return raw[:prefix], chunks
+
+
+def decrypt(encryption, tmp_path, raw):
+    """解密给定的密文，返回明文"""
+    source = tmp_path / "tampered.enc"
+    source.write_bytes(raw)
+    target = tmp_path / "decrypted.DAT"
+    encryption.decrypt_file(str(source), str(target))
+    return target.read_bytes()
+
+
+def test_round_trip(app, encryption, tmp_path):
+    """多块、恰好整块和空文件都能还原"""
+    for size in (0, 1, 1024, 3000):
+        data = os.urandom(size)
+        header, chunks = encrypt(app, encryption, tmp_path, data)
+        assert len(chunks) == max(1, -(-size // 1024))
+        assert decrypt(encryption, tmp_path, header + b"".join(chunks)) == data
+
+
+def test_wrong_passphrase(app, encryption, tmp_path):
+    header, chunks = encrypt(app, encryption, tmp_path, b"secret" * 500)
+    wrong = app.EncryptedStorage(encryption.inner, "wrong horse", True)
+    with pytest.raises(app.StorageError):
+        decrypt(wrong, tmp_path, header + b"".join(chunks))
+
+
+def test_reordered_chunks(app, encryption, tmp_path):
+    header, chunks = encrypt(app, encryption, tmp_path, os.urandom(3000))
+    with pytest.raises(app.StorageError):
+        decrypt(encryption, tmp_path, header + chunks[1] + chunks[0] + chunks[2])
+
+
+def test_truncated_final_chunk(app, encryption, tmp_path):
+    """去掉最后一块或截断最后一块都会被发现"""
+    header, chunks = encrypt(app, encryption, tmp_path, os.urandom(3000))
+    with pytest.raises(app.StorageError):
+        decrypt(encryption, tmp_path, header + chunks[0] + chunks[1])
+    with pytest.raises(app.StorageError):
+        decrypt(encryption, tmp_path, header + b"".join(chunks)[:-10])
+    with pytest.raises(app.StorageError):
+        decrypt(encryption, tmp_path, header)
+
+
+@pytest.mark.parametrize("length", [0, 1024 + 16 + 1, 0xFFFFFFFF])
+def test_rejects_chunk_length_before_reading(app, encryption, tmp_path, monkeypatch, length):
+    """长度前缀为 0 或超过分块加认证标签时，不读取内容直接报错"""
+    header, chunks = encrypt(app, encryption, tmp_path, os.urandom(100))
+    raw = header + struct.pack("<I", length) + chunks[0][4:]
+
+    reads = []
+    original_open = open
+
+    class RecordingFile:
+        def __init__(self, file):
+            self.file = file
+
+        def read(self, size=-1):
+            reads.append(size)
+            return self.file.read(size)
+
+        def __getattr__(self, name):
+            return getattr(self.file, name)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return self.file.__exit__(*args)
+
+    def recording_open(path, mode='r', *args, **kwargs):
+        file = original_open(path, mode, *args, **kwargs)
+        return RecordingFile(file) if str(path).endswith("tampered.enc") else file
+
+    monkeypatch.setattr(app, "open", recording_open, raising=False)
+    with pytest.raises(app.StorageError):
+        decrypt(encryption, tmp_path, raw)
+    assert length not in reads
+
+
+def test_short_length_prefix(app, encryption, tmp_path):
+    header, chunks = encrypt(app, encryption, tmp_path, os.urandom(100))
+    with pytest.raises(app.StorageError):
+        decrypt(encryption, tmp_path, header + chunks[0] + b"\x01\x00")
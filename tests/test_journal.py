@@ -0,0 +1,40 @@
+import os
+
+FILES = ["ADDON.DAT", "HOTBAR.DAT"]
+
+
+def make_character(base, folder):
+    os.makedirs(os.path.join(base, folder))
+    for name in FILES:
+        with open(os.path.join(base, folder, name), 'wb') as f:
+            f.write(name.encode() * 10)
+
+
+def journal(app, operation, storage, folders):
+    return app.TransferJournal(operation, "international", storage.location(), folders, FILES)
+
+
+def test_completed_folders_report_up_to_date_count(app, tmp_path):
+    """中断后继续时，日志中已完成的角色在备份和恢复中都计为已是最新"""
+    game = str(tmp_path / "game")
+    make_character(game, "FFXIV_CHR0001")
+    storage = app.LocalStorage(str(tmp_path / "backup"))
+    folders = ["FFXIV_CHR0001", "FFXIV_CHR0002"]
+
+    first = journal(app, "backup", storage, folders)
+    assert app.backup_character(storage, game, "international", "FFXIV_CHR0001", FILES, journal=first) == (2, [], 0)
+    first.close()
+    resumed = journal(app, "backup", storage, folders)
+    assert resumed.resumed
+    assert app.backup_character(storage, game, "international", "FFXIV_CHR0001", FILES, journal=resumed) == (0, [], 2)
+    resumed.close()
+
+    target = str(tmp_path / "target")
+    os.makedirs(os.path.join(target, "FFXIV_CHR0001"))
+    first = journal(app, "restore", storage, folders)
+    assert app.restore_character(storage, target, "international", "FFXIV_CHR0001", FILES, journal=first) == (2, [], 0)
+    first.close()
+    resumed = journal(app, "restore", storage, folders)
+    assert resumed.resumed
+    assert app.restore_character(storage, target, "international", "FFXIV_CHR0001", FILES, journal=resumed) == (0, [], 2)
+    resumed.close()
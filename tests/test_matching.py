@@ -0,0 +1,27 @@
+def test_pairs_by_mark(app):
+    pairs = app.match_folders_by_mark(
+        ["FFXIV_CHR01", "FFXIV_CHR02"], {"FFXIV_CHR01": "主号", "FFXIV_CHR02": "小号"},
+        ["FFXIV_CHR11", "FFXIV_CHR12"], {"FFXIV_CHR11": "小号", "FFXIV_CHR12": "主号"}
+    )
+    assert pairs == [("主号", "FFXIV_CHR01", "FFXIV_CHR12"), ("小号", "FFXIV_CHR02", "FFXIV_CHR11")]
+
+
+def test_missing_marks_are_not_paired(app):
+    pairs = app.match_folders_by_mark(
+        ["FFXIV_CHR01", "FFXIV_CHR02", "FFXIV_CHR03"], {"FFXIV_CHR01": "主号", "FFXIV_CHR03": ""},
+        ["FFXIV_CHR11", "FFXIV_CHR12", "FFXIV_CHR13"], {"FFXIV_CHR11": "主号", "FFXIV_CHR13": ""}
+    )
+    assert pairs == [("主号", "FFXIV_CHR01", "FFXIV_CHR11")]
+    assert app.match_folders_by_mark(["FFXIV_CHR01"], {"FFXIV_CHR01": "主号"}, ["FFXIV_CHR11"], {}) == []
+
+
+def test_duplicate_marks_pair_first_only(app):
+    """同名标记只配对第一个，每个目标最多被一个源使用"""
+    pairs = app.match_folders_by_mark(
+        ["FFXIV_CHR01", "FFXIV_CHR02", "FFXIV_CHR03"],
+        {"FFXIV_CHR01": "主号", "FFXIV_CHR02": "主号", "FFXIV_CHR03": "小号"},
+        ["FFXIV_CHR11", "FFXIV_CHR12", "FFXIV_CHR13"],
+        {"FFXIV_CHR11": "主号", "FFXIV_CHR12": "主号", "FFXIV_CHR13": "小号"}
+    )
+    assert pairs == [("主号", "FFXIV_CHR01", "FFXIV_CHR11"), ("小号", "FFXIV_CHR03", "FFXIV_CHR13")]
+    assert len({target for _, _, target in pairs}) == len(pairs)
@@ -0,0 +1,331 @@
+import base64
+import email.utils
+import hashlib
+import hmac
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+REGION = "us-east-1"
+BUCKET = "backups"
+
+
+class StandInServer:
+    """在本机端口上运行的测试服务"""
+
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.objects = {}
+        self.server.failures = {}
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def fail_next(self, method, count=1):
+        """让接下来的若干个该方法的请求返回 503"""
+        self.server.failures[method] = count
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def injected_failure(self):
+        """按 fail_next 的设置返回 503"""
+        with self.server.lock:
+            self.server.requests.append(self.command)
+            remaining = self.server.failures.get(self.command, 0)
+            if remaining:
+                self.server.failures[self.command] = remaining - 1
+        if remaining:
+            self.read_body()
+            self.reply(503)
+            return True
+        return False
+
+
+def sigv4_signature(method, path, query, headers, signed_headers, payload_hash, amz_date):
+    """按 AWS SigV4 规范独立计算签名"""
+    canonical_query = "&".join(
+        f"{urllib.parse.quote(k, safe='-_.~')}={urllib.parse.quote(v, safe='-_.~')}"
+        for k, v in sorted(query)
+    )
+    canonical_headers = "".join(f"{name}:{headers[name].strip()}\n" for name in signed_headers)
+    canonical_request = "\n".join([
+        method, urllib.parse.quote(path, safe="/-_.~"), canonical_query, canonical_headers,
+        ";".join(signed_headers), payload_hash
+    ])
+    scope = f"{amz_date[:8]}/{REGION}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+    ])
+    key = f"AWS4{SECRET_KEY}".encode("utf-8")
+    for part in (amz_date[:8], REGION, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    return hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class S3Handler(StandInHandler):
+    """S3 兼容服务的最小实现：校验签名，支持列表、读写对象和分段上传"""
+
+    def handle_request(self):
+        if self.injected_failure():
+            return
+        parsed = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(parsed.path)
+        query = urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+        body = self.read_body()
+
+        # 校验签名和负载哈希
+        authorization = self.headers.get("Authorization", "")
+        fields = dict(part.strip().split("=", 1) for part in authorization[len("AWS4-HMAC-SHA256 "):].split(","))
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        payload_hash = headers.get("x-amz-content-sha256", "")
+        expected = sigv4_signature(
+            self.command, path, query, headers, fields.get("SignedHeaders", "").split(";"),
+            payload_hash, headers.get("x-amz-date", "")
+        )
+        if (not fields.get("Credential", "").startswith(f"{ACCESS_KEY}/") or fields.get("Signature") != expected
+                or payload_hash != hashlib.sha256(body).hexdigest()):
+            self.reply(403)
+            return
+
+        query = dict(query)
+        objects = self.server.objects
+        key = path[len(f"/{BUCKET}/"):]
+        if self.command == "GET" and path == f"/{BUCKET}":
+            self.list_objects(query)
+        elif self.command == "POST" and "uploads" in query:
+            upload_id = f"upload-{len(self.server.requests)}"
+            objects[upload_id] = {"key": key, "parts": {}, "mtime": headers.get("x-amz-meta-mtime")}
+            self.reply(200, f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>".encode())
+        elif self.command == "PUT" and "uploadId" in query:
+            objects[query["uploadId"]]["parts"][int(query["partNumber"])] = body
+            self.reply(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        elif self.command == "POST" and "uploadId" in query:
+            upload = objects.pop(query["uploadId"])
+            data = b"".join(upload["parts"][number] for number in sorted(upload["parts"]))
+            objects[key] = {"data": data, "mtime": upload["mtime"], "parts": len(upload["parts"])}
+            self.reply(200, b"<CompleteMultipartUploadResult/>")
+        elif self.command == "DELETE" and "uploadId" in query:
+            objects.pop(query["uploadId"], None)
+            self.reply(204)
+        elif self.command == "PUT":
+            objects[key] = {"data": body, "mtime": headers.get("x-amz-meta-mtime"), "parts": 1}
+            self.reply(200)
+        elif self.command in ("GET", "HEAD") and key in objects:
+            item = objects[key]
+            self.reply(200, item["data"], {"x-amz-meta-mtime": item["mtime"]} if item["mtime"] else {})
+        else:
+            self.reply(404)
+
+    def list_objects(self, query):
+        """分页列出对象，每页两个以覆盖续页"""
+        keys = sorted(key for key, item in self.server.objects.items() if "data" in item and key.startswith(query.get("prefix", "")))
+        start = int(query.get("continuation-token", "0"))
+        page = keys[start:start + 2]
+        truncated = start + 2 < len(keys)
+        contents = "".join(
+            f"<Contents><Key>{key}</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified></Contents>"
+            for key in page
+        )
+        token = f"<NextContinuationToken>{start + 2}</NextContinuationToken>" if truncated else ""
+        body = (
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"{contents}<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}</ListBucketResult>"
+        )
+        self.reply(200, body.encode("utf-8"))
+
+    do_GET = do_PUT = do_POST = do_HEAD = do_DELETE = handle_request
+
+
+class WebDAVHandler(StandInHandler):
+    """WebDAV 服务的最小实现：需要基本认证，PUT 前上级目录必须已创建"""
+
+    def handle_request(self):
+        if self.injected_failure():
+            return
+        body = self.read_body()
+        expected = "Basic " + base64.b64encode(b"user:secret").decode("ascii")
+        if self.headers.get("Authorization") != expected:
+            self.reply(401)
+            return
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).rstrip("/")
+        parent = path.rsplit("/", 1)[0]
+        objects = self.server.objects
+        if self.command == "MKCOL":
+            if path in objects:
+                self.reply(405)
+            elif parent not in objects:
+                self.reply(409)
+            else:
+                objects[path] = {"collection": True}
+                self.reply(201)
+        elif self.command == "PUT":
+            if parent not in objects:
+                self.reply(409)
+            else:
+                objects[path] = {"data": body}
+                self.reply(201)
+        elif self.command == "GET" and "data" in objects.get(path, {}):
+            self.reply(200, objects[path]["data"])
+        elif self.command == "PROPFIND" and path in objects:
+            self.propfind(path)
+        else:
+            self.reply(404)
+
+    def propfind(self, path):
+        """返回目录自身和直接子项"""
+        assert self.headers.get("Depth") == "1"
+        responses = []
+        for item_path, item in sorted(self.server.objects.items()):
+            if item_path != path and item_path.rsplit("/", 1)[0] != path:
+                continue
+            href = urllib.parse.quote(item_path + ("/" if "collection" in item else ""))
+            if "collection" in item:
+                prop = "<d:resourcetype><d:collection/></d:resourcetype>"
+            else:
+                prop = f"<d:resourcetype/><d:getlastmodified>{email.utils.formatdate(1700000000, usegmt=True)}</d:getlastmodified>"
+            responses.append(f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>{prop}</d:prop></d:propstat></d:response>")
+        body = f'<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">{"".join(responses)}</d:multistatus>'
+        self.reply(207, body.encode("utf-8"), {"Content-Type": "application/xml"})
+
+    do_GET = do_PUT = do_MKCOL = do_PROPFIND = handle_request
+
+
+@pytest.fixture
+def no_backoff(app, monkeypatch):
+    """重试时不等待"""
+    monkeypatch.setattr(app.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def s3_server():
+    server = StandInServer(S3Handler)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def webdav_server():
+    server = StandInServer(WebDAVHandler)
+    server.server.objects["/dav"] = {"collection": True}
+    yield server
+    server.close()
+
+
+def write_files(tmp_path, sizes):
+    """创建若干本地文件，返回 [(路径, 内容)]"""
+    files = []
+    for index, size in enumerate(sizes):
+        path = tmp_path / f"source_{index}.DAT"
+        data = bytes((index * 31 + offset) % 251 for offset in range(size))
+        path.write_bytes(data)
+        files.append((str(path), data))
+    return files
+
+
+def test_s3_round_trip(app, tmp_path, s3_server, no_backoff):
+    """签名请求、分页列表、分段上传和下载"""
+    storage = app.S3Storage(s3_server.url, BUCKET, ACCESS_KEY, SECRET_KEY, REGION, prefix="ccmt")
+    storage.part_size = 1000
+    files = write_files(tmp_path, [10, 2500, 0])
+    keys = [f"国际服/FFXIV_CHR0001/file_{index}.DAT" for index in range(len(files))]
+
+    uploaded, errors = storage.upload_many([(path, key) for (path, _), key in zip(files, keys)])
+    assert (uploaded, errors) == (3, [])
+    assert s3_server.server.objects[f"ccmt/{keys[1]}"]["parts"] == 3
+
+    listed = storage.list_files("国际服")
+    assert sorted(listed) == sorted(keys)
+
+    downloaded, errors = storage.download_many([(key, str(tmp_path / f"restored_{index}")) for index, key in enumerate(keys)])
+    assert (downloaded, errors) == (3, [])
+    for index, (path, data) in enumerate(files):
+        restored = tmp_path / f"restored_{index}"
+        assert restored.read_bytes() == data
+        assert abs(restored.stat().st_mtime - (tmp_path / f"source_{index}.DAT").stat().st_mtime) < 1
+        # 续传时按对象元数据中的原修改时间判断
+        assert storage.matches(keys[index], path, listed[keys[index]])
+
+
+def test_s3_rejects_bad_signature(app, s3_server):
+    """密钥错误时服务拒绝请求，不重试"""
+    storage = app.S3Storage(s3_server.url, BUCKET, ACCESS_KEY, "wrong", REGION)
+    with pytest.raises(app.StorageError):
+        storage.list_files()
+
+
+def test_s3_retries_server_errors(app, tmp_path, s3_server, no_backoff):
+    """5xx 错误按退避重试，分段上传的分段也会重试"""
+    storage = app.S3Storage(s3_server.url, BUCKET, ACCESS_KEY, SECRET_KEY, REGION)
+    storage.part_size = 1000
+    (path, data), = write_files(tmp_path, [2500])
+
+    s3_server.fail_next("PUT", 2)
+    assert storage.upload_many([(path, "国服/FFXIV_CHR0002/big.DAT")]) == (1, [])
+    assert s3_server.server.objects["国服/FFXIV_CHR0002/big.DAT"]["data"] == data
+
+    s3_server.fail_next("GET", 2)
+    assert list(storage.list_files("国服")) == ["国服/FFXIV_CHR0002/big.DAT"]
+
+    s3_server.fail_next("GET", storage.retries)
+    with pytest.raises(OSError):
+        storage.list_files("国服")
+
+
+def test_webdav_round_trip(app, tmp_path, webdav_server, no_backoff):
+    """逐级创建目录、上传、递归列出和下载"""
+    storage = app.WebDAVStorage(f"{webdav_server.url}/dav", "user", "secret")
+    files = write_files(tmp_path, [10, 3000])
+    keys = ["国际服/FFXIV_CHR0001/a.DAT", "国际服/FFXIV_CHR0002/b.DAT"]
+
+    webdav_server.fail_next("PUT")
+    assert storage.upload_many([(path, key) for (path, _), key in zip(files, keys)]) == (2, [])
+    assert {"/dav/国际服", "/dav/国际服/FFXIV_CHR0001", "/dav/国际服/FFXIV_CHR0002"} <= set(webdav_server.server.objects)
+
+    listed = storage.list_files("国际服")
+    assert sorted(listed) == keys
+    assert all(mtime == 1700000000 for mtime in listed.values())
+    assert storage.list_files("国服") == {}
+
+    assert storage.download_many([(key, str(tmp_path / f"restored_{index}")) for index, key in enumerate(keys)]) == (2, [])
+    for index, (_, data) in enumerate(files):
+        assert (tmp_path / f"restored_{index}").read_bytes() == data
+    # 服务器不保存原修改时间，续传时不跳过
+    assert not storage.matches(keys[0], files[0][0], listed[keys[0]])
+
+
+def test_webdav_requires_credentials(app, tmp_path, webdav_server):
+    """认证失败时报错"""
+    storage = app.WebDAVStorage(f"{webdav_server.url}/dav", "user", "wrong")
+    (path, _), = write_files(tmp_path, [10])
+    with pytest.raises(app.StorageError):
+        storage.upload_file(path, "国际服/FFXIV_CHR0001/a.DAT")
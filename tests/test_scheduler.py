@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+TIMEOUT = 10
+
+
+@pytest.fixture
+def scheduler(app):
+    return app.JobScheduler(max_workers=4)
+
+
+class Task:
+    """记录开始顺序，等待放行后结束的任务"""
+
+    def __init__(self, order, name):
+        self.order = order
+        self.name = name
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.order.append(self.name)
+        self.started.set()
+        assert self.release.wait(TIMEOUT)
+        return self.name
+
+
+def test_parent_and_child_folders_conflict(scheduler, tmp_path):
+    """写入上级文件夹时，其下的子文件夹既不能写也不能读，名称前缀相同的兄弟文件夹不受影响"""
+    order = []
+    parent = Task(order, "parent")
+    child_write = Task(order, "child_write")
+    child_read = Task(order, "child_read")
+    sibling = Task(order, "sibling")
+    first = scheduler.submit(parent, writes=[str(tmp_path / "game")])
+    assert parent.started.wait(TIMEOUT)
+    futures = [
+        scheduler.submit(child_write, writes=[str(tmp_path / "game" / "FFXIV_CHR01")]),
+        scheduler.submit(child_read, reads=[str(tmp_path / "game" / "FFXIV_CHR02")]),
+        scheduler.submit(sibling, writes=[str(tmp_path / "game2")]),
+    ]
+    assert sibling.started.wait(TIMEOUT)
+    assert not child_write.started.is_set() and not child_read.started.is_set()
+
+    parent.release.set()
+    assert first.result(TIMEOUT) == "parent"
+    for task in (child_write, child_read, sibling):
+        task.release.set()
+    assert [future.result(TIMEOUT) for future in futures] == ["child_write", "child_read", "sibling"]
+    assert order.index("parent") < order.index("child_write")
+    assert order.index("parent") < order.index("child_read")
+
+
+def test_child_write_blocks_parent_write(scheduler, tmp_path):
+    order = []
+    child = Task(order, "child")
+    parent = Task(order, "parent")
+    scheduler.submit(child, writes=[str(tmp_path / "game" / "FFXIV_CHR01")])
+    assert child.started.wait(TIMEOUT)
+    future = scheduler.submit(parent, writes=[str(tmp_path / "game")])
+    assert not parent.started.wait(0.2)
+    child.release.set()
+    parent.release.set()
+    assert future.result(TIMEOUT) == "parent"
+
+
+def test_waiting_writer_is_not_starved_by_readers(scheduler, tmp_path):
+    """已有读任务时排队的写任务，不会被之后提交的读任务反复抢先"""
+    folder = str(tmp_path / "backup" / "FFXIV_CHR01")
+    order = []
+    reader = Task(order, "reader")
+    writer = Task(order, "writer")
+    later_readers = [Task(order, f"later_{index}") for index in range(3)]
+    scheduler.submit(reader, reads=[folder])
+    assert reader.started.wait(TIMEOUT)
+    writer_future = scheduler.submit(writer, writes=[folder])
+    later_futures = [scheduler.submit(task, reads=[folder]) for task in later_readers]
+    # 有空闲工作线程，但后来的读任务仍排在写任务之后
+    assert not later_readers[0].started.wait(0.2)
+    assert not writer.started.is_set()
+
+    reader.release.set()
+    assert writer.started.wait(TIMEOUT)
+    assert not any(task.started.is_set() for task in later_readers)
+    writer.release.set()
+    assert writer_future.result(TIMEOUT) == "writer"
+    for task in later_readers:
+        task.release.set()
+    for future in later_futures:
+        future.result(TIMEOUT)
+    assert order[:2] == ["reader", "writer"]
+
+
+def test_readers_share_a_folder(scheduler, tmp_path):
+    folder = str(tmp_path / "backup")
+    order = []
+    readers = [Task(order, f"reader_{index}") for index in range(3)]
+    futures = [scheduler.submit(task, reads=[folder]) for task in readers]
+    assert all(task.started.wait(TIMEOUT) for task in readers)
+    for task in readers:
+        task.release.set()
+    for future in futures:
+        future.result(TIMEOUT)
@@ -0,0 +1,34 @@
+import json
+import os
+
+
+def test_pending_settings_are_read_without_writing(app, tmp_path):
+    """尚未写入的设置可以直接读取，读取不触发磁盘写入"""
+    writer = app.SettingsWriter(delay=60)
+    path = str(tmp_path / "data" / "state.json")
+    assert writer.pending(path) is None
+    assert writer.load(path, {"default": True}) == {"default": True}
+
+    state = {"server": "china", "folder": "FFXIV_CHR0001"}
+    writer.save(path, state)
+    state["folder"] = "changed later"
+    assert writer.pending(path) == {"server": "china", "folder": "FFXIV_CHR0001"}
+    assert writer.load(path) == {"server": "china", "folder": "FFXIV_CHR0001"}
+    assert not os.path.exists(path)
+
+    writer.flush()
+    assert writer.pending(path) is None
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {"server": "china", "folder": "FFXIV_CHR0001"}
+    assert writer.load(path) == {"server": "china", "folder": "FFXIV_CHR0001"}
+
+
+def test_failed_write_stays_pending(app, tmp_path):
+    """写入失败的内容保留，读取时仍是最新的"""
+    writer = app.SettingsWriter(delay=60)
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    path = str(blocker / "state.json")
+    writer.save(path, {"value": 1})
+    writer.flush()
+    assert writer.pending(path) == {"value": 1}
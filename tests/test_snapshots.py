@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_delta_round_trip(app, seed):
+    rng = random.Random(seed)
+    base = bytearray(rng.randbytes(rng.randrange(0, 4096)))
+    data = bytearray(base)
+    # 随机插入、删除、覆盖和整段移动，覆盖原位修改和块复制两种匹配路径
+    for _ in range(rng.randrange(0, 12)):
+        position = rng.randrange(0, len(data) + 1)
+        kind = rng.choice(("insert", "delete", "replace", "move"))
+        if kind == "insert":
+            data[position:position] = rng.randbytes(rng.randrange(1, 64))
+        elif kind == "delete":
+            del data[position:position + rng.randrange(1, 64)]
+        elif kind == "replace":
+            data[position:position + 8] = rng.randbytes(8)
+        elif data:
+            start = rng.randrange(0, len(data))
+            segment = data[start:start + rng.randrange(1, 256)]
+            del data[start:start + len(segment)]
+            data[position:position] = segment
+    base, data = bytes(base), bytes(data)
+    assert app.apply_delta(base, app.encode_delta(base, data)) == data
+
+
+def test_delta_edge_cases(app):
+    block = app.DELTA_BLOCK_SIZE
+    for base, data in [
+        (b"", b""),
+        (b"", b"abc"),
+        (b"abc", b""),
+        (b"x" * block, b"x" * (block - 1)),
+        (b"ab" * block * 4, b"ab" * block * 4 + b"a"),
+    ]:
+        assert app.apply_delta(base, app.encode_delta(base, data)) == data
+
+
+def test_corrupt_delta_is_rejected(app):
+    delta = bytearray(app.encode_delta(b"a" * 100, b"a" * 50 + b"b" * 50))
+    with pytest.raises(ValueError):
+        app.apply_delta(b"a" * 100, b"NOTDELTA" + bytes(delta[8:]))
+    delta[8:12] = (0).to_bytes(4, "little")
+    with pytest.raises(ValueError):
+        app.apply_delta(b"a" * 100, bytes(delta))
+
+
+def test_pruning_keeps_keyframe_of_inflight_capture(app, tmp_path):
+    store = app.SnapshotStore(root=str(tmp_path / "snapshots"), keep=1)
+    first = tmp_path / "first.DAT"
+    second = tmp_path / "second.DAT"
+    old = tmp_path / "old.DAT"
+    first.write_bytes(b"same" * 100)
+    second.write_bytes(b"same" * 100)
+    old.write_bytes(b"old")
+
+    earlier = store.begin("earlier")
+    earlier.capture(str(old))
+    earlier.commit()
+
+    # 两个进行中的快照捕获相同内容，共享同一个关键帧
+    one = store.begin("one")
+    two = store.begin("two")
+    one.capture(str(first))
+    two.capture(str(second))
+    assert one.files[0]["keyframe"] == two.files[0]["keyframe"]
+    shared = one.files[0]["keyframe"]
+
+    # 按 keep=1 提交后续快照会清理掉第一个快照并回收关键帧，此时只有进行中的快照还引用它
+    one.commit()
+    later = store.begin("later")
+    later.capture(str(old))
+    later.commit()
+    assert [entry["id"] for entry in store.list()] == [later.id]
+    assert (tmp_path / "snapshots" / "keyframes" / shared).exists()
+
+    second.write_bytes(b"changed")
+    two.commit()
+    assert store.undo_latest(1) == 1
+    assert second.read_bytes() == b"same" * 100
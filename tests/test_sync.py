@@ -0,0 +1,133 @@
+import http.client
+import json
+import os
+
+import pytest
+
+TOKEN = "shared-secret"
+
+
+def write_backup(root, key, data, mtime):
+    """在备份文件夹中写入文件"""
+    path = os.path.join(root, *key.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def read_backup(root, key):
+    with open(os.path.join(root, *key.split("/")), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def peer(app, tmp_path):
+    """在 127.0.0.1 上为另一个备份文件夹启动同步服务"""
+    root = str(tmp_path / "peer")
+    os.makedirs(root)
+    server = app.SyncServer(root, 0, TOKEN, host="127.0.0.1")
+    yield root, f"127.0.0.1:{server.port}"
+    server.stop()
+
+
+def test_is_sync_key(app):
+    """只接受角色配置文件、校验清单和压缩字典"""
+    config_file = app.CONFIG_FILES[0][0]
+    assert app.is_sync_key(f"国际服/FFXIV_CHR0001/{config_file}")
+    assert app.is_sync_key(f"国服/FFXIV_CHR0001/{app.CHECKSUM_FILE}")
+    assert app.is_sync_key(f"{app.DICTIONARY_PREFIX}/index.json")
+    assert not app.is_sync_key(f"国际服/FFXIV_CHR0001/notes.txt")
+    assert not app.is_sync_key(f"其他/FFXIV_CHR0001/{config_file}")
+    assert not app.is_sync_key(f"国际服/..FFXIV_/../{config_file}")
+    assert not app.is_sync_key(f"国际服/FFXIV_CHR0001/sub/{config_file}")
+    assert not app.is_sync_key(f"{app.DICTIONARY_PREFIX}/..")
+    assert not app.is_sync_key(config_file)
+
+
+def test_plan_sync(app):
+    """缺少的文件双向传输，内容不同时以较新的为准，相同内容不传输"""
+    local = {
+        "same": {"hash": "a", "mtime": 1},
+        "local_only": {"hash": "b", "mtime": 1},
+        "local_newer": {"hash": "c", "mtime": 5},
+        "remote_newer": {"hash": "d", "mtime": 1},
+        "same_content_newer": {"hash": "e", "mtime": 9},
+    }
+    remote = {
+        "same": {"hash": "a", "mtime": 3},
+        "remote_only": {"hash": "f", "mtime": 1},
+        "local_newer": {"hash": "g", "mtime": 1},
+        "remote_newer": {"hash": "h", "mtime": 5},
+        "same_content_newer": {"hash": "e", "mtime": 1},
+    }
+    assert app.plan_sync(local, remote) == (["remote_newer", "remote_only"], ["local_newer", "local_only"])
+    assert app.plan_sync({}, {}) == ([], [])
+
+
+def test_sync_two_folders(app, tmp_path, peer):
+    """两个备份文件夹同步后一致，其他文件不传输"""
+    peer_root, address = peer
+    local_root = str(tmp_path / "local")
+    names = [name for name, _ in app.CONFIG_FILES]
+    write_backup(local_root, f"国际服/FFXIV_CHR0001/{names[0]}", b"local only", 1000)
+    write_backup(local_root, f"国际服/FFXIV_CHR0002/{names[1]}", b"local newer", 2000)
+    write_backup(peer_root, f"国际服/FFXIV_CHR0002/{names[1]}", b"peer older", 1000)
+    write_backup(peer_root, f"国服/FFXIV_CHR0003/{names[2]}", b"peer only", 1000)
+    write_backup(peer_root, "secret.txt", b"not shared", 1000)
+    write_backup(local_root, "private/notes.txt", b"not shared", 1000)
+
+    result = app.sync_with_peer(local_root, address, TOKEN)
+    assert result == {"pulled": 1, "pushed": 2, "errors": []}
+    assert read_backup(peer_root, f"国际服/FFXIV_CHR0001/{names[0]}") == b"local only"
+    assert read_backup(peer_root, f"国际服/FFXIV_CHR0002/{names[1]}") == b"local newer"
+    assert read_backup(local_root, f"国服/FFXIV_CHR0003/{names[2]}") == b"peer only"
+    assert not os.path.exists(os.path.join(local_root, "secret.txt"))
+    assert not os.path.exists(os.path.join(peer_root, "private"))
+    # 修改时间随文件同步
+    assert os.path.getmtime(os.path.join(peer_root, "国际服", "FFXIV_CHR0001", names[0])) == pytest.approx(1000)
+
+    # 再次同步时没有需要传输的文件
+    assert app.sync_with_peer(local_root, address, TOKEN) == {"pulled": 0, "pushed": 0, "errors": []}
+
+
+def test_sync_rejects_unsigned_and_foreign_keys(app, peer):
+    """未签名或签名错误的请求被拒绝，清单和下载不暴露同步范围以外的文件"""
+    peer_root, address = peer
+    write_backup(peer_root, "secret.txt", b"not shared", 1000)
+    host, port = address.split(":")
+
+    conn = http.client.HTTPConnection(host, int(port), timeout=10)
+    conn.request("GET", "/manifest", headers={"X-Sync-Token": TOKEN})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 403
+    conn.close()
+
+    with pytest.raises(app.StorageError):
+        app.PeerStorage(address, "wrong").manifest()
+
+    storage = app.PeerStorage(address, TOKEN)
+    assert storage.manifest() == {}
+    with pytest.raises(app.StorageError):
+        storage.download_file("secret.txt", os.path.join(peer_root, "copy.txt"))
+    with pytest.raises(app.StorageError):
+        storage.write_bytes("secret.txt", b"overwrite")
+    assert read_backup(peer_root, "secret.txt") == b"not shared"
+
+
+def test_sync_rejects_tampered_body(app, peer):
+    """内容与签名中的哈希不符时拒绝写入"""
+    peer_root, address = peer
+    storage = app.PeerStorage(address, TOKEN)
+    key = f"国际服/FFXIV_CHR0001/{app.CONFIG_FILES[0][0]}"
+    path = storage.path(key)
+    host, port = address.split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=10)
+    conn.request("PUT", path, body=b"tampered", headers=storage.headers("PUT", path, b"original"))
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 400
+    assert not os.path.exists(os.path.join(peer_root, "国际服"))
+    conn.close()
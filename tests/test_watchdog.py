@@ -0,0 +1,38 @@
+import pytest
+
+
+class FakeRoot:
+    """只记录定时回调的 Tk 根窗口替身"""
+
+    def after(self, ms, callback):
+        pass
+
+
+@pytest.fixture
+def watchdog(app):
+    watchdog = app.UiWatchdog(FakeRoot())
+    yield watchdog
+    watchdog.running = False
+
+
+def test_histogram_stays_bounded(app, watchdog):
+    for i in range(100000):
+        watchdog.add_sample(i % 5000 / 10)
+    assert watchdog.samples == 100000
+    assert len(watchdog.histogram) < 200
+
+
+def test_summary_percentiles(app, watchdog):
+    for ms in range(1, 101):
+        watchdog.add_sample(ms + 0.5)
+    watchdog.add_sample(2345.0)
+    summary = watchdog.summary()
+    assert summary["samples"] == 101
+    assert summary["p50_ms"] == 51
+    assert summary["p99_ms"] == 100
+    assert summary["max_ms"] == 2345.0
+    assert summary["mean_ms"] == round((sum(ms + 0.5 for ms in range(1, 101)) + 2345.0) / 101, 1)
+
+
+def test_latency_bucket(app):
+    assert [app.latency_bucket(ms) for ms in (0.4, 99.9, 100, 255, 999.9, 1000, 12345)] == [0, 99, 100, 250, 990, 1000, 12300]